@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Content-addressed store for downloaded documents.
+
+Every file is stored once under datasets/store/sha256/<ab>/<sha256>; the
+per-collection paths (datasets/raw/gimbe/pdf/..., datasets/raw/pdta/...)
+are hardlinks to the blob (a copy when the filesystem does not support
+hardlinks). An index (datasets/store/index.db) maps each source URL to the
+hash of the content last downloaded from it, so a URL whose content is
+already in the store is linked into place without any network request.
+
+Blobs are read-only (0444). A hardlink shares the blob's inode, so the
+collection files are read-only too: they are replaced (new file + rename),
+never rewritten in place. gc keeps every blob referenced by the URL index
+or by a download manifest, and blobs still hardlinked from a collection;
+link counts alone are not enough because of the copy fallback.
+
+Usage:
+    python3 scripts/blob_store.py stats
+    python3 scripts/blob_store.py dedup [datasets/raw]   # move existing PDFs into the store
+    python3 scripts/blob_store.py gc                     # remove blobs no collection uses
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import stat
+import sys
+import threading
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_DIR = os.path.join(BASE_DIR, "datasets", "store")
+RAW_DIR = os.path.join(BASE_DIR, "datasets", "raw")
+
+# Download manifests whose "sha256" fields reference blobs (see gc)
+MANIFESTS = (
+    os.path.join(RAW_DIR, "gimbe", "pdf", "manifest.json"),
+    os.path.join(RAW_DIR, "pdta", "download_manifest.json"),
+)
+
+
+class BlobStore:
+    """Blobs addressed by SHA-256, with a URL -> hash index on SQLite."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS url_index (
+            url         TEXT PRIMARY KEY,
+            sha256      TEXT NOT NULL,
+            size_bytes  INTEGER NOT NULL,
+            stored_at   TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_url_index_sha ON url_index (sha256);
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "sha256"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "index.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def blob_path(self, sha):
+        return os.path.join(self.root, "sha256", sha[:2], sha)
+
+    def has(self, sha):
+        return bool(sha) and os.path.exists(self.blob_path(sha))
+
+    # --- URL index ---
+
+    def lookup(self, url):
+        """Hash of the content known for a URL, None if unknown or no longer stored."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT sha256 FROM url_index WHERE url = ?", (url,)
+            ).fetchone()
+        return row[0] if row and self.has(row[0]) else None
+
+    def remember(self, url, sha):
+        size = os.path.getsize(self.blob_path(sha))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO url_index (url, sha256, size_bytes, stored_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET sha256 = excluded.sha256, "
+                "size_bytes = excluded.size_bytes, stored_at = excluded.stored_at",
+                (url, sha, size, datetime.now().isoformat())
+            )
+
+    # --- Blobs ---
+
+    def add(self, path, sha):
+        """
+        Move a complete file into the store under its hash. If the blob
+        already exists the file is just removed (deduplicated).
+
+        Returns:
+            path of the blob
+        """
+        blob = self.blob_path(sha)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.replace(path, blob)
+            os.chmod(blob, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+        return blob
+
+    def link(self, sha, dest):
+        """
+        Make dest point to the blob: hardlink, or copy across filesystems.
+        The replacement is atomic (temporary name + os.replace).
+        """
+        blob = self.blob_path(sha)
+        dest = str(dest)
+        if os.path.exists(dest) and os.path.samefile(blob, dest):
+            return dest
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        tmp = f"{dest}.link-{threading.get_ident()}"
+        try:
+            os.link(blob, tmp)
+        except OSError:
+            shutil.copyfile(blob, tmp)
+        try:
+            os.replace(tmp, dest)
+        except PermissionError:
+            # Read-only target on platforms where rename cannot replace it
+            os.remove(dest)
+            os.replace(tmp, dest)
+        return dest
+
+    def store(self, path, sha, url=None):
+        """Move a downloaded file into the store and link it back to its path."""
+        dest = str(path)
+        tmp = f"{dest}.store-{threading.get_ident()}"
+        os.replace(dest, tmp)
+        self.add(tmp, sha)
+        self.link(sha, dest)
+        if url:
+            self.remember(url, sha)
+        return dest
+
+    def stats(self):
+        blobs = 0
+        size = 0
+        links = 0
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "sha256")):
+            for name in filenames:
+                st = os.stat(os.path.join(dirpath, name))
+                blobs += 1
+                size += st.st_size
+                links += st.st_nlink - 1
+        with self._lock:
+            urls = self._conn.execute("SELECT COUNT(*) FROM url_index").fetchone()[0]
+        return {"blobs": blobs, "size_bytes": size, "collection_links": links, "urls": urls}
+
+    def referenced(self, manifests=MANIFESTS):
+        """Hashes referenced by the URL index and by the download manifests."""
+        with self._lock:
+            shas = {row[0] for row in self._conn.execute("SELECT sha256 FROM url_index")}
+        for path in manifests:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    files = json.load(f).get("files", [])
+            except (OSError, ValueError):
+                continue
+            shas.update(e["sha256"] for e in files if e.get("sha256"))
+        return shas
+
+    def gc(self, manifests=MANIFESTS):
+        """
+        Remove blobs nothing refers to: not in the URL index, not in a
+        download manifest and not hardlinked from a collection. Files linked
+        by copy (no hardlink support) are covered by the index and manifests.
+        """
+        keep = self.referenced(manifests)
+        removed = []
+        for dirpath, _, filenames in os.walk(os.path.join(self.root, "sha256")):
+            for name in filenames:
+                blob = os.path.join(dirpath, name)
+                if name not in keep and os.stat(blob).st_nlink == 1:
+                    os.chmod(blob, stat.S_IWUSR | stat.S_IRUSR)
+                    os.remove(blob)
+                    removed.append(name)
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# === MAIN ===
+
+def dedup(store, root, workers):
+    """Move every PDF under root into the store, replacing it with a hardlink."""
+    from download_engine import hash_files
+
+    paths = []
+    for dirpath, _, filenames in os.walk(root):
+        if os.path.abspath(dirpath).startswith(os.path.abspath(store.root)):
+            continue
+        paths += [os.path.join(dirpath, n) for n in filenames if n.lower().endswith(".pdf")]
+
+    saved = 0
+    for path, (sha, key, _) in sorted(hash_files(paths, workers=workers).items()):
+        if store.has(sha):
+            if os.path.samefile(store.blob_path(sha), path):
+                continue
+            saved += key["size_bytes"]
+            print(f"  [DUP]   {os.path.relpath(path, BASE_DIR)}")
+        store.store(path, sha)
+    return len(paths), saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed store for downloaded PDFs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show store size and deduplication")
+    p_dedup = sub.add_parser("dedup", help="Move existing PDFs into the store")
+    p_dedup.add_argument("root", nargs="?", default=RAW_DIR)
+    p_dedup.add_argument("--workers", type=int, default=4)
+    sub.add_parser("gc", help="Remove blobs not referenced by the URL index, the manifests "
+                              "or a collection link")
+    args = parser.parse_args()
+
+    store = BlobStore()
+    try:
+        if args.command == "stats":
+            s = store.stats()
+            print(f"Blobs: {s['blobs']} ({s['size_bytes'] / 1_000_000:.1f} MB)")
+            print(f"Collection links: {s['collection_links']}")
+            print(f"Known URLs: {s['urls']}")
+        elif args.command == "dedup":
+            count, saved = dedup(store, args.root, args.workers)
+            print(f"PDFs: {count} | duplicates saved: {saved / 1_000_000:.1f} MB")
+        elif args.command == "gc":
+            removed = store.gc()
+            print(f"Removed blobs: {len(removed)}")
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
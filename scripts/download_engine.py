@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+"""
+Shared download engine for the PDF downloaders (download_gimbe_pdfs.py,
+download_pdta.py).
+
+- bounded worker pool (--workers) instead of one file at a time
+- per-host concurrency limit, so parallel downloads never hammer one server
+- HTTP Range resume: data is written to "<file>.part" and an interrupted
+  download continues from the bytes already on disk. The ETag / Last-Modified
+  of the partial download are kept in "<file>.part.json" and sent as If-Range,
+  so a file that changed on the server is downloaded again from the start
+  instead of being spliced onto the old bytes (also when the server ignores
+  Range, when the validators are missing, and for refresh jobs)
+- streaming: the body is written in CHUNK_SIZE blocks while its SHA-256 is
+  computed incrementally, so memory use is constant whatever the file size;
+  the .part file is fsync'ed and atomically renamed only once its size
+  matches Content-Length, so a crash never leaves a truncated final file
+- content-addressed store (optional, blob_store.BlobStore): completed files
+  are moved into the store and linked back to their path, and a URL whose
+  content is already stored is linked without downloading it again
+- conditional refresh: a job may carry If-None-Match / If-Modified-Since
+  (conditional_headers()); a 304 answer leaves the file untouched and the
+  result reports "not_modified". ETag and Last-Modified of every response
+  are returned so callers can store them for the next refresh
+- download session (DownloadSession): bytes, duration, retries and failures
+  per host and overall, an optional global bandwidth budget (token bucket on
+  bytes shared by all workers, --max-rate) and a JSON run summary
+- hash cache: hash_files() reuses the SHA-256 recorded in a manifest when a
+  file's (size, mtime, inode) is unchanged and hashes the others in parallel
+
+Standard library only (urllib), like the downloaders that use it.
+"""
+
+import hashlib
+import http.client
+import json
+import os
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from urllib.parse import urlparse
+
+DEFAULT_WORKERS = 4
+DEFAULT_PER_HOST = 2
+DEFAULT_TIMEOUT = 60
+DEFAULT_RETRIES = 3
+CHUNK_SIZE = 64 * 1024
+PART_SUFFIX = ".part"
+PART_META_SUFFIX = ".json"   # validators of a partial download: <file>.part.json
+SUMMARY_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           "logs", "downloads")
+
+# Client errors that will not go away by retrying
+PERMANENT_HTTP_ERRORS = {400, 401, 403, 404, 410}
+
+
+class IncompleteDownload(OSError):
+    """The connection closed before the announced number of bytes arrived."""
+
+
+def url_host(url):
+    """Lower-case host of a URL, used as the key for per-host limits."""
+    return (urlparse(url).hostname or "").lower()
+
+
+def insecure_ssl_context():
+    """SSL context without certificate verification (some portals have broken chains)."""
+    ctx = ssl.create_default_context()
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def response_validators(headers):
+    """ETag and Last-Modified of a response (None when absent)."""
+    return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since from validators stored by a previous download."""
+    headers = {}
+    if entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+
+def parse_rate(value):
+    """Bandwidth as bytes/s from "500K", "2M", "1.5M" or a plain number (argparse type)."""
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = str(value).strip().upper().removesuffix("/S").removesuffix("B")
+    factor = units.get(text[-1:], 1)
+    number = text[:-1] if text[-1:] in units else text
+    try:
+        rate = float(number) * factor
+    except ValueError:
+        raise ValueError(f"invalid rate: {value!r}") from None
+    if rate <= 0:
+        raise ValueError(f"rate must be positive: {value!r}")
+    return int(rate)
+
+
+def format_rate(bytes_per_s):
+    if bytes_per_s >= 1024 ** 2:
+        return f"{bytes_per_s / 1024 ** 2:.1f} MB/s"
+    return f"{bytes_per_s / 1024:.0f} KB/s"
+
+
+def file_sha256(path):
+    """SHA-256 of a file, read in chunks."""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def file_stat_key(path):
+    """Stat fields stored next to a hash to tell whether a file changed."""
+    st = os.stat(path)
+    return {"size_bytes": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+
+def hash_files(paths, cached=None, workers=DEFAULT_WORKERS):
+    """
+    SHA-256 of several files, re-hashing only those whose stat changed.
+
+    Args:
+        paths: files to hash
+        cached: {path: manifest entry} with "sha256", "size_bytes",
+                "mtime_ns" and "inode" from a previous run
+        workers: threads used for the files that must be re-hashed
+
+    Returns:
+        {path: (sha256, stat key, True if taken from the cache)}
+    """
+    cached = cached or {}
+    hashes = {}
+    stale = []
+    for path in paths:
+        key = file_stat_key(path)
+        entry = cached.get(path) or {}
+        if entry.get("sha256") and all(entry.get(k) == v for k, v in key.items()):
+            hashes[path] = (entry["sha256"], key, True)
+        else:
+            stale.append((path, key))
+
+    if len(stale) == 1 or workers <= 1:
+        for path, key in stale:
+            hashes[path] = (file_sha256(path), key, False)
+    elif stale:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            digests = executor.map(file_sha256, [path for path, _ in stale])
+            for (path, key), sha in zip(stale, digests):
+                hashes[path] = (sha, key, False)
+    return hashes
+
+
+class BandwidthBudget:
+    """
+    Token bucket on bytes, shared by all workers: caps the overall
+    throughput at rate bytes/s. A worker takes the bytes it has just read
+    and, if the bucket goes into debt, sleeps until the debt is repaid.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate, CHUNK_SIZE))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class DownloadSession:
+    """
+    Statistics of one download run, per host and overall, plus the optional
+    global bandwidth budget. Shared by all the workers of an engine.
+    """
+
+    def __init__(self, max_rate=None):
+        self.budget = BandwidthBudget(max_rate) if max_rate else None
+        self.started = datetime.now()
+        self._t0 = time.monotonic()
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "files": 0, "ok": 0, "not_modified": 0, "from_store": 0, "failed": 0,
+                "retries": 0, "bytes": 0, "download_s": 0.0, "first": None, "last": None,
+            }
+        return self._hosts[host]
+
+    def transferred(self, host, nbytes):
+        """Bytes read from the network (waits here when over budget)."""
+        if self.budget is not None:
+            self.budget.consume(nbytes)
+        with self._lock:
+            self._host(host)["bytes"] += nbytes
+
+    def retried(self, host):
+        with self._lock:
+            self._host(host)["retries"] += 1
+
+    def finished(self, host, result):
+        now = time.monotonic()
+        with self._lock:
+            stats = self._host(host)
+            stats["files"] += 1
+            if result["status"] == "ok" and result["from_store"]:
+                stats["from_store"] += 1
+            elif result["status"] in ("ok", "not_modified", "failed"):
+                stats[result["status"]] += 1
+            stats["download_s"] += result["duration_s"]
+            start = now - result["duration_s"]
+            stats["first"] = start if stats["first"] is None else min(stats["first"], start)
+            stats["last"] = now if stats["last"] is None else max(stats["last"], now)
+
+    def summary(self):
+        """
+        Run summary. A host's bytes_per_s is measured over the span in which
+        it had downloads in progress; the overall one over the whole run.
+        """
+        elapsed = time.monotonic() - self._t0
+        with self._lock:
+            hosts = {}
+            for host, stats in sorted(self._hosts.items()):
+                span = (stats["last"] - stats["first"]) if stats["files"] else 0
+                entry = {k: v for k, v in stats.items() if k not in ("first", "last")}
+                entry["download_s"] = round(stats["download_s"], 3)
+                entry["bytes_per_s"] = round(stats["bytes"] / span) if span > 0 else 0
+                hosts[host] = entry
+
+        total = {key: sum(h[key] for h in hosts.values())
+                 for key in ("files", "ok", "not_modified", "from_store", "failed",
+                             "retries", "bytes")}
+        total["bytes_per_s"] = round(total["bytes"] / elapsed) if elapsed > 0 else 0
+        return {
+            "started": self.started.isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "elapsed_s": round(elapsed, 3),
+            "max_rate": int(self.budget.rate) if self.budget else None,
+            "total": total,
+            "hosts": hosts,
+        }
+
+    def report(self, log=print):
+        """Throughput table per host."""
+        summary = self.summary()
+        if not summary["hosts"]:
+            return summary
+        log(f"\n  {'HOST':<34} {'FILES':>5} {'MB':>8} {'RATE':>11} {'RETRY':>5} {'FAIL':>5}")
+        rows = list(summary["hosts"].items()) + [("TOTAL", summary["total"])]
+        for host, stats in rows:
+            log(f"  {host[:34]:<34} {stats['files']:>5} {stats['bytes'] / 1024 ** 2:>8.1f} "
+                f"{format_rate(stats['bytes_per_s']):>11} {stats['retries']:>5} {stats['failed']:>5}")
+        return summary
+
+    def write_summary(self, path):
+        """Write the JSON run summary atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+        os.replace(tmp_path, path)
+        return path
+
+
+def summary_path(name):
+    """Default path of a run summary: logs/downloads/<name>_<timestamp>.json."""
+    return os.path.join(SUMMARY_DIR, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+
+
+class DownloadEngine:
+    """
+    Downloads files in parallel with a bounded pool of worker threads.
+
+    Each job is a dict with at least "url" and "dest" (path of the final
+    file); "label" is used in log lines and "headers" are added to the
+    request; "refresh": True bypasses the store lookup. Results are dicts:
+
+        {"status": "ok" | "not_modified" | "failed", "size": int,
+         "sha256": str | None, "resumed": bool, "from_store": bool,
+         "http_status": int | None, "etag": str | None,
+         "last_modified": str | None, "duration_s": float, "error": str | None}
+
+    "not_modified" is returned when the job sent conditional headers and the
+    server answered 304: dest is left as it is and sha256 is None.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST,
+                 headers=None, timeout=DEFAULT_TIMEOUT, max_retries=DEFAULT_RETRIES,
+                 ssl_context=None, store=None, session=None, log=print):
+        self.workers = max(1, workers)
+        self.per_host = max(1, per_host)
+        self.headers = dict(headers or {})
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.ssl_context = ssl_context
+        self.store = store
+        self.session = session or DownloadSession()
+        self._log = log
+        self._log_lock = threading.Lock()
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def log(self, message):
+        with self._log_lock:
+            self._log(message)
+
+    def _host_slot(self, host):
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_slots[host]
+
+    # --- Single download ---
+
+    def _request(self, url, headers):
+        req = urllib.request.Request(url, headers=headers)
+        return urllib.request.urlopen(req, timeout=self.timeout, context=self.ssl_context)
+
+    @staticmethod
+    def _expected_size(resp):
+        """Total file size announced by the server, None if unknown."""
+        if resp.status == 206:
+            total = (resp.headers.get("Content-Range") or "").rpartition("/")[2]
+            return int(total) if total.isdigit() else None
+        length = resp.headers.get("Content-Length")
+        return int(length) if length and length.isdigit() else None
+
+    @staticmethod
+    def _discard_part(part_path):
+        """Remove a partial download and its validators."""
+        for path in (part_path, part_path + PART_META_SUFFIX):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _part_if_range(part_path):
+        """
+        If-Range value for resuming part_path: its strong ETag, else its
+        Last-Modified; None when the partial download has no usable validator.
+        """
+        try:
+            with open(part_path + PART_META_SUFFIX, "r", encoding="utf-8") as f:
+                validators = json.load(f)
+        except (OSError, ValueError):
+            return None
+        etag = validators.get("etag")
+        if etag and not etag.startswith("W/"):
+            return etag
+        return validators.get("last_modified")
+
+    @staticmethod
+    def _save_part_validators(part_path, validators):
+        with open(part_path + PART_META_SUFFIX, "w", encoding="utf-8") as f:
+            json.dump(validators, f)
+
+    @staticmethod
+    def _hash_prefix(sha, part_path):
+        """Feed the bytes already in the part file to the running hash."""
+        with open(part_path, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+
+    def _transfer(self, job, part_path):
+        """
+        One download attempt into part_path, resuming from its current size.
+        The body is streamed to disk and hashed chunk by chunk.
+
+        Returns:
+            (bytes in the part file, sha256 hexdigest, resumed, http status,
+             response validators)
+
+        Raises:
+            IncompleteDownload if fewer bytes than announced were received
+            (the part file is kept for the next attempt)
+        """
+        headers = dict(self.headers)
+        headers.update(job.get("headers") or {})
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if_range = self._part_if_range(part_path) if offset else None
+        if offset and if_range is None:
+            # Unknown version of the partial bytes: start over
+            self._discard_part(part_path)
+            offset = 0
+        if offset:
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = if_range
+
+        try:
+            resp = self._request(job["url"], headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 416 and offset:
+                # Range not satisfiable: the part file is unusable, start over
+                self._discard_part(part_path)
+                return self._transfer(job, part_path)
+            raise
+
+        host = url_host(job["url"])
+        with resp:
+            # 200 to a Range + If-Range request: the file changed, full body follows
+            resumed = offset > 0 and resp.status == 206
+            if not resumed:
+                self._save_part_validators(part_path, response_validators(resp.headers))
+            expected = self._expected_size(resp)
+            sha = hashlib.sha256()
+            if resumed:
+                self._hash_prefix(sha, part_path)
+            size = offset if resumed else 0
+            with open(part_path, "ab" if resumed else "wb") as f:
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    sha.update(chunk)
+                    size += len(chunk)
+                    self.session.transferred(host, len(chunk))
+                f.flush()
+                os.fsync(f.fileno())
+
+        if expected is not None and size != expected:
+            raise IncompleteDownload(f"received {size} of {expected} bytes")
+        return size, sha.hexdigest(), resumed, resp.status, response_validators(resp.headers)
+
+    def fetch(self, job):
+        """Download one job (blocking), with retries and Range resume."""
+        started = time.monotonic()
+        result = self._fetch(job)
+        result["duration_s"] = round(time.monotonic() - started, 3)
+        self.session.finished(url_host(job["url"]), result)
+        return result
+
+    def _fetch(self, job):
+        dest = str(job["dest"])
+        label = job.get("label") or os.path.basename(dest)
+        part_path = dest + PART_SUFFIX
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+
+        result = {"status": "failed", "size": 0, "sha256": None, "resumed": False,
+                  "from_store": False, "http_status": None, "etag": None,
+                  "last_modified": None, "error": None}
+
+        # Content already known for this URL: link it, no request
+        if self.store is not None and not job.get("refresh"):
+            sha = self.store.lookup(job["url"])
+            if sha:
+                self.store.link(sha, dest)
+                result.update(status="ok", size=os.path.getsize(dest), sha256=sha,
+                              from_store=True)
+                return result
+
+        if job.get("refresh"):
+            # Refresh of a file that may have changed: never resume an older partial download
+            self._discard_part(part_path)
+
+        with self._host_slot(url_host(job["url"])):
+            for attempt in range(self.max_retries):
+                try:
+                    size, sha, resumed, status, validators = self._transfer(job, part_path)
+                    if self.store is not None:
+                        self.store.add(part_path, sha)
+                        self.store.link(sha, dest)
+                        self.store.remember(job["url"], sha)
+                    else:
+                        os.replace(part_path, dest)
+                    self._discard_part(part_path)
+                    result.update(status="ok", size=size, sha256=sha, http_status=status,
+                                  resumed=resumed, error=None,
+                                  **validators)
+                    return result
+                except urllib.error.HTTPError as e:
+                    if e.code == 304:
+                        # Unchanged on the server: keep dest, drop any stale part file
+                        self._discard_part(part_path)
+                        size = os.path.getsize(dest) if os.path.exists(dest) else 0
+                        result.update(status="not_modified", size=size, http_status=304,
+                                      error=None, **response_validators(e.headers))
+                        return result
+                    result.update(http_status=e.code, error=f"HTTP {e.code}")
+                    self.log(f"  [ERROR] {label}: HTTP {e.code}")
+                    if e.code in PERMANENT_HTTP_ERRORS:
+                        return result
+                except (urllib.error.URLError, http.client.HTTPException, OSError) as e:
+                    reason = getattr(e, "reason", e)
+                    result["error"] = str(reason)[:200]
+                    partial = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                    self.log(f"  [ERROR] {label}: {reason} "
+                             f"(attempt {attempt + 1}/{self.max_retries}, {partial} bytes kept)")
+                    result["resumed"] = result["resumed"] or partial > 0
+
+                if attempt < self.max_retries - 1:
+                    self.session.retried(url_host(job["url"]))
+                    time.sleep(2 ** (attempt + 1))
+        return result
+
+    # --- Parallel run ---
+
+    def run(self, jobs):
+        """
+        Download all jobs in parallel.
+
+        Yields:
+            (job, result) in completion order
+        """
+        jobs = list(jobs)
+        if self.workers == 1:
+            for job in jobs:
+                yield job, self.fetch(job)
+            return
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.fetch, job): job for job in jobs}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
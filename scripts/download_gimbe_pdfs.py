@@ -3,172 +3,96 @@
 Download all available GIMBE report PDFs.
 Saves to datasets/raw/gimbe/pdf/
 
+The PDFs are declared in download_registry.json (collection "gimbe", see
+download_registry.py).
+
+Downloads run in parallel through download_engine.DownloadEngine (bounded
+worker pool, per-host limit, Range resume of interrupted files). PDFs are
+streamed to a .part file with incremental SHA-256 and renamed only when
+complete, so a file on disk is never a truncated download. Files are kept
+once in the content-addressed store (blob_store.py) and hardlinked here;
+a URL whose content is already stored is not downloaded again.
+
+The manifest doubles as a hash cache: PDFs whose size, mtime and inode match
+their manifest entry are not re-hashed; the others are hashed in parallel.
+It also keeps the ETag and Last-Modified of each PDF: --force sends them as
+If-None-Match / If-Modified-Since and only PDFs changed on the server (200
+instead of 304) are downloaded and rewritten.
+
 Usage:
     python3 scripts/download_gimbe_pdfs.py           # Download missing PDFs
     python3 scripts/download_gimbe_pdfs.py --check   # Show status only
-    python3 scripts/download_gimbe_pdfs.py --force   # Re-download all
+    python3 scripts/download_gimbe_pdfs.py --force   # Refresh all (conditional requests)
+    python3 scripts/download_gimbe_pdfs.py --workers 8 --per-host 2
+    python3 scripts/download_gimbe_pdfs.py --max-rate 2M  # Cap bandwidth at 2 MB/s
+
+Each run prints throughput per host and writes a JSON summary (bytes,
+durations, retries, failures per host) to logs/downloads/.
 """
 
 import argparse
 import os
 import sys
 import time
-import hashlib
 import json
-import urllib.request
-import urllib.error
-import ssl
+
+from blob_store import BlobStore
+from download_engine import (
+    DEFAULT_PER_HOST, DEFAULT_WORKERS, DownloadEngine, DownloadSession, conditional_headers,
+    file_stat_key, hash_files, insecure_ssl_context, parse_rate, summary_path,
+)
+from download_registry import DownloadRegistry
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 PDF_DIR = os.path.join(BASE_DIR, "datasets", "raw", "gimbe", "pdf")
 MANIFEST_PATH = os.path.join(PDF_DIR, "manifest.json")
 
-# All known GIMBE PDF URLs with descriptive filenames
-GIMBE_PDFS = [
-    # --- Rapporti annuali sul SSN ---
-    {
-        "filename": "1_Rapporto_GIMBE_SSN_2016.pdf",
-        "url": "https://salviamo-ssn.it/var/contenuti/1_Rapporto_GIMBE.pdf",
-        "category": "rapporto_annuale",
-        "edition": "1° Rapporto",
-        "year": 2016,
-    },
-    {
-        "filename": "2_Rapporto_GIMBE_SSN_2017.pdf",
-        "url": "https://salviamo-ssn.it/var/contenuti/2_Rapporto_GIMBE.pdf",
-        "category": "rapporto_annuale",
-        "edition": "2° Rapporto",
-        "year": 2017,
-    },
-    {
-        "filename": "3_Rapporto_GIMBE_SSN_2018.pdf",
-        "url": "https://salviamo-ssn.it/var/contenuti/3_Rapporto_GIMBE.pdf",
-        "category": "rapporto_annuale",
-        "edition": "3° Rapporto",
-        "year": 2018,
-    },
-    {
-        "filename": "4_Rapporto_GIMBE_SSN_2019.pdf",
-        "url": "https://www.salviamo-ssn.it/var/contenuti/4_Rapporto_GIMBE_Sostenibilita_SSN.pdf",
-        "category": "rapporto_annuale",
-        "edition": "4° Rapporto",
-        "year": 2019,
-    },
-    {
-        "filename": "5_Rapporto_GIMBE_SSN_2022.pdf",
-        "url": "https://www.quotidianosanita.it/allegati/allegato1665475004.pdf",
-        "category": "rapporto_annuale",
-        "edition": "5° Rapporto",
-        "year": 2022,
-    },
-    {
-        "filename": "6_Rapporto_GIMBE_SSN_2023.pdf",
-        "url": "https://www.quotidianosanita.it/allegati/allegato1696924905.pdf",
-        "category": "rapporto_annuale",
-        "edition": "6° Rapporto",
-        "year": 2023,
-    },
-    {
-        "filename": "7_Rapporto_GIMBE_SSN_2024.pdf",
-        "url": "https://www.camera.it/temiap/2024/10/09/OCD177-7603.pdf",
-        "category": "rapporto_annuale",
-        "edition": "7° Rapporto",
-        "year": 2024,
-    },
-    {
-        "filename": "8_Rapporto_GIMBE_SSN_2025.pdf",
-        "url": "https://www.salviamo-ssn.it/var/contenuti/8_Rapporto_GIMBE_SSN.pdf",
-        "category": "rapporto_annuale",
-        "edition": "8° Rapporto",
-        "year": 2025,
-    },
-    # --- Report Osservatorio GIMBE ---
-    {
-        "filename": "Report_Osservatorio_GIMBE_2023.01_Regionalismo_differenziato.pdf",
-        "url": "https://www.gimbe.org/osservatorio/Report_Osservatorio_GIMBE_2023.01_Regionalismo_differenziato_in_sanita.pdf",
-        "category": "osservatorio",
-        "edition": "1/2023",
-        "year": 2023,
-    },
-    {
-        "filename": "Report_Osservatorio_GIMBE_2023.04_Filiera_healthcare.pdf",
-        "url": "https://www.gimbe.org/osservatorio/Report_Osservatorio_GIMBE_2023.04_Ruolo_filiera_healthcare_nel_SSN.pdf",
-        "category": "osservatorio",
-        "edition": "4/2023",
-        "year": 2023,
-    },
-    {
-        "filename": "Report_Osservatorio_GIMBE_2024.01_Mobilita_sanitaria_2021.pdf",
-        "url": "https://www.gimbe.org/osservatorio/Report_Osservatorio_GIMBE_2024.01_Mobilita_sanitaria_2021.pdf",
-        "category": "osservatorio",
-        "edition": "1/2024",
-        "year": 2024,
-    },
-    {
-        "filename": "Report_Osservatorio_GIMBE_2024.02_Autonomia_differenziata.pdf",
-        "url": "https://documenti.camera.it/leg19/documentiAcquisiti/COM01/Audizioni/leg19.com01.Audizioni.Memoria.PUBBLICO.ideGes.34026.26-03-2024-11-34-12.951.pdf",
-        "category": "osservatorio",
-        "edition": "2/2024",
-        "year": 2024,
-    },
-    {
-        "filename": "Report_Osservatorio_GIMBE_2024.03_Scuole_promuovono_salute.pdf",
-        "url": "https://www.gimbe.org/osservatorio/Report_Osservatorio_GIMBE_2024.03_Scuole_che_promuovono_salute.pdf",
-        "category": "osservatorio",
-        "edition": "3/2024",
-        "year": 2024,
-    },
-    {
-        "filename": "Report_Osservatorio_GIMBE_2025.01_Mobilita_sanitaria_2022.pdf",
-        "url": "https://www.avis.it/wp-content/uploads/2025/03/Report_Osservatorio_GIMBE_2025.01_Mobilita_sanitaria_2022.pdf",
-        "category": "osservatorio",
-        "edition": "1/2025",
-        "year": 2025,
-    },
-    {
-        "filename": "Report_Osservatorio_GIMBE_2025.02_Spesa_sanitaria_privata_2023.pdf",
-        "url": "https://salviamo-ssn.it/var/contenuti/Report_Osservatorio_GIMBE_2025.02_Spesa_sanitaria_privata_2023.pdf",
-        "category": "osservatorio",
-        "edition": "2/2025",
-        "year": 2025,
-    },
-]
-
-
-def download_pdf(url, filepath, max_retries=3):
-    """Download a PDF with retries and exponential backoff."""
-    ctx = ssl.create_default_context()
-    ctx.check_hostname = False
-    ctx.verify_peer = False
-
-    headers = {
-        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
-                       "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "Accept": "application/pdf,*/*",
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+                   "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "Accept": "application/pdf,*/*",
+}
+
+
+def load_pdfs():
+    """GIMBE PDFs declared in download_registry.json (collection "gimbe"), in registry order."""
+    return DownloadRegistry().find(collection="gimbe")
+
+
+def load_manifest_cache():
+    """
+    Previous manifest entries by path, used as a hash cache (a file whose
+    size, mtime and inode match its entry is not re-hashed) and as the source
+    of the HTTP validators for conditional refreshes.
+    """
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            files = json.load(f).get("files", [])
+    except (OSError, ValueError):
+        return {}
+    return {os.path.join(PDF_DIR, e["filename"]): e for e in files if e.get("filename")}
+
+
+def manifest_entry(pdf, size, sha, status, stat_key=None, validators=None):
+    entry = {
+        "filename": pdf["filename"],
+        "category": pdf["category"],
+        "edition": pdf["edition"],
+        "year": pdf["year"],
+        "url": pdf["url"],
+        "size_bytes": size,
     }
-
-    for attempt in range(max_retries):
-        try:
-            req = urllib.request.Request(url, headers=headers)
-            with urllib.request.urlopen(req, context=ctx, timeout=120) as resp:
-                data = resp.read()
-
-                if len(data) < 1000:
-                    print(f"    WARNING: File too small ({len(data)} bytes), may not be valid")
-
-                with open(filepath, "wb") as f:
-                    f.write(data)
-
-                return len(data), hashlib.sha256(data).hexdigest()
-
-        except (urllib.error.URLError, urllib.error.HTTPError, OSError) as e:
-            wait = 2 ** (attempt + 1)
-            print(f"    Attempt {attempt + 1}/{max_retries} failed: {e}")
-            if attempt < max_retries - 1:
-                print(f"    Retrying in {wait}s...")
-                time.sleep(wait)
-
-    return None, None
+    if status == "ok":
+        entry["size_human"] = format_size(size)
+    entry["sha256"] = sha
+    if stat_key:
+        entry["mtime_ns"] = stat_key["mtime_ns"]
+        entry["inode"] = stat_key["inode"]
+    for key in ("etag", "last_modified"):
+        if validators and validators.get(key):
+            entry[key] = validators[key]
+    entry["status"] = status
+    return entry
 
 
 def format_size(size_bytes):
@@ -186,11 +110,13 @@ def check_status():
     print("=" * 70)
     print(f"\nDirectory: {PDF_DIR}\n")
 
+    pdfs = load_pdfs()
+
     ok = 0
     missing = 0
     total_size = 0
 
-    for pdf in GIMBE_PDFS:
+    for pdf in pdfs:
         filepath = os.path.join(PDF_DIR, pdf["filename"])
         if os.path.exists(filepath) and os.path.getsize(filepath) > 1000:
             size = os.path.getsize(filepath)
@@ -203,8 +129,8 @@ def check_status():
             missing += 1
 
     print(f"\n{'=' * 70}")
-    print(f"Scaricati: {ok}/{len(GIMBE_PDFS)} ({format_size(total_size)})")
-    print(f"Mancanti:  {missing}/{len(GIMBE_PDFS)}")
+    print(f"Scaricati: {ok}/{len(pdfs)} ({format_size(total_size)})")
+    print(f"Mancanti:  {missing}/{len(pdfs)}")
     if missing > 0:
         print(f"\nEsegui senza --check per scaricare i PDF mancanti")
     print(f"{'=' * 70}")
@@ -213,7 +139,18 @@ def check_status():
 def main():
     parser = argparse.ArgumentParser(description="Download GIMBE report PDFs")
     parser.add_argument("--check", action="store_true", help="Show status only")
-    parser.add_argument("--force", action="store_true", help="Re-download all")
+    parser.add_argument("--force", action="store_true",
+                        help="Refresh all: re-download only PDFs changed on the server")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Write files directly, without the content-addressed store")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"Parallel downloads (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--max-rate", type=parse_rate, default=None,
+                        help="Global bandwidth budget in bytes/s, e.g. 500K or 2M (default: no limit)")
+    parser.add_argument("--summary", type=str, default=None,
+                        help="Path of the JSON run summary (default: logs/downloads/gimbe_<timestamp>.json)")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help=f"Max parallel downloads per host (default: {DEFAULT_PER_HOST})")
     args = parser.parse_args()
 
     os.makedirs(PDF_DIR, exist_ok=True)
@@ -225,73 +162,87 @@ def main():
     print("=" * 70)
     print("DOWNLOAD REPORT GIMBE - PDF COMPLETI")
     print("=" * 70)
+
+    pdfs = load_pdfs()
     print(f"\nTarget: {PDF_DIR}")
-    print(f"Report totali: {len(GIMBE_PDFS)}\n")
+    print(f"Report totali: {len(pdfs)}\n")
 
-    manifest = []
-    success = 0
-    failed = 0
-    skipped = 0
+    entries = {}
+    jobs = []
+    existing = {}
+    cache = load_manifest_cache()
 
-    for i, pdf in enumerate(GIMBE_PDFS, 1):
+    for i, pdf in enumerate(pdfs, 1):
         filepath = os.path.join(PDF_DIR, pdf["filename"])
+        present = os.path.exists(filepath) and os.path.getsize(filepath) > 1000
 
         # Skip if already downloaded (unless --force)
-        if not args.force and os.path.exists(filepath) and os.path.getsize(filepath) > 1000:
+        if not args.force and present:
             size = os.path.getsize(filepath)
-            sha = hashlib.sha256(open(filepath, "rb").read()).hexdigest()
-            print(f"[{i}/{len(GIMBE_PDFS)}] SKIP (exists): {pdf['filename']} ({format_size(size)})")
-            manifest.append({
-                "filename": pdf["filename"],
-                "category": pdf["category"],
-                "edition": pdf["edition"],
-                "year": pdf["year"],
-                "url": pdf["url"],
-                "size_bytes": size,
-                "size_human": format_size(size),
-                "sha256": sha,
-                "status": "ok",
-            })
-            success += 1
-            skipped += 1
+            print(f"[{i}/{len(pdfs)}] SKIP (exists): {pdf['filename']} ({format_size(size)})")
+            existing[filepath] = pdf
             continue
 
-        print(f"[{i}/{len(GIMBE_PDFS)}] Downloading: {pdf['filename']}")
-        print(f"    URL: {pdf['url']}")
-
-        size, sha = download_pdf(pdf["url"], filepath)
-
-        if size:
-            print(f"    OK: {format_size(size)}")
-            manifest.append({
-                "filename": pdf["filename"],
-                "category": pdf["category"],
-                "edition": pdf["edition"],
-                "year": pdf["year"],
-                "url": pdf["url"],
-                "size_bytes": size,
-                "size_human": format_size(size),
-                "sha256": sha,
-                "status": "ok",
-            })
-            success += 1
+        job = {"url": pdf["url"], "dest": filepath, "label": pdf["filename"], "pdf": pdf,
+               "refresh": args.force}
+        # --force on a file we have: ask the server whether it changed
+        cached = cache.get(filepath) or {}
+        if args.force and present and cached.get("url") == pdf["url"]:
+            job["headers"] = conditional_headers(cached)
+        jobs.append(job)
+
+    if jobs:
+        print(f"\nDownloading {len(jobs)} PDF ({args.workers} workers, {args.per_host} per host)\n")
+    store = None if args.no_store else BlobStore()
+    session = DownloadSession(max_rate=args.max_rate)
+    engine = DownloadEngine(workers=args.workers, per_host=args.per_host, headers=HEADERS,
+                            timeout=120, ssl_context=insecure_ssl_context(), store=store,
+                            session=session)
+    for job, result in engine.run(jobs):
+        pdf = job["pdf"]
+        cached = cache.get(job["dest"]) or {}
+        if result["status"] == "not_modified":
+            print(f"  [SAME]   {pdf['filename']}: not modified on the server")
+            existing[job["dest"]] = pdf
+            # The 304 may carry refreshed validators
+            cache[job["dest"]] = {**cached, **{k: v for k, v in result.items()
+                                              if k in ("etag", "last_modified") and v}}
+        elif result["status"] == "ok":
+            size = result["size"]
+            if size < 1000:
+                print(f"    WARNING: {pdf['filename']} too small ({size} bytes), may not be valid")
+            note = " (from store)" if result["from_store"] else " (resumed)" if result["resumed"] else ""
+            print(f"  [OK]     {pdf['filename']}: {format_size(size)}{note}")
+            # Linked from the store: no response, keep the validators of the same content
+            validators = result
+            if not (result["etag"] or result["last_modified"]) and cached.get("sha256") == result["sha256"]:
+                validators = cached
+            entries[pdf["filename"]] = manifest_entry(pdf, size, result["sha256"], "ok",
+                                                      file_stat_key(job["dest"]), validators)
         else:
-            print(f"    FAILED")
-            manifest.append({
-                "filename": pdf["filename"],
-                "category": pdf["category"],
-                "edition": pdf["edition"],
-                "year": pdf["year"],
-                "url": pdf["url"],
-                "size_bytes": 0,
-                "sha256": None,
-                "status": "failed",
-            })
-            failed += 1
-
-        # Rate limit between requests
-        if i < len(GIMBE_PDFS):
-            time.sleep(1)
+            print(f"  [FAILED] {pdf['filename']}: {result['error']}")
+            print(f"           URL: {pdf['url']}")
+            entries[pdf["filename"]] = manifest_entry(pdf, 0, None, "failed")
+
+    if store is not None:
+        store.close()
+
+    # Existing and unchanged files: hash only those changed since the last
+    # manifest, in parallel
+    skipped = len(existing)
+    hashes = hash_files(list(existing), cache, workers=args.workers)
+    rehashed = sum(1 for _, _, from_cache in hashes.values() if not from_cache)
+    if existing:
+        print(f"\nHash: {skipped - rehashed} from manifest cache, {rehashed} recomputed")
+    for filepath, (sha, stat_key, _) in hashes.items():
+        pdf = existing[filepath]
+        entries[pdf["filename"]] = manifest_entry(pdf, stat_key["size_bytes"], sha, "ok", stat_key,
+                                                  cache.get(filepath))
+
+    # Manifest in catalog order, whatever the completion order
+    manifest = [entries[pdf["filename"]] for pdf in pdfs]
+    success = sum(1 for e in manifest if e["status"] == "ok")
+    failed = len(manifest) - success
 
     # Save manifest
     with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
@@ -299,7 +250,7 @@ def main():
             "description": "GIMBE Report PDF collection manifest",
             "download_date": time.strftime("%Y-%m-%d"),
             "note": "Run 'python3 scripts/download_gimbe_pdfs.py' to download missing PDFs",
-            "total": len(GIMBE_PDFS),
+            "total": len(pdfs),
             "downloaded": success,
             "failed": failed,
             "files": manifest,
@@ -307,12 +258,14 @@ def main():
 
     print(f"\n{'=' * 70}")
     downloaded = success - skipped
-    print(f"RISULTATO: {success}/{len(GIMBE_PDFS)} disponibili ({downloaded} nuovi, {skipped} già presenti)")
+    print(f"RISULTATO: {success}/{len(pdfs)} disponibili ({downloaded} nuovi, {skipped} già presenti)")
     if failed > 0:
         print(f"           {failed} download falliti")
     total_size = sum(f["size_bytes"] for f in manifest)
     print(f"Dimensione totale: {format_size(total_size)}")
     print(f"Manifest: {MANIFEST_PATH}")
+    session.report()
+    print(f"Run summary: {session.write_summary(args.summary or summary_path('gimbe'))}")
     print(f"{'=' * 70}")
 
     return 0 if failed == 0 else 1
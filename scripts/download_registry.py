@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Download registry: the documents fetched by download_gimbe_pdfs.py and
+download_pdta.py, declared in download_registry.json instead of Python
+literals.
+
+The file has a "collections" section (target directory, path layout and
+defaults of each collection) and a flat "entries" list, one document per
+entry:
+
+    {"id": "NAZ_AGENAS_003", "collection": "pdta", "level": "nazionale",
+     "group": "agenas", "category": "pdta", "title": "...", "year": 2026,
+     "filename": "...", "url": "..."}
+
+For PDTA, "group" is the region (level "regionale") or the issuing
+authority (level "nazionale"). The registry is read only on first use and
+indexed by collection, level, group, category and year, so a selective run
+(one region, one level) only touches the matching entries.
+
+Usage:
+    python3 scripts/download_registry.py list --collection pdta --level regionale --group lombardia
+    python3 scripts/download_registry.py values group
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REGISTRY_PATH = os.path.join(BASE_DIR, "download_registry.json")
+
+INDEXED_FIELDS = ("collection", "level", "group", "category", "year")
+
+
+class DownloadRegistry:
+    """Registry entries loaded lazily from JSON, with in-memory indexes."""
+
+    def __init__(self, path=REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = None
+        self._index = None
+        self._by_id = None
+
+    def _load(self):
+        with self._lock:
+            if self._data is None:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                index = {field: {} for field in INDEXED_FIELDS}
+                by_id = {}
+                for position, entry in enumerate(data.get("entries", [])):
+                    by_id[entry["id"]] = position
+                    for field in INDEXED_FIELDS:
+                        if entry.get(field) is not None:
+                            index[field].setdefault(str(entry[field]), []).append(position)
+                self._data, self._index, self._by_id = data, index, by_id
+        return self._data
+
+    # --- Lookup ---
+
+    def entries(self):
+        """All entries, in registry order."""
+        return list(self._load()["entries"])
+
+    def __len__(self):
+        return len(self._load()["entries"])
+
+    def get(self, entry_id, default=None):
+        entries = self._load()["entries"]
+        position = self._by_id.get(entry_id)
+        return entries[position] if position is not None else default
+
+    def find(self, **filters):
+        """
+        Entries matching all the given index filters (None = no filter),
+        in registry order. Only the positions listed under the most
+        selective filter are scanned.
+
+        Example:
+            registry.find(collection="pdta", level="regionale", group="lombardia")
+        """
+        entries = self._load()["entries"]
+        selected = []
+        for field, value in filters.items():
+            if field not in INDEXED_FIELDS:
+                raise ValueError(f"Not an indexed field: {field}")
+            if value is not None:
+                selected.append(self._index[field].get(str(value), []))
+        if not selected:
+            return list(entries)
+
+        selected.sort(key=len)
+        others = [set(positions) for positions in selected[1:]]
+        return [entries[p] for p in selected[0] if all(p in s for s in others)]
+
+    def values(self, field):
+        """Distinct values of an indexed field, with the number of entries."""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Not an indexed field: {field}")
+        self._load()
+        return sorted((value, len(positions)) for value, positions in self._index[field].items())
+
+    # --- Collections ---
+
+    def collection(self, name):
+        return self._load()["collections"][name]
+
+    def relpath(self, entry):
+        """Path of the downloaded file, relative to the repository root."""
+        coll = self.collection(entry["collection"])
+        parts = [entry[key] for key in coll.get("layout", [])]
+        return "/".join([coll["dir"], *parts, entry["filename"]])
+
+    def dest_path(self, entry):
+        """Absolute path of the downloaded file."""
+        return os.path.join(BASE_DIR, *self.relpath(entry).split("/"))
+
+    def as_source(self, entry):
+        """
+        Entry as a row of sources_catalog.csv, so scheduler_check_updates.py
+        can check registry documents like catalog sources.
+        """
+        coll = self.collection(entry["collection"])
+        geography = coll.get("geography", "")
+        if isinstance(geography, dict):
+            geography = geography.get(entry.get("level"), "")
+        return {
+            "source_id": entry["id"],
+            "title": entry.get("title") or entry["filename"],
+            "owner": entry.get("owner") or coll.get("owner") or entry.get("group", ""),
+            "category": entry.get("category", ""),
+            "url": entry["url"],
+            "license": coll.get("license", ""),
+            "update_frequency": coll.get("update_frequency", ""),
+            "geography": geography,
+            "granularity": "document",
+            "file_paths_in_repo": self.relpath(entry),
+            "last_checked": "",
+            "checksum": "",
+        }
+
+
+# === MAIN ===
+
+def main():
+    parser = argparse.ArgumentParser(description="Download registry (download_registry.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_list = sub.add_parser("list", help="List entries, filtered on the indexes")
+    for field in INDEXED_FIELDS:
+        p_list.add_argument(f"--{field}", type=str)
+    p_values = sub.add_parser("values", help="Distinct values of an indexed field")
+    p_values.add_argument("field", choices=INDEXED_FIELDS)
+    args = parser.parse_args()
+
+    registry = DownloadRegistry()
+    if args.command == "list":
+        entries = registry.find(**{f: getattr(args, f) for f in INDEXED_FIELDS})
+        for entry in entries:
+            print(f"  [{entry['id']}] {registry.relpath(entry)}")
+        print(f"\nEntries: {len(entries)}")
+    elif args.command == "values":
+        for value, count in registry.values(args.field):
+            print(f"  {value:<40} {count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,110 +2,214 @@
 """
 Script per elaborare i dati Orphadata sulle malattie rare in Italia.
 Estrae informazioni epidemiologiche e classifica le malattie per complessità.
+
+Il parsing è in streaming (iterparse): un record per Disorder, elementi
+rimossi appena elaborati, memoria limitata a un singolo disorder. Accetta i
+file Orphadata di qualunque lingua (il campo lang viene dal tag Name).
+
+Nella stessa passata viene scritta la tabella lunga di tutti i record di
+prevalenza (una riga per Prevalence: tipo, classe, area geografica, valore,
+stato di validazione) in malattie_rare_prevalenze.csv, e anche in Parquet se
+pyarrow è installato; la tabella per malattia conserva solo il primo record.
+
+Uso:
+    python3 scripts/parse_orphadata.py                       # datasets/raw/orphadata/orphadata_epidemiology_it.xml
+    python3 scripts/parse_orphadata.py datasets/raw/orphadata/  # tutti i file .xml (tutte le lingue)
 """
 
+import argparse
+import csv
+import glob
 import xml.etree.ElementTree as ET
 import pandas as pd
 import json
 import os
+from collections import Counter
+
+try:
+    import pyarrow  # noqa: F401  (opzionale, per il Parquet della tabella prevalenze)
+except ImportError:
+    pyarrow = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Stessa directory della fonte ORPHA_001 nel catalogo e dello step parse_orphadata della pipeline
+DEFAULT_INPUT = os.path.join(BASE_DIR, 'datasets', 'raw', 'orphadata', 'orphadata_epidemiology_it.xml')
+OUTPUT_DIR = os.path.join(BASE_DIR, 'datasets', 'processed')
+
+# Tabella lunga delle prevalenze: una riga per elemento Prevalence
+PREVALENCE_FIELDS = [
+    'orpha_code', 'lang', 'prevalence_type', 'prevalence_qualification',
+    'prevalence_class', 'prevalence_geo', 'value', 'validation_status',
+]
+
+# Campi cercati come discendenti del Disorder (equivalenti a disorder.find('.//<path>'))
+DESCENDANT_FIELDS = {
+    'disorder_type': 'DisorderType/Name',
+    'disorder_group': 'DisorderGroup/Name',
+    'average_age_onset': 'AverageAgeOfOnsets/AverageAgeOfOnset/Name',
+    'average_age_death': 'AverageAgeOfDeaths/AverageAgeOfDeath/Name',
+}
+
+def new_disease_record():
+    return {
+        'orpha_code': None,
+        'name': None,
+        'lang': None,
+        'expert_link': None,
+        'disorder_type': None,
+        'disorder_group': None,
+        'prevalence_class': None,
+        'prevalence_geo': None,
+        'prevalence_value': None,
+        'inheritance': None,
+        'age_of_onset': None,
+        'average_age_onset': None,
+        'average_age_death': None
+    }
+
+def find_in_child(child, path):
+    """
+    Primo elemento che corrisponde a './/<path>' cercato dal Disorder,
+    limitato al sottoalbero di un suo figlio diretto (figlio incluso).
+    """
+    head, _, rest = path.partition('/')
+    if child.tag == head:
+        found = child.find(rest)
+        if found is not None:
+            return found
+    return child.find('.//' + path)
+
+def prevalence_row(prevalence):
+    """Riga della tabella lunga per un elemento Prevalence (orpha_code e lang a parte)."""
+    value = prevalence.findtext('ValMoy')
+    if value is None:
+        value = prevalence.findtext('PrevalenceValMoy')
+    return {
+        'orpha_code': None,
+        'lang': None,
+        'prevalence_type': prevalence.findtext('PrevalenceType/Name'),
+        'prevalence_qualification': prevalence.findtext('PrevalenceQualification/Name'),
+        'prevalence_class': prevalence.findtext('PrevalenceClass/Name'),
+        'prevalence_geo': prevalence.findtext('PrevalenceGeographic/Name'),
+        'value': value,
+        'validation_status': prevalence.findtext('PrevalenceValidationStatus/Name'),
+    }
+
+def collect_disorder_child(record, found, child, prevalences=None):
+    """
+    Estrae i campi da un figlio diretto di un Disorder.
+    found contiene i campi già assegnati: vale il primo elemento in ordine
+    di documento, come con find() sull'albero completo. Se prevalences è
+    una lista, vi aggiunge le righe di tutti i record di prevalenza.
+    """
+    def first(key, elem):
+        if key not in found and elem is not None:
+            found.add(key)
+            record[key] = elem.text
+
+    # OrphaCode, Nome, Expert Link
+    if child.tag == 'OrphaCode':
+        first('orpha_code', child)
+    elif child.tag == 'Name':
+        if 'name' not in found:
+            record['lang'] = child.get('lang')
+        first('name', child)
+    elif child.tag == 'ExpertLink':
+        first('expert_link', child)
+
+    # Disorder Type/Group, età media di esordio e di decesso (solo figli
+    # con sottoelementi: i campi semplici non hanno discendenti)
+    if len(child):
+        for key, path in DESCENDANT_FIELDS.items():
+            if key not in found:
+                first(key, find_in_child(child, path))
 
-def parse_orphadata_epidemiology(xml_path):
+    # Tutti i record di prevalenza, per la tabella lunga
+    if child.tag == 'PrevalenceList' and prevalences is not None:
+        prevalences.extend(prevalence_row(p) for p in child.findall('Prevalence'))
+
+    # Prevalence data: solo il primo record della prima PrevalenceList
+    if child.tag == 'PrevalenceList' and 'prevalence' not in found:
+        found.add('prevalence')
+        prevalence = child.find('Prevalence')
+        if prevalence is not None:
+            prev_class = prevalence.find('.//PrevalenceClass/Name')
+            if prev_class is not None:
+                record['prevalence_class'] = prev_class.text
+            prev_geo = prevalence.find('.//PrevalenceGeographic/Name')
+            if prev_geo is not None:
+                record['prevalence_geo'] = prev_geo.text
+            prev_value = prevalence.find('PrevalenceValMoy')
+            if prev_value is not None:
+                record['prevalence_value'] = prev_value.text
+
+    # Age of onset
+    if child.tag == 'AverageAgeOfOnsetList' and 'age_of_onset' not in found:
+        found.add('age_of_onset')
+        ages = [age.text for age in child.findall('.//Name') if age.text]
+        record['age_of_onset'] = ', '.join(ages) if ages else None
+
+def iter_orphadata_disorders(xml_path, on_prevalence=None):
+    """
+    Parsa in streaming (iterparse) un file XML Orphadata di qualunque lingua
+    e restituisce un record per ogni Disorder.
+
+    on_prevalence, se indicato, viene chiamato con ogni riga della tabella
+    lunga delle prevalenze (PREVALENCE_FIELDS) durante la stessa passata.
+
+    Ogni Disorder viene elaborato alla chiusura (una sola passata sui figli
+    diretti), poi svuotato e rimosso dalla lista: la memoria resta limitata
+    a un singolo disorder e il tempo cresce linearmente con il file.
+    """
+    outer = []   # elementi aperti fuori dai Disorder (per rimuovere quelli elaborati)
+    depth = 0    # profondità dentro il Disorder corrente, 0 = fuori
+
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if depth:
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth:
+                continue
+            # Fine del Disorder
+            record, found = new_disease_record(), set()
+            prevalences = [] if on_prevalence is not None else None
+            for child in elem:
+                collect_disorder_child(record, found, child, prevalences)
+            if prevalences and record['orpha_code']:
+                for row in prevalences:
+                    row['orpha_code'] = record['orpha_code']
+                    row['lang'] = record['lang']
+                    on_prevalence(row)
+            yield record
+            elem.clear()
+            if outer:
+                outer[-1].remove(elem)
+        elif event == 'start':
+            if elem.tag == 'Disorder':
+                depth = 1
+            else:
+                outer.append(elem)
+        else:
+            outer.pop()
+
+def parse_orphadata_epidemiology(xml_path, on_prevalence=None):
     """
     Parsa il file XML di Orphadata con dati epidemiologici delle malattie rare.
     """
     print(f"Parsing {xml_path}...")
-    
-    tree = ET.parse(xml_path)
-    root = tree.getroot()
-    
-    diseases = []
-    
-    # Trova tutti i disorder
-    for disorder in root.iter('Disorder'):
-        disease_data = {
-            'orpha_code': None,
-            'name': None,
-            'expert_link': None,
-            'disorder_type': None,
-            'disorder_group': None,
-            'prevalence_class': None,
-            'prevalence_geo': None,
-            'prevalence_value': None,
-            'inheritance': None,
-            'age_of_onset': None,
-            'average_age_onset': None,
-            'average_age_death': None
-        }
-        
-        # OrphaCode
-        orpha_code = disorder.find('OrphaCode')
-        if orpha_code is not None:
-            disease_data['orpha_code'] = orpha_code.text
-        
-        # Nome
-        name = disorder.find('Name')
-        if name is not None:
-            disease_data['name'] = name.text
-        
-        # Expert Link
-        expert_link = disorder.find('ExpertLink')
-        if expert_link is not None:
-            disease_data['expert_link'] = expert_link.text
-        
-        # Disorder Type
-        disorder_type = disorder.find('.//DisorderType/Name')
-        if disorder_type is not None:
-            disease_data['disorder_type'] = disorder_type.text
-        
-        # Disorder Group
-        disorder_group = disorder.find('.//DisorderGroup/Name')
-        if disorder_group is not None:
-            disease_data['disorder_group'] = disorder_group.text
-        
-        # Prevalence data
-        prevalence_list = disorder.find('PrevalenceList')
-        if prevalence_list is not None:
-            for prevalence in prevalence_list.findall('Prevalence'):
-                # Prevalence Class
-                prev_class = prevalence.find('.//PrevalenceClass/Name')
-                if prev_class is not None:
-                    disease_data['prevalence_class'] = prev_class.text
-                
-                # Geographic
-                prev_geo = prevalence.find('.//PrevalenceGeographic/Name')
-                if prev_geo is not None:
-                    disease_data['prevalence_geo'] = prev_geo.text
-                
-                # Value
-                prev_value = prevalence.find('PrevalenceValMoy')
-                if prev_value is not None:
-                    disease_data['prevalence_value'] = prev_value.text
-                
-                # Prendi solo il primo record di prevalenza
-                break
-        
-        # Age of onset
-        age_onset_list = disorder.find('AverageAgeOfOnsetList')
-        if age_onset_list is not None:
-            ages = []
-            for age in age_onset_list.findall('.//Name'):
-                if age.text:
-                    ages.append(age.text)
-            disease_data['age_of_onset'] = ', '.join(ages) if ages else None
-        
-        # Average age of onset
-        avg_onset = disorder.find('.//AverageAgeOfOnsets/AverageAgeOfOnset/Name')
-        if avg_onset is not None:
-            disease_data['average_age_onset'] = avg_onset.text
-        
-        # Average age of death
-        avg_death = disorder.find('.//AverageAgeOfDeaths/AverageAgeOfDeath/Name')
-        if avg_death is not None:
-            disease_data['average_age_death'] = avg_death.text
-        
-        diseases.append(disease_data)
-    
-    return diseases
+    return list(iter_orphadata_disorders(xml_path, on_prevalence))
+
+def find_orphadata_files(paths):
+    """File XML da elaborare: i file indicati e i .xml delle directory indicate."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(glob.glob(os.path.join(path, '*.xml')))
+        else:
+            files.append(path)
+    return files
 
 def classify_complexity(df):
     """
@@ -148,15 +252,43 @@ def classify_complexity(df):
     return df
 
 def main():
+    parser = argparse.ArgumentParser(description='Elaborazione dati Orphadata sulle malattie rare')
+    parser.add_argument('inputs', nargs='*', default=[DEFAULT_INPUT],
+                        help='File XML Orphadata o directory con i file di più lingue')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
     # Percorsi
-    input_path = '/home/ubuntu/progetto_sanitario/datasets/raw/orphadata_epidemiology_it.xml'
-    output_dir = '/home/ubuntu/progetto_sanitario/datasets/processed'
+    output_dir = args.output_dir
     
     os.makedirs(output_dir, exist_ok=True)
     
-    # Parse XML
-    diseases = parse_orphadata_epidemiology(input_path)
+    # Parse XML (streaming, un file per lingua); la tabella lunga delle
+    # prevalenze viene scritta riga per riga durante la stessa passata
+    diseases = []
+    prevalence_geo = Counter()
+    prevalence_csv = os.path.join(output_dir, 'malattie_rare_prevalenze.csv')
+    with open(prevalence_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=PREVALENCE_FIELDS, lineterminator='\n')
+        writer.writeheader()
+
+        def write_prevalence(row):
+            writer.writerow(row)
+            prevalence_geo[row['prevalence_geo']] += 1
+
+        for input_path in find_orphadata_files(args.inputs):
+            diseases.extend(parse_orphadata_epidemiology(input_path, write_prevalence))
     print(f"Trovate {len(diseases)} malattie rare")
+    print(f"Record di prevalenza: {sum(prevalence_geo.values())}")
+    print(f"Salvato: {prevalence_csv}")
+
+    # Parquet della tabella prevalenze, se pyarrow è disponibile
+    if pyarrow is not None:
+        prevalences = pd.read_csv(prevalence_csv, dtype=str, keep_default_na=False)
+        prevalences['value'] = pd.to_numeric(prevalences['value'], errors='coerce')
+        parquet_path = os.path.join(output_dir, 'malattie_rare_prevalenze.parquet')
+        prevalences.to_parquet(parquet_path, index=False)
+        print(f"Salvato: {parquet_path}")
     
     # Crea DataFrame
     df = pd.DataFrame(diseases)
@@ -193,7 +325,9 @@ def main():
         'totale_malattie': len(df),
         'distribuzione_complessita': df['complexity_level'].value_counts().to_dict(),
         'distribuzione_tipo': df['disorder_type'].value_counts().to_dict(),
-        'distribuzione_prevalenza': df['prevalence_class'].value_counts().to_dict()
+        'distribuzione_prevalenza': df['prevalence_class'].value_counts().to_dict(),
+        'record_prevalenza': sum(prevalence_geo.values()),
+        'record_prevalenza_per_area': {geo or 'n.d.': n for geo, n in prevalence_geo.most_common()}
     }
     
     stats_path = os.path.join(output_dir, 'statistiche_malattie_rare.json')
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Pipeline di rielaborazione incrementale guidata dal controllo aggiornamenti.
+
+Quando scheduler_check_updates.py rileva una fonte aggiornata, i percorsi
+del repository che la fonte alimenta (colonna file_paths_in_repo del
+catalogo) vengono confrontati con gli input degli step di elaborazione
+(PIPELINE_STEPS): si accodano solo gli step interessati e, a cascata,
+quelli che ne usano gli output (es. parse_orphadata → migrate_to_database).
+
+La coda è persistente (logs/rebuild_queue.db): uno step già in attesa non
+viene duplicato, ma accumula le fonti che lo hanno richiesto. L'esecuzione
+segue l'ordine delle dipendenze e uno step fallito blocca quelli a valle.
+
+Uso:
+    python3 scripts/rebuild_pipeline.py plan --source ORPHA_001 [--source GIMBE_SSN]
+    python3 scripts/rebuild_pipeline.py status
+    python3 scripts/rebuild_pipeline.py run [--dry-run]
+"""
+
+import argparse
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+
+# === CONFIGURAZIONE ===
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS_DIR = os.path.join(BASE_DIR, 'scripts')
+QUEUE_DB = os.path.join(BASE_DIR, 'logs', 'rebuild_queue.db')
+STEP_TIMEOUT = 3600   # secondi massimi per step
+
+# Step di elaborazione: script, argomenti (args, opzionali), percorsi letti
+# (inputs) e prodotti (outputs). I percorsi che terminano con '/' sono
+# directory e coprono tutto il contenuto. Gli step di download ricevono
+# l'opzione di refresh condizionale: senza, salterebbero i file già presenti
+# e la fonte aggiornata non verrebbe riscaricata.
+PIPELINE_STEPS = {
+    'download_gimbe_pdfs': {
+        'script': 'download_gimbe_pdfs.py',
+        'args': ['--force'],
+        'inputs': ['datasets/raw/gimbe/'],
+        'outputs': ['datasets/raw/gimbe/pdf/'],
+    },
+    'download_pdta': {
+        'script': 'download_pdta.py',
+        'args': ['--refresh'],
+        'inputs': ['datasets/raw/pdta/'],
+        'outputs': ['datasets/raw/pdta/'],
+    },
+    'parse_orphadata': {
+        'script': 'parse_orphadata.py',
+        'inputs': ['datasets/raw/orphadata/'],
+        'outputs': [
+            'datasets/processed/malattie_rare_italia.csv',
+            'datasets/processed/malattie_rare_italia.json',
+            'datasets/processed/malattie_rare_prevalenze.csv',
+            'datasets/processed/malattie_rare_prevalenze.parquet',
+            'datasets/processed/statistiche_malattie_rare.json',
+        ],
+    },
+    'extract_sdo_data': {
+        'script': 'extract_sdo_data.py',
+        'inputs': ['datasets/raw/ministero_salute/'],
+        'outputs': [
+            'datasets/processed/riepilogo_sdo_2023.json',
+            'datasets/processed/pdta_multidisciplinari.json',
+            'datasets/processed/pdta_multidisciplinari.csv',
+            'datasets/processed/segmentazione_popolazione.json',
+        ],
+    },
+    'analyze_hfa_chronic': {
+        'script': 'analyze_hfa_chronic.py',
+        'inputs': ['datasets/raw/hfa_istat/'],
+        'outputs': ['datasets/processed/analisi_patologie_multispecialistiche.json'],
+    },
+    'enrich_scientific_reports_ons': {
+        'script': 'enrich_scientific_reports_ons.py',
+        'inputs': [
+            'datasets/raw/ons/',
+            'datasets/raw/societa_scientifiche/',
+            'datasets/raw/oasi_bocconi/',
+            'datasets/raw/aifa/',
+            'datasets/raw/gimbe/',
+        ],
+        'outputs': [
+            'datasets/processed/ons_screening_italia.json',
+            'datasets/processed/ons_screening_regionali_2023.csv',
+            'datasets/processed/ons_screening_serie_storiche.csv',
+            'datasets/processed/rapporti_societa_scientifiche.csv',
+            'datasets/processed/oasi_bocconi_sintesi.json',
+            'datasets/processed/aifa_report_sintesi.json',
+            'datasets/processed/gimbe_report_sintesi.json',
+        ],
+    },
+    'migrate_to_database': {
+        'script': 'migrate_to_database.py',
+        'inputs': [
+            'datasets/processed/malattie_rare_italia.json',
+            'datasets/processed/pdta_multidisciplinari.json',
+            'datasets/processed/segmentazione_popolazione.json',
+        ],
+        'outputs': ['datasets/migration_ready/'],
+    },
+}
+
+
+# === GRAFO DELLE DIPENDENZE ===
+
+def split_paths(value):
+    """Percorsi della colonna file_paths_in_repo (separati da ';' o ',')."""
+    paths = []
+    for part in value.replace(';', ',').split(','):
+        part = part.strip().lstrip('./')
+        if part:
+            paths.append(part)
+    return paths
+
+
+def paths_overlap(a, b):
+    """True se due percorsi coincidono o uno è dentro l'altro (directory con '/')."""
+    if a == b:
+        return True
+    return (a.endswith('/') and b.startswith(a)) or (b.endswith('/') and a.startswith(b))
+
+
+def step_consumers(paths, steps=PIPELINE_STEPS):
+    """Step che leggono almeno uno dei percorsi indicati."""
+    return {
+        name for name, step in steps.items()
+        if any(paths_overlap(p, i) for p in paths for i in step['inputs'])
+    }
+
+
+def step_order(steps=PIPELINE_STEPS):
+    """
+    Ordine topologico degli step: uno step viene dopo quelli di cui legge
+    gli output. Uno step che rilegge i propri output non dipende da sé.
+    """
+    deps = {
+        name: {
+            other for other, o in steps.items()
+            if other != name and any(paths_overlap(out, i)
+                                     for out in o['outputs'] for i in step['inputs'])
+        }
+        for name, step in steps.items()
+    }
+    order, done = [], set()
+    while len(order) < len(steps):
+        ready = sorted(n for n in steps if n not in done and deps[n] <= done)
+        if not ready:
+            raise ValueError(f"Ciclo nelle dipendenze della pipeline: {sorted(set(steps) - done)}")
+        order.extend(ready)
+        done.update(ready)
+    return order
+
+
+def plan_rebuilds(sources, steps=PIPELINE_STEPS):
+    """
+    Step da rieseguire per le fonti aggiornate, nell'ordine delle dipendenze.
+
+    Args:
+        sources: righe del catalogo (con source_id e file_paths_in_repo)
+
+    Returns:
+        dict step -> insieme dei source_id che lo hanno attivato
+    """
+    triggered = {}
+    for source in sources:
+        pending = step_consumers(split_paths(source.get('file_paths_in_repo', '')), steps)
+        seen = set()
+        while pending:
+            name = pending.pop()
+            if name in seen:
+                continue
+            seen.add(name)
+            triggered.setdefault(name, set()).add(source['source_id'])
+            pending |= step_consumers(steps[name]['outputs'], steps) - {name}
+
+    order = step_order(steps)
+    return {name: triggered[name] for name in order if name in triggered}
+
+
+# === CODA PERSISTENTE ===
+
+class RebuildQueue:
+    """
+    Coda persistente degli step da rieseguire, su SQLite.
+
+    Al più un elemento 'pending' per step: accodare di nuovo lo stesso step
+    aggiunge solo le fonti che lo hanno richiesto.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS rebuild_queue (
+            id           INTEGER PRIMARY KEY AUTOINCREMENT,
+            step         TEXT NOT NULL,
+            status       TEXT NOT NULL,
+            sources      TEXT NOT NULL,
+            queued_at    TEXT NOT NULL,
+            started_at   TEXT,
+            finished_at  TEXT,
+            returncode   INTEGER,
+            duration_s   REAL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_rebuild_queue_pending
+            ON rebuild_queue (step) WHERE status = 'pending';
+    """
+
+    def __init__(self, path=QUEUE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def enqueue(self, plan):
+        """Accoda gli step di un piano (step -> source_id), unendo quelli già in attesa."""
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            for step, source_ids in plan.items():
+                row = self._conn.execute(
+                    "SELECT id, sources FROM rebuild_queue WHERE step = ? AND status = 'pending'",
+                    (step,)
+                ).fetchone()
+                if row:
+                    merged = sorted(set(row[1].split(',')) | set(source_ids))
+                    self._conn.execute('UPDATE rebuild_queue SET sources = ? WHERE id = ?',
+                                       (','.join(merged), row[0]))
+                else:
+                    self._conn.execute(
+                        "INSERT INTO rebuild_queue (step, status, sources, queued_at) "
+                        "VALUES (?, 'pending', ?, ?)",
+                        (step, ','.join(sorted(source_ids)), now)
+                    )
+        return list(plan)
+
+    def pending(self):
+        """Step in attesa, nell'ordine delle dipendenze: lista di (id, step, sources)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, step, sources FROM rebuild_queue WHERE status = 'pending'"
+            ).fetchall()
+        position = {name: i for i, name in enumerate(step_order())}
+        rows.sort(key=lambda row: position.get(row[1], len(position)))
+        return [(row[0], row[1], row[2].split(',')) for row in rows]
+
+    def start(self, item_id):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE rebuild_queue SET status = 'running', started_at = ? WHERE id = ?",
+                (datetime.now().isoformat(), item_id)
+            )
+
+    def finish(self, item_id, returncode, duration):
+        status = 'done' if returncode == 0 else 'failed'
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE rebuild_queue SET status = ?, finished_at = ?, returncode = ?, '
+                'duration_s = ? WHERE id = ?',
+                (status, datetime.now().isoformat(), returncode, round(duration, 2), item_id)
+            )
+
+    def recent(self, limit=20):
+        with self._lock:
+            return self._conn.execute(
+                'SELECT step, status, sources, queued_at, finished_at, returncode, duration_s '
+                'FROM rebuild_queue ORDER BY id DESC LIMIT ?', (limit,)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def enqueue_updates(sources, queue=None):
+    """
+    Pianifica e accoda le rielaborazioni per le fonti aggiornate.
+
+    Returns:
+        il piano accodato (step -> source_id)
+    """
+    plan = plan_rebuilds(sources)
+    if not plan:
+        return plan
+    own_queue = queue is None
+    queue = queue or RebuildQueue()
+    try:
+        queue.enqueue(plan)
+    finally:
+        if own_queue:
+            queue.close()
+    return plan
+
+
+def run_pending(queue, dry_run=False, log=print):
+    """
+    Esegue gli step in attesa nell'ordine delle dipendenze. Se uno step
+    fallisce, gli step a valle restano in coda per il run successivo.
+
+    Returns:
+        lista di (step, returncode)
+    """
+    executed = []
+    failed_outputs = []
+    for item_id, step, sources in queue.pending():
+        spec = PIPELINE_STEPS.get(step)
+        if spec is None:
+            log(f"Step sconosciuto in coda: {step}, ignorato")
+            continue
+        if any(paths_overlap(out, i) for out in failed_outputs for i in spec['inputs']):
+            log(f"[{step}] rinviato: uno step a monte è fallito")
+            continue
+
+        command = [sys.executable, os.path.join(SCRIPTS_DIR, spec['script']), *spec.get('args', [])]
+        log(f"[{step}] {' '.join(command)}  (fonti: {', '.join(sources)})")
+        if dry_run:
+            continue
+
+        queue.start(item_id)
+        started = time.monotonic()
+        try:
+            returncode = subprocess.run(command, cwd=BASE_DIR, timeout=STEP_TIMEOUT).returncode
+        except subprocess.TimeoutExpired:
+            returncode = -1
+        queue.finish(item_id, returncode, time.monotonic() - started)
+        executed.append((step, returncode))
+        if returncode != 0:
+            log(f"[{step}] fallito (codice {returncode})")
+            failed_outputs.extend(spec['outputs'])
+    return executed
+
+
+# === MAIN ===
+
+def main():
+    parser = argparse.ArgumentParser(description='Rielaborazioni incrementali InfoMIB')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_plan = sub.add_parser('plan', help='Mostra gli step attivati da una o più fonti')
+    p_plan.add_argument('--source', action='append', dest='sources', required=True)
+    p_plan.add_argument('--enqueue', action='store_true', help='Accoda anche gli step')
+
+    sub.add_parser('status', help='Mostra la coda e le ultime esecuzioni')
+
+    p_run = sub.add_parser('run', help='Esegue gli step in attesa')
+    p_run.add_argument('--dry-run', action='store_true')
+
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        from source_catalog import open_catalog
+        catalog = open_catalog()
+        try:
+            sources = catalog.find(source_ids=args.sources)
+        finally:
+            catalog.close()
+        plan = plan_rebuilds(sources)
+        if not plan:
+            print("Nessuno step attivato.")
+            return 0
+        for step, source_ids in plan.items():
+            print(f"  {step:<32} <- {', '.join(sorted(source_ids))}")
+        if args.enqueue:
+            enqueue_updates(sources)
+            print(f"Accodati {len(plan)} step in {QUEUE_DB}")
+        return 0
+
+    queue = RebuildQueue()
+    try:
+        if args.command == 'status':
+            pending = queue.pending()
+            print(f"Step in attesa: {len(pending)}")
+            for _, step, sources in pending:
+                print(f"  {step:<32} <- {', '.join(sources)}")
+            print("\nUltime esecuzioni:")
+            for step, status, sources, queued, finished, code, duration in queue.recent():
+                if status != 'pending':
+                    print(f"  {step:<32} {status:<8} {finished or '':<26} {duration or 0:>8.1f}s")
+        elif args.command == 'run':
+            executed = run_pending(queue, dry_run=args.dry_run)
+            failures = [step for step, code in executed if code != 0]
+            return 1 if failures else 0
+    finally:
+        queue.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,512 @@
+#!/usr/bin/env python3
+"""
+Registrazione/replay offline e benchmark per scheduler_check_updates.py.
+
+Permette di testare e misurare check_source()/run_checks() senza contattare
+i server istituzionali:
+
+1. record  → esegue i controlli reali e salva in una "cassetta" locale le
+             risposte HEAD/GET (status, header, body, latenza)
+2. replay  → riproduce la cassetta tramite server HTTP locali (uno per host
+             originale, su indirizzi di loopback 127.0.0.N) con latenza
+             configurabile e iniezione di errori, ed esegue il checker
+3. bench   → misura il throughput del controllo dell'intero catalogo in
+             modalità seriale e concorrente su 100, 1.000 e 10.000 fonti
+             sintetiche
+
+Uso:
+    python3 scripts/replay_update_checks.py record [--source AIOM_001] [--cassette DIR]
+    python3 scripts/replay_update_checks.py replay [--cassette DIR] [--latency-scale 2] [--failure-rate 0.1]
+    python3 scripts/replay_update_checks.py bench  [--sizes 100,1000,10000] [--latency-ms 10]
+
+Cassetta (default logs/cassettes/):
+- cassette.json        (indice delle risposte per "METODO host/path")
+- bodies/<sha256>.bin  (body delle risposte GET, deduplicati per hash)
+
+Nota: gli indirizzi 127.0.0.N diversi da 127.0.0.1 sono instradati su
+loopback senza configurazione solo su Linux.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import scheduler_check_updates as checker
+
+
+# === CONFIGURAZIONE ===
+CASSETTE_DIR = os.path.join(checker.LOGS_DIR, 'cassettes')
+BENCH_SIZES = (100, 1000, 10000)
+BENCH_HOSTS = 20
+BENCH_LATENCY_MS = 10
+MAX_REPLAY_HOSTS = 250
+
+# Header non riprodotti: dipendono dalla connessione o dalla decodifica di requests
+SKIP_HEADERS = {
+    'connection', 'keep-alive', 'transfer-encoding', 'content-encoding',
+    'content-length', 'date', 'server', 'set-cookie',
+}
+
+
+# === CASSETTA ===
+
+def cassette_key(method, url):
+    """Chiave di una risposta: metodo, host e path (lo schema è ignorato)."""
+    parsed = urlparse(url)
+    path = parsed.path or '/'
+    if parsed.query:
+        path += '?' + parsed.query
+    return f"{method.upper()} {(parsed.hostname or '').lower()}{path}"
+
+
+class Cassette:
+    """Archivio locale delle risposte HTTP registrate."""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        self.bodies = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        cassette = cls(path)
+        with open(os.path.join(path, 'cassette.json'), 'r', encoding='utf-8') as f:
+            cassette.entries = json.load(f)['entries']
+        return cassette
+
+    def save(self):
+        os.makedirs(os.path.join(self.path, 'bodies'), exist_ok=True)
+        for sha, body in self.bodies.items():
+            body_path = os.path.join(self.path, 'bodies', f'{sha}.bin')
+            if not os.path.exists(body_path):
+                with open(body_path, 'wb') as f:
+                    f.write(body)
+        with open(os.path.join(self.path, 'cassette.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'recorded_at': datetime.now().isoformat(),
+                'entries': self.entries,
+            }, f, ensure_ascii=False, indent=2)
+
+    def add(self, method, url, status, headers, body, latency_ms):
+        sha = None
+        if body is not None:
+            sha = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            if sha:
+                self.bodies[sha] = body
+            self.entries[cassette_key(method, url)] = {
+                'status': status,
+                'headers': {k: v for k, v in headers.items() if k.lower() not in SKIP_HEADERS},
+                'body': sha,
+                'latency_ms': round(latency_ms, 1),
+            }
+
+    def lookup(self, method, host, path):
+        entry = self.entries.get(f"{method} {host}{path}")
+        if entry is None and method == 'HEAD':
+            # HEAD non registrato: usa gli header della GET, senza body
+            entry = self.entries.get(f"GET {host}{path}")
+        return entry
+
+    def body(self, sha):
+        if sha is None:
+            return b''
+        with self._lock:
+            if sha not in self.bodies and self.path:
+                with open(os.path.join(self.path, 'bodies', f'{sha}.bin'), 'rb') as f:
+                    self.bodies[sha] = f.read()
+            return self.bodies.get(sha, b'')
+
+    def hosts(self):
+        return sorted({key.split(' ', 1)[1].split('/', 1)[0] for key in self.entries})
+
+
+class RecordingClient(checker.HostClient):
+    """HostClient che salva ogni risposta ricevuta nella cassetta."""
+
+    def __init__(self, cassette, **kwargs):
+        super().__init__(**kwargs)
+        self.cassette = cassette
+
+    def request(self, method, url, **kwargs):
+        started = time.monotonic()
+        resp = super().request(method, url, **kwargs)
+        # Il body viene letto per intero: iter_content() lo restituisce poi dalla memoria
+        body = resp.content if method.upper() == 'GET' else None
+        latency_ms = (time.monotonic() - started) * 1000
+        self.cassette.add(method, url, resp.status_code, resp.headers, body, latency_ms)
+        return resp
+
+
+# === SERVER DI REPLAY ===
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'InfoMIB-Replay/1.0'
+
+    def setup(self):
+        super().setup()
+        # Header e body sono scritti separatamente: senza TCP_NODELAY Nagle
+        # e delayed ACK aggiungono ~40 ms a ogni risposta
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def finish(self):
+        # Il client può aver già chiuso (timeout, connessione scartata)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def do_HEAD(self):
+        self._respond('HEAD')
+
+    def do_GET(self):
+        self._respond('GET')
+
+    def _respond(self, method):
+        replay = self.server.replay
+        entry = replay.cassette.lookup(method, self.server.origin_host, self.path)
+
+        delay = replay.latency_for(entry)
+        if delay:
+            time.sleep(delay)
+
+        failure = replay.inject_failure()
+        if failure == 'drop':
+            # Chiusura voluta senza risposta: il client vede una connessione
+            # interrotta, il server non solleva eccezioni
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        if failure == 'error':
+            self._send(503, {'Content-Type': 'text/plain'}, b'Service Unavailable', method)
+            return
+
+        if entry is None:
+            self._send(404, {'Content-Type': 'text/plain'}, b'Not Found', method)
+            return
+
+        headers = entry['headers']
+        etag = headers.get('ETag') or headers.get('etag')
+        if etag and self.headers.get('If-None-Match') == etag:
+            self._send(304, {'ETag': etag}, b'', method)
+            return
+
+        self._send(entry['status'], headers, replay.cassette.body(entry['body']), method)
+
+    def _send(self, status, headers, body, method):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if method != 'HEAD' and body:
+            self.wfile.write(body)
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def handle_error(self, request, client_address):
+        # Connessioni chiuse o resettate dal client sono attese durante il
+        # replay con errori iniettati: nessun traceback su stderr
+        if isinstance(sys.exc_info()[1], OSError):
+            return
+        super().handle_error(request, client_address)
+
+
+class ReplayServer:
+    """
+    Riproduce una cassetta con un server HTTP locale per ogni host originale,
+    ciascuno su un proprio indirizzo di loopback (127.0.0.2, 127.0.0.3, ...),
+    così il rate limiting per host del checker resta significativo.
+
+    Latenza: quella registrata moltiplicata per `latency_scale`, oppure fissa
+    (`latency_ms`). Errori: con probabilità `failure_rate` la risposta è un
+    503 o una connessione chiusa senza risposta.
+    """
+
+    def __init__(self, cassette, latency_ms=None, latency_scale=1.0,
+                 failure_rate=0.0, seed=None):
+        self.cassette = cassette
+        self.latency_ms = latency_ms
+        self.latency_scale = latency_scale
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._servers = []
+        self.addresses = {}
+
+    def latency_for(self, entry):
+        if self.latency_ms is not None:
+            return self.latency_ms / 1000
+        if entry is None:
+            return 0
+        return entry.get('latency_ms', 0) * self.latency_scale / 1000
+
+    def inject_failure(self):
+        if not self.failure_rate:
+            return None
+        with self._random_lock:
+            if self._random.random() >= self.failure_rate:
+                return None
+            return self._random.choice(('error', 'drop'))
+
+    def start(self, port=0):
+        hosts = self.cassette.hosts()
+        if len(hosts) > MAX_REPLAY_HOSTS:
+            raise ValueError(f"Troppi host nella cassetta ({len(hosts)} > {MAX_REPLAY_HOSTS})")
+
+        for i, host in enumerate(hosts):
+            address = f'127.0.0.{i + 2}'
+            server = _QuietHTTPServer((address, port), _ReplayHandler)
+            server.replay = self
+            server.origin_host = host
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self._servers.append(server)
+            self.addresses[host] = f'{address}:{server.server_address[1]}'
+        return self
+
+    def rewrite(self, url):
+        """Riscrive l'URL di una fonte verso il server di replay del suo host."""
+        parsed = urlparse(url)
+        host = (parsed.hostname or '').lower()
+        path = parsed.path or '/'
+        if parsed.query:
+            path += '?' + parsed.query
+        return f'http://{self.addresses[host]}{path}'
+
+    def stop(self):
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+
+# === FONTI SINTETICHE ===
+
+def synthetic_catalog(n_sources, n_hosts=BENCH_HOSTS, seed=0):
+    """
+    Genera n_sources fonti sintetiche distribuite su n_hosts host, con la
+    relativa cassetta (pagine HTML con ETag e Last-Modified).
+    """
+    rnd = random.Random(seed)
+    cassette = Cassette()
+    sources = []
+    words = ('rapporto', 'dati', 'regione', 'spesa', 'screening', 'pdta',
+             'ospedale', 'indicatori', 'monitoraggio', 'salute')
+
+    for i in range(n_sources):
+        host = f'host{i % n_hosts:03d}.example.it'
+        url = f'https://{host}/pagina/{i}'
+        text = ' '.join(rnd.choice(words) for _ in range(300))
+        body = f'<html><body><main><h1>Fonte {i}</h1><p>{text}</p></main></body></html>'.encode('utf-8')
+        headers = {
+            'Content-Type': 'text/html; charset=utf-8',
+            'ETag': f'"{hashlib.sha256(body).hexdigest()[:16]}"',
+            'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT',
+        }
+        cassette.add('HEAD', url, 200, headers, None, 0)
+        cassette.add('GET', url, 200, headers, body, 0)
+        sources.append({
+            'source_id': f'SYN_{i:06d}',
+            'title': f'Fonte sintetica {i}',
+            'owner': host,
+            'category': f'cat{i % 5}',
+            'url': url,
+            'update_frequency': 'annual',
+        })
+    return sources, cassette
+
+
+# === ESECUZIONE ===
+
+def quiet_logger():
+    """Logger del checker senza output per le singole fonti."""
+    logger = logging.getLogger('update_checker.replay')
+    logger.handlers = [logging.NullHandler()]
+    logger.propagate = False
+    return logger
+
+
+def run_replay(sources, server, workers, delay, state=None):
+    """
+    Esegue run_checks sulle fonti riscritte verso il server di replay.
+
+    Returns:
+        (risultati, secondi impiegati)
+    """
+    replayed = [dict(s, url=server.rewrite(s['url'])) for s in sources]
+    state = state if state is not None else {}
+    logger = quiet_logger()
+
+    started = time.monotonic()
+    results = []
+    for source, check_result in checker.run_checks(
+            replayed, state, logger, workers=workers, delay=delay):
+        if isinstance(check_result, tuple):
+            result, new_state = check_result
+            state[source['source_id']] = new_state
+        else:
+            result = check_result
+        results.append(result)
+    return results, time.monotonic() - started
+
+
+def cmd_record(args):
+    catalog = checker.load_catalog()
+    if args.sources:
+        catalog = [s for s in catalog if s['source_id'] in args.sources]
+
+    cassette = Cassette(args.cassette)
+    client = RecordingClient(cassette, delay=args.delay)
+    logger = logging.getLogger('update_checker.record')
+    logging.basicConfig(level=logging.INFO, format='%(levelname)-8s | %(message)s')
+
+    print(f"Registrazione di {len(catalog)} fonti in {args.cassette}")
+    try:
+        for _ in checker.run_checks(catalog, {}, logger, workers=args.workers,
+                                    delay=args.delay, client=client):
+            pass
+    finally:
+        client.close()
+
+    cassette.save()
+    print(f"Risposte registrate: {len(cassette.entries)} ({len(cassette.bodies)} body)")
+    return 0
+
+
+def cmd_replay(args):
+    cassette = Cassette.load(args.cassette)
+    recorded_hosts = set(cassette.hosts())
+    catalog = [
+        s for s in checker.load_catalog()
+        if checker.source_host(s['url']) in recorded_hosts
+    ]
+    if args.sources:
+        catalog = [s for s in catalog if s['source_id'] in args.sources]
+
+    server = ReplayServer(cassette, latency_ms=args.latency_ms,
+                          latency_scale=args.latency_scale,
+                          failure_rate=args.failure_rate, seed=args.seed).start()
+    try:
+        results, elapsed = run_replay(catalog, server, args.workers, args.delay)
+    finally:
+        server.stop()
+
+    statuses = {}
+    for r in results:
+        statuses[r['status']] = statuses.get(r['status'], 0) + 1
+    print(f"Fonti riprodotte: {len(results)} in {elapsed:.2f}s")
+    for status, count in sorted(statuses.items()):
+        print(f"  {status:<20} {count}")
+    return 0
+
+
+def cmd_bench(args):
+    sizes = [int(x) for x in args.sizes.split(',') if x.strip()]
+    modes = [('seriale', 1), ('concorrente', args.workers)]
+    rows = []
+
+    print(f"Benchmark checker: latenza {args.latency_ms} ms, {args.hosts} host, "
+          f"delay per host {args.delay}s, errori {args.failure_rate:.0%}\n")
+    print(f"  {'fonti':>7}  {'modalità':<12} {'worker':>6}  {'tempo (s)':>10}  {'fonti/s':>9}  {'errori':>6}")
+
+    for size in sizes:
+        sources, cassette = synthetic_catalog(size, args.hosts, seed=args.seed)
+        server = ReplayServer(cassette, latency_ms=args.latency_ms,
+                              failure_rate=args.failure_rate, seed=args.seed).start()
+        try:
+            for mode, workers in modes:
+                if mode == 'seriale' and args.serial_max and size > args.serial_max:
+                    continue
+                results, elapsed = run_replay(sources, server, workers, args.delay)
+                errors = sum(1 for r in results if r.get('error'))
+                throughput = len(results) / elapsed if elapsed else 0
+                rows.append({
+                    'sources': size, 'mode': mode, 'workers': workers,
+                    'seconds': round(elapsed, 3), 'checks_per_second': round(throughput, 1),
+                    'errors': errors,
+                })
+                print(f"  {size:>7}  {mode:<12} {workers:>6}  {elapsed:>10.2f}  {throughput:>9.1f}  {errors:>6}")
+        finally:
+            server.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'date': datetime.now().isoformat(),
+                'latency_ms': args.latency_ms,
+                'hosts': args.hosts,
+                'delay': args.delay,
+                'failure_rate': args.failure_rate,
+                'results': rows,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\nRisultati salvati: {args.output}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Registrazione/replay offline e benchmark del controllo aggiornamenti'
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    record = sub.add_parser('record', help='Registra le risposte reali in una cassetta')
+    record.add_argument('--cassette', default=CASSETTE_DIR, help=f'Directory cassetta (default: {CASSETTE_DIR})')
+    record.add_argument('--source', action='append', dest='sources', help='Registra solo le fonti indicate (ripetibile)')
+    record.add_argument('--workers', type=int, default=checker.MAX_WORKERS)
+    record.add_argument('--delay', type=float, default=checker.REQUEST_DELAY)
+
+    replay = sub.add_parser('replay', help='Esegue il checker sulla cassetta tramite server locali')
+    replay.add_argument('--cassette', default=CASSETTE_DIR, help=f'Directory cassetta (default: {CASSETTE_DIR})')
+    replay.add_argument('--source', action='append', dest='sources', help='Riproduci solo le fonti indicate (ripetibile)')
+    replay.add_argument('--workers', type=int, default=checker.MAX_WORKERS)
+    replay.add_argument('--delay', type=float, default=0, help='Ritardo per host (default: 0)')
+    replay.add_argument('--latency-ms', type=float, default=None, help='Latenza fissa (default: quella registrata)')
+    replay.add_argument('--latency-scale', type=float, default=1.0, help='Moltiplicatore della latenza registrata')
+    replay.add_argument('--failure-rate', type=float, default=0.0, help='Probabilità di 503/connessione chiusa')
+    replay.add_argument('--seed', type=int, default=None)
+
+    bench = sub.add_parser('bench', help='Benchmark seriale vs concorrente su fonti sintetiche')
+    bench.add_argument('--sizes', default=','.join(str(s) for s in BENCH_SIZES),
+                       help='Numero di fonti per prova, separati da virgola (default: 100,1000,10000)')
+    bench.add_argument('--hosts', type=int, default=BENCH_HOSTS, help=f'Host sintetici (default: {BENCH_HOSTS})')
+    bench.add_argument('--workers', type=int, default=checker.MAX_WORKERS)
+    bench.add_argument('--delay', type=float, default=0, help='Ritardo per host (default: 0)')
+    bench.add_argument('--latency-ms', type=float, default=BENCH_LATENCY_MS,
+                       help=f'Latenza per risposta (default: {BENCH_LATENCY_MS})')
+    bench.add_argument('--failure-rate', type=float, default=0.0)
+    bench.add_argument('--serial-max', type=int, default=None,
+                       help='Salta la prova seriale oltre questo numero di fonti')
+    bench.add_argument('--seed', type=int, default=0)
+    bench.add_argument('--output', help='Salva i risultati in JSON')
+
+    args = parser.parse_args()
+    if getattr(args, 'hosts', 1) > MAX_REPLAY_HOSTS:
+        parser.error(f'--hosts massimo {MAX_REPLAY_HOSTS}')
+
+    commands = {'record': cmd_record, 'replay': cmd_replay, 'bench': cmd_bench}
+    return commands[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
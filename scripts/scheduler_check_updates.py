@@ -1,60 +1,149 @@
 #!/usr/bin/env python3
 """
-Scheduler mensile per il controllo aggiornamenti delle fonti dati.
+Scheduler periodico per il controllo aggiornamenti delle fonti dati.
 
-Legge tutte le fonti dal catalogo sources_catalog.csv, controlla se ciascun
-sito ha nuove pubblicazioni o contenuti aggiornati, e genera un report con
-le variazioni rilevate.
+Legge le fonti dal catalogo sources_catalog.csv (tramite l'indice SQLite
+di source_catalog.py), controlla se ciascun sito ha nuove pubblicazioni o
+contenuti aggiornati, e genera un report con le variazioni rilevate.
+Con --registry controlla anche i singoli documenti del registro download
+(download_registry.json: PDF GIMBE e PDTA), trattati come fonti.
 
 Metodi di rilevamento:
 1. HTTP HEAD → Last-Modified / ETag / Content-Length
 2. HTTP GET  → hash SHA-256 del contenuto della pagina
-3. Confronto con stato precedente salvato in logs/update_state.json
+3. Confronto con stato precedente salvato in logs/update_state.db (SQLite)
+
+Il body della GET viene letto in streaming e hashato a blocchi, fino a un
+massimo di --max-bytes byte: oltre il limite la lettura si interrompe e
+l'hash copre solo la parte iniziale del documento (memoria costante anche
+per PDF di grandi dimensioni).
+
+Per le pagine HTML il confronto usa un fingerprint del contenuto
+normalizzato (testo principale senza script, attributi, orari e token
+dinamici) e una SimHash a 64 bit salvata nello stato: token CSRF, session ID
+e timestamp non generano falsi aggiornamenti.
+
+Le richieste sono condizionali (If-None-Match / If-Modified-Since) quando lo
+stato contiene ETag o Last-Modified: una risposta 304 indica fonte invariata
+e il contenuto non viene scaricato.
+
+La strategia di fetch è ricordata per fonte: la HEAD viene saltata se il
+server non la supporta (405) o non restituisce validatori, la GET se la HEAD
+mostra validatori invariati; i binari grandi sono verificati con una GET
+Range: bytes=0-N invece di scaricare il body completo.
 
 Schedulazione:
-- Via cron:  0 9 1 * * /usr/bin/python3 /path/to/scheduler_check_updates.py
-- Via flag:  --install-cron   (installa automaticamente il job cron mensile)
+- Via cron:  0 9 * * 1 /usr/bin/python3 /path/to/scheduler_check_updates.py
+- Via flag:  --install-cron   (installa automaticamente il job cron settimanale)
+- Ogni esecuzione controlla solo le fonti "scadute": l'intervallo di ciascuna
+  fonte è appreso dallo storico dei cambiamenti in update_state.db
+  (fonti volatili più spesso, fonti stabili più di rado), con fallback sulla
+  frequenza dichiarata nel catalogo.
 - Manuale:   python3 scheduler_check_updates.py [--force] [--source SOURCE_ID]
+- Parallelo: python3 scheduler_check_updates.py --workers 8 --delay 2
+             (opzionale: senza --workers i controlli, anche da cron e in
+             modalità daemon, restano seriali)
+- Registro:  python3 scheduler_check_updates.py --registry --category pdta
+- Daemon:    python3 scheduler_check_updates.py --daemon
+             (processo permanente: coda di priorità delle scadenze per fonte,
+             controlli distribuiti nel tempo, sessioni HTTP sempre aperte;
+             es. con systemd: ExecStart=/usr/bin/python3 .../scheduler_check_updates.py --daemon)
+
+Rate limiting:
+- token bucket per host (--delay secondi tra richieste allo stesso host)
+- fonti su host diversi procedono in parallelo
+- sessioni HTTP keep-alive riutilizzate per host (una connessione TCP/TLS)
+
+Errori di rete:
+- retry con backoff esponenziale e jitter solo per timeout, errori di
+  connessione, 429 e 5xx (Retry-After rispettato fino a RETRY_MAX_DELAY)
+- circuit breaker per host: dopo --circuit-threshold timeout o errori di
+  connessione consecutivi (le risposte 5xx non contano: l'host risponde) le
+  fonti rimanenti sullo stesso host sono saltate (host_unavailable) per
+  CIRCUIT_COOLDOWN secondi, poi una richiesta di prova lo richiude; le fonti
+  saltate non aggiornano last_checked e vengono ricontrollate al run successivo
 
 Output:
 - logs/update_check_YYYY-MM-DD.log   (log dettagliato)
 - logs/update_report_YYYY-MM-DD.json (report strutturato)
-- logs/update_state.json             (stato persistente per confronti)
+- logs/update_metrics.prom           (metriche di latenza in formato testo Prometheus)
+- logs/update_state.db               (stato persistente, storico dei controlli e
+                                      checkpoint dei run, scritti fonte per fonte)
+- logs/sources_catalog.db            (catalogo indicizzato; last_checked aggiornato
+                                      in place. La colonna last_checked di
+                                      sources_catalog.csv non segue i controlli:
+                                      --export-catalog la riporta nel CSV)
+
+Ripresa: se un run viene interrotto (rete, OOM, kill) il successivo riparte
+dalla prima fonte non completata del run precedente. La ripresa è automatica
+solo per i run senza selezione esplicita: con --source, --category, --owner,
+--geography, --granularity, --registry o --force (e con --no-resume) il
+checkpoint viene scartato e si controllano le fonti richieste.
+
+Rielaborazioni: le fonti aggiornate accodano in logs/rebuild_queue.db solo
+gli step di elaborazione che ne leggono i percorsi (file_paths_in_repo) e
+quelli a valle (vedi rebuild_pipeline.py); --run-pipeline li esegue subito.
 """
 
 import argparse
-import csv
 import hashlib
+import heapq
 import json
 import logging
 import os
+import random
+import re
+import signal
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from html.parser import HTMLParser
 from urllib.parse import urlparse
 
 try:
     import requests
+    from urllib3.connection import HTTPConnection, HTTPSConnection
+    from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 except ImportError:
     print("ERRORE: il modulo 'requests' è necessario.")
     print("Installalo con: pip install requests")
     sys.exit(1)
 
+from download_registry import REGISTRY_PATH, DownloadRegistry
+from rebuild_pipeline import QUEUE_DB, RebuildQueue, enqueue_updates, run_pending
+from source_catalog import CATALOG_DB, SourceCatalog, open_catalog
+
 
 # === CONFIGURAZIONE ===
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 CATALOG_PATH = os.path.join(BASE_DIR, 'sources_catalog.csv')
 LOGS_DIR = os.path.join(BASE_DIR, 'logs')
-STATE_FILE = os.path.join(LOGS_DIR, 'update_state.json')
+STATE_FILE = os.path.join(LOGS_DIR, 'update_state.json')  # formato legacy, importato al primo avvio
+STATE_DB = os.path.join(LOGS_DIR, 'update_state.db')
 
 TODAY = datetime.now().strftime('%Y-%m-%d')
 LOG_FILE = os.path.join(LOGS_DIR, f'update_check_{TODAY}.log')
 REPORT_FILE = os.path.join(LOGS_DIR, f'update_report_{TODAY}.json')
+METRICS_FILE = os.path.join(LOGS_DIR, 'update_metrics.prom')
 
 REQUEST_TIMEOUT = 30   # secondi
-REQUEST_DELAY = 2      # secondi tra richieste (rate limiting)
+REQUEST_DELAY = 2      # secondi tra richieste allo stesso host (rate limiting)
+HOST_BURST = 2         # richieste consecutive ammesse per host (HEAD + GET)
 MAX_RETRIES = 2
+RETRY_BASE_DELAY = 1.0     # secondi, raddoppiati a ogni tentativo (con jitter)
+RETRY_MAX_DELAY = 8.0      # attesa massima tra due tentativi
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+CIRCUIT_THRESHOLD = 3      # fallimenti consecutivi che aprono il circuito di un host
+CIRCUIT_COOLDOWN = 900     # secondi di circuito aperto prima della richiesta di prova
+MAX_WORKERS = 8        # controlli concorrenti consigliati con --workers (default: 1)
+MAX_CONTENT_BYTES = 20 * 1024 * 1024  # byte massimi letti per l'hash del body
+HASH_CHUNK_SIZE = 64 * 1024           # dimensione blocchi in streaming
+RANGE_MIN_BYTES = 1024 * 1024         # binari oltre questa dimensione: probe con Range
+RANGE_PROBE_BYTES = 256 * 1024        # byte richiesti con Range: bytes=0-N
 USER_AGENT = (
     'Mozilla/5.0 (compatible; InfoMIB-UpdateChecker/1.0; '
     '+https://github.com/giumar11/info_MIB)'
@@ -63,6 +152,36 @@ USER_AGENT = (
 # Fonti con contenuto statico che non cambiano mai
 STATIC_SOURCES = {'DM77_001', 'DM70_001'}
 
+# Intervalli di controllo (giorni) basati sulla frequenza dichiarata della fonte
+FREQUENCY_THRESHOLDS = {
+    'continuous': 7,     # settimanale
+    'quarterly': 30,     # mensile
+    'annual': 30,        # mensile
+    'biennial': 60,      # bimestrale
+    'periodic': 30,      # mensile
+    'static': 365,       # annuale (ma le statiche vengono comunque skippate)
+}
+
+# Scheduling adattivo dallo storico dei cambiamenti
+CHANGE_HISTORY_SIZE = 12   # date di cambiamento conservate per fonte
+ADAPTIVE_FRACTION = 0.25   # frazione dell'intervallo medio tra cambiamenti
+ADAPTIVE_MIN_DAYS = 3
+ADAPTIVE_MAX_DAYS = 180
+
+# Modalità daemon
+DAEMON_MAX_SLEEP = 3600     # secondi massimi di attesa (ricarica catalogo, segnali)
+DAEMON_SPREAD = 0.25        # anticipo massimo (frazione dell'intervallo) per distribuire il carico
+
+# Normalizzazione HTML per il fingerprint del contenuto
+SKIP_TAGS = {'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'nav', 'footer'}
+MAIN_CONTENT_TAGS = {'main', 'article'}
+VOLATILE_PATTERNS = [
+    re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2})?(\.\d+)?(Z|[+-]\d{2}:?\d{2})?'),  # timestamp ISO
+    re.compile(r'\b\d{1,2}:\d{2}(:\d{2})?\b'),        # orari
+    re.compile(r'\b[A-Za-z0-9_\-]{32,}\b'),             # token, session ID, hash
+]
+SIMHASH_BITS = 64
+
 
 # === LOGGING ===
 
@@ -94,35 +213,748 @@ def setup_logging():
 # === GESTIONE STATO PERSISTENTE ===
 
 def load_state():
-    """Carica lo stato precedente dal file JSON."""
+    """Carica lo stato legacy dal file JSON (usato solo per la migrazione)."""
     if os.path.exists(STATE_FILE):
         with open(STATE_FILE, 'r', encoding='utf-8') as f:
             return json.load(f)
     return {}
 
 
-def save_state(state):
-    """Salva lo stato aggiornato su file JSON."""
-    with open(STATE_FILE, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+class StateStore:
+    """
+    Stato persistente delle fonti su SQLite.
+
+    - source_state:  ultimo snapshot per fonte (JSON), chiave source_id
+    - check_history: un record per ogni controllo (stato, header, hash,
+                     latenza, byte), indicizzato per source_id
+
+    - check_runs / run_items: checkpoint dei run (fonti pianificate e
+                     risultato di quelle completate) per riprendere un run
+                     interrotto
+
+    Ogni controllo viene scritto appena concluso in una transazione
+    propria: un'interruzione non perde i controlli già completati.
+    Espone get()/len()/in come il dizionario dello stato JSON precedente.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS source_state (
+            source_id   TEXT PRIMARY KEY,
+            state       TEXT NOT NULL,
+            updated_at  TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS check_history (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_id     TEXT NOT NULL,
+            checked_at    TEXT NOT NULL,
+            status        TEXT,
+            http_status   INTEGER,
+            headers       TEXT,
+            content_hash  TEXT,
+            latency_ms    REAL,
+            bytes         INTEGER,
+            error         TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_check_history_source
+            ON check_history (source_id, checked_at);
+        CREATE TABLE IF NOT EXISTS check_runs (
+            run_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at   TEXT NOT NULL,
+            finished_at  TEXT,
+            status       TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS run_items (
+            run_id     INTEGER NOT NULL,
+            position   INTEGER NOT NULL,
+            source_id  TEXT NOT NULL,
+            result     TEXT,
+            PRIMARY KEY (run_id, source_id)
+        );
+    """
+
+    HISTORY_HEADERS = ('etag', 'last_modified', 'content_length', 'content_type')
+
+    def __init__(self, path=STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    def get(self, source_id, default=None):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT state FROM source_state WHERE source_id = ?', (source_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def __contains__(self, source_id):
+        return self.get(source_id) is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM source_state').fetchone()[0]
+
+    def put(self, source_id, state, result=None, run_id=None):
+        """
+        Salva lo snapshot di una fonte e, se presente, il record di storico.
+        Con run_id segna anche la fonte come completata nel checkpoint,
+        nella stessa transazione.
+        """
+        now = datetime.now().isoformat()
+        with self._lock, self._conn:
+            if run_id is not None:
+                self._conn.execute(
+                    'UPDATE run_items SET result = ? WHERE run_id = ? AND source_id = ?',
+                    (json.dumps(result, ensure_ascii=False), run_id, source_id)
+                )
+            self._conn.execute(
+                'INSERT INTO source_state (source_id, state, updated_at) VALUES (?, ?, ?) '
+                'ON CONFLICT(source_id) DO UPDATE SET state = excluded.state, '
+                'updated_at = excluded.updated_at',
+                (source_id, json.dumps(state, ensure_ascii=False), now)
+            )
+            if result is not None:
+                headers = {k: state[k] for k in self.HISTORY_HEADERS if state.get(k)}
+                self._conn.execute(
+                    'INSERT INTO check_history (source_id, checked_at, status, http_status, '
+                    'headers, content_hash, latency_ms, bytes, error) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (
+                        source_id,
+                        result.get('check_timestamp', now),
+                        result.get('status'),
+                        result.get('http_status'),
+                        json.dumps(headers, ensure_ascii=False),
+                        state.get('content_hash'),
+                        result.get('latency_ms'),
+                        result.get('metrics', {}).get('bytes', state.get('content_bytes')),
+                        result.get('error'),
+                    )
+                )
+
+    def history(self, source_id, limit=None):
+        """Storico dei controlli di una fonte, dal più recente."""
+        query = ('SELECT checked_at, status, http_status, headers, content_hash, '
+                 'latency_ms, bytes, error FROM check_history '
+                 'WHERE source_id = ? ORDER BY checked_at DESC')
+        params = (source_id,)
+        if limit:
+            query += ' LIMIT ?'
+            params += (limit,)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        keys = ('checked_at', 'status', 'http_status', 'headers', 'content_hash',
+                'latency_ms', 'bytes', 'error')
+        history = []
+        for row in rows:
+            entry = dict(zip(keys, row))
+            entry['headers'] = json.loads(entry['headers'] or '{}')
+            history.append(entry)
+        return history
+
+    # --- Checkpoint dei run ---
+
+    def start_run(self, source_ids):
+        """Registra un nuovo run con le fonti pianificate, restituisce run_id."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO check_runs (started_at, status) VALUES (?, 'running')",
+                (datetime.now().isoformat(),)
+            )
+            run_id = cursor.lastrowid
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO run_items (run_id, position, source_id) VALUES (?, ?, ?)',
+                [(run_id, i, source_id) for i, source_id in enumerate(source_ids)]
+            )
+        return run_id
+
+    def unfinished_run(self):
+        """run_id dell'ultimo run interrotto, None se non ce ne sono."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM check_runs WHERE status = 'running' "
+                "ORDER BY run_id DESC LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def run_pending(self, run_id):
+        """Fonti del run non ancora completate, nell'ordine pianificato."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT source_id FROM run_items WHERE run_id = ? AND result IS NULL '
+                'ORDER BY position', (run_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def run_results(self, run_id):
+        """Risultati delle fonti completate nel run, nell'ordine pianificato."""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT result FROM run_items WHERE run_id = ? AND result IS NOT NULL '
+                'ORDER BY position', (run_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def finish_run(self, run_id, status='completed'):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'UPDATE check_runs SET status = ?, finished_at = ? WHERE run_id = ?',
+                (status, datetime.now().isoformat(), run_id)
+            )
+
+    def abandon_runs(self):
+        """Scarta i checkpoint dei run interrotti."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE check_runs SET status = 'abandoned', finished_at = ? "
+                "WHERE status = 'running'", (datetime.now().isoformat(),)
+            )
+
+    def import_legacy(self, legacy_state):
+        """Importa lo stato dal vecchio update_state.json (se il DB è vuoto)."""
+        if not legacy_state or len(self):
+            return 0
+        for source_id, state in legacy_state.items():
+            self.put(source_id, state)
+        return len(legacy_state)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# === CLIENT HTTP (RATE LIMITING PER HOST) ===
+
+def source_host(url):
+    """Restituisce l'host (minuscolo) di un URL, usato come chiave di rate limiting."""
+    return (urlparse(url).hostname or '').lower()
+
+
+class HostRateLimiter:
+    """
+    Token bucket per host.
+
+    Ogni host ha un secchio di capacità `burst` che si ricarica di un token
+    ogni `delay` secondi: richieste a host diversi non si attendono a vicenda.
+    """
+
+    def __init__(self, delay=REQUEST_DELAY, burst=HOST_BURST):
+        self.rate = 1.0 / delay if delay > 0 else None
+        self.burst = max(1, burst)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        """Blocca finché non è disponibile un token per l'host."""
+        if self.rate is None:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens, last = self._buckets.get(host, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens >= 1:
+                    self._buckets[host] = (tokens - 1, now)
+                    return
+                self._buckets[host] = (tokens, now)
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Richiesta non inviata: il circuito dell'host è aperto."""
+
+
+class HostCircuitBreaker:
+    """
+    Circuit breaker per host.
+
+    Conta i fallimenti consecutivi a livello di trasporto (timeout, errori
+    di connessione); una risposta HTTP, anche 5xx, dimostra che l'host è
+    raggiungibile e azzera il conteggio. Raggiunta la soglia il circuito si
+    apre e l'host viene considerato irraggiungibile per `cooldown` secondi.
+    Scaduto il cooldown passa una sola richiesta di prova (half-open): se
+    riesce il circuito si chiude, altrimenti si riapre. Lo slot della prova
+    appartiene alla sola richiesta a cui allow() lo ha assegnato.
+    """
+
+    def __init__(self, threshold=CIRCUIT_THRESHOLD, cooldown=CIRCUIT_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = {}
+        self._open_until = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+
+    def allow(self, host):
+        """
+        Decide se una richiesta all'host può partire.
+
+        Returns:
+            (ammessa, prova): prova è True se la richiesta ha ottenuto lo
+            slot half-open, da restituire con failure()/release()
+        """
+        if not self.threshold:
+            return True, False
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return True, False
+            if time.monotonic() < open_until or host in self._probing:
+                return False, False
+            self._probing.add(host)
+            return True, True
+
+    def is_open(self, host):
+        with self._lock:
+            return host in self._open_until and (
+                time.monotonic() < self._open_until[host] or host in self._probing
+            )
+
+    def success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._probing.discard(host)
+
+    def failure(self, host, probe=False):
+        """
+        Registra un fallimento; True se il circuito dell'host è (ora) aperto.
+        Con probe=True (richiesta di prova) il circuito si riapre subito.
+        """
+        if not self.threshold:
+            return False
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if probe or self._failures[host] >= self.threshold:
+                self._open_until[host] = time.monotonic() + self.cooldown
+                if probe:
+                    self._probing.discard(host)
+                return True
+            return False
+
+    def release(self, host):
+        """
+        Libera lo slot della richiesta di prova senza cambiare lo stato del
+        circuito. Solo per la richiesta che ha ottenuto la prova da allow().
+        """
+        with self._lock:
+            self._probing.discard(host)
+
+    def open_hosts(self):
+        with self._lock:
+            now = time.monotonic()
+            return sorted(h for h, until in self._open_until.items() if now < until)
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Attesa prima del tentativo `attempt + 1`: backoff esponenziale con full
+    jitter, limitato a RETRY_MAX_DELAY. Un Retry-After in secondi del server
+    viene rispettato se non supera il limite.
+    """
+    if retry_after:
+        try:
+            return min(RETRY_MAX_DELAY, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt + 1)))
+
+
+# Tempi di connessione (TCP + TLS) misurati nel thread che usa la connessione
+_connection_timings = threading.local()
+
+
+def _record_connect(elapsed):
+    if hasattr(_connection_timings, 'connect_ms'):
+        _connection_timings.connect_ms += elapsed * 1000
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.monotonic() - started)
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.monotonic()
+        try:
+            super().connect()
+        finally:
+            _record_connect(time.monotonic() - started)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(requests.adapters.HTTPAdapter):
+    """HTTPAdapter che misura il tempo di apertura delle nuove connessioni."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
+
+
+class HostClient:
+    """
+    Client HTTP con rate limiting per host e sessioni keep-alive.
+
+    Ogni thread mantiene una requests.Session per host, così le richieste
+    successive allo stesso host riutilizzano la connessione TCP/TLS.
+    L'esito di ogni richiesta alimenta il circuit breaker dell'host: a
+    circuito aperto request() solleva CircuitOpenError senza contattarlo.
+
+    Tra begin_check() e end_check() raccoglie le metriche del controllo in
+    corso nel thread: apertura connessioni TCP/TLS (risoluzione DNS inclusa,
+    0 se riutilizzate), TTFB (massimo tra le richieste,
+    fino alla ricezione degli header), byte di body letti e numero di richieste.
+    """
+
+    def __init__(self, delay=REQUEST_DELAY, burst=HOST_BURST,
+                 circuit_threshold=CIRCUIT_THRESHOLD):
+        self.limiter = HostRateLimiter(delay, burst)
+        self.breaker = HostCircuitBreaker(circuit_threshold)
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def session(self, host):
+        """Restituisce la sessione del thread corrente per l'host."""
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        if host not in sessions:
+            session = requests.Session()
+            session.headers['User-Agent'] = USER_AGENT
+            session.mount('http://', _TimedHTTPAdapter())
+            session.mount('https://', _TimedHTTPAdapter())
+            sessions[host] = session
+            with self._lock:
+                self._sessions.append(session)
+        return sessions[host]
+
+    # --- Metriche per controllo ---
+
+    def begin_check(self):
+        self._local.metrics = {
+            'connect_ms': 0.0, 'ttfb_ms': 0.0,
+            'bytes': 0, 'requests': 0,
+        }
+        _connection_timings.connect_ms = 0.0
+
+    def end_check(self):
+        metrics = getattr(self._local, 'metrics', None) or {}
+        metrics['connect_ms'] = getattr(_connection_timings, 'connect_ms', 0.0)
+        self._local.metrics = None
+        return {k: round(v, 1) if isinstance(v, float) else v for k, v in metrics.items()}
+
+    def count_bytes(self, n):
+        metrics = getattr(self._local, 'metrics', None)
+        if metrics is not None and n:
+            metrics['bytes'] += n
+
+    def request(self, method, url, **kwargs):
+        host = source_host(url)
+        allowed, probe = self.breaker.allow(host)
+        if not allowed:
+            raise CircuitOpenError(f"Circuito aperto per {host}")
+        self.limiter.acquire(host)
+        metrics = getattr(self._local, 'metrics', None)
+        if metrics is not None:
+            metrics['requests'] += 1
+        try:
+            resp = self.session(host).request(method, url, **kwargs)
+        except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+            self.breaker.failure(host, probe)
+            raise
+        else:
+            self.breaker.success(host)
+        finally:
+            # Una prova half-open finita con un'altra eccezione (redirect,
+            # URL non valido, ...) non deve lasciare l'host bloccato
+            if probe:
+                self.breaker.release(host)
+        if metrics is not None:
+            metrics['ttfb_ms'] = max(metrics['ttfb_ms'], resp.elapsed.total_seconds() * 1000)
+        return resp
+
+    def head(self, url, **kwargs):
+        return self.request('HEAD', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def close(self):
+        """Chiude tutte le sessioni aperte."""
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+            self._sessions = []
 
 
 # === LETTURA CATALOGO ===
 
 def load_catalog():
-    """Legge tutte le fonti dal catalogo CSV."""
-    sources = []
-    with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row.get('source_id') and row.get('url'):
-                sources.append(row)
-    return sources
+    """Legge tutte le fonti dal catalogo, nell'ordine del CSV."""
+    catalog = open_catalog(CATALOG_PATH, CATALOG_DB)
+    try:
+        return catalog.all()
+    finally:
+        catalog.close()
+
+
+# === FINGERPRINT CONTENUTO ===
+
+class _MainTextExtractor(HTMLParser):
+    """Estrae il testo visibile, separando quello dentro <main>/<article>."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.skip_depth = 0
+        self.main_depth = 0
+        self.text = []
+        self.main_text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag in MAIN_CONTENT_TAGS:
+            self.main_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag in MAIN_CONTENT_TAGS and self.main_depth:
+            self.main_depth -= 1
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        self.text.append(data)
+        if self.main_depth:
+            self.main_text.append(data)
+
+
+def normalize_html(html):
+    """
+    Riduce una pagina HTML al suo contenuto stabile: testo principale
+    (<main>/<article> se presenti), senza script, stili, attributi, commenti,
+    orari e token dinamici, con spazi compattati.
+    """
+    extractor = _MainTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+
+    text = ' '.join(extractor.main_text or extractor.text)
+    for pattern in VOLATILE_PATTERNS:
+        text = pattern.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def simhash(text, bits=SIMHASH_BITS):
+    """SimHash del testo su shingle di 3 parole."""
+    tokens = re.findall(r'\w+', text.lower())
+    shingles = [' '.join(tokens[i:i + 3]) for i in range(max(1, len(tokens) - 2))]
+    weights = [0] * bits
+    for shingle in shingles:
+        h = int.from_bytes(
+            hashlib.blake2b(shingle.encode('utf-8'), digest_size=bits // 8).digest(), 'big'
+        )
+        for i in range(bits):
+            weights[i] += 1 if (h >> i) & 1 else -1
+    value = sum(1 << i for i in range(bits) if weights[i] > 0)
+    return f'{value:0{bits // 4}x}'
+
+
+def simhash_similarity(a, b, bits=SIMHASH_BITS):
+    """Similarità tra due SimHash esadecimali (1.0 = identici), None se manca uno dei due."""
+    if not a or not b:
+        return None
+    distance = bin(int(a, 16) ^ int(b, 16)).count('1')
+    return round(1 - distance / bits, 4)
+
+
+def fingerprint_content(body, encoding=None):
+    """
+    Calcola fingerprint e SimHash del contenuto normalizzato di una pagina HTML.
+
+    Returns:
+        (sha256 del testo normalizzato, simhash esadecimale)
+    """
+    try:
+        html = body.decode('utf-8')
+    except UnicodeDecodeError:
+        html = body.decode(encoding or 'latin-1', errors='replace')
+    text = normalize_html(html)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest(), simhash(text)
 
 
 # === CONTROLLO SINGOLA FONTE ===
 
-def check_source(source, previous_state, logger):
+def conditional_headers(prev):
+    """Header per richieste condizionali a partire dallo stato salvato."""
+    headers = {}
+    if prev.get('etag'):
+        headers['If-None-Match'] = prev['etag']
+    if prev.get('last_modified'):
+        headers['If-Modified-Since'] = prev['last_modified']
+    return headers
+
+
+def hash_response(resp, max_bytes=MAX_CONTENT_BYTES, keep_body=False):
+    """
+    Calcola lo SHA-256 del body di una risposta aperta con stream=True,
+    leggendolo a blocchi senza bufferizzarlo in memoria.
+
+    La lettura si interrompe appena superati `max_bytes` byte (0 = nessun
+    limite): in quel caso l'hash copre solo i primi `max_bytes` byte.
+    Con keep_body=True (pagine HTML) i byte letti vengono anche restituiti
+    per il fingerprint del contenuto.
+
+    Returns:
+        (hexdigest, byte letti, troncato, body o None)
+    """
+    sha = hashlib.sha256()
+    chunks = [] if keep_body else None
+    read = 0
+    truncated = False
+    for chunk in resp.iter_content(chunk_size=HASH_CHUNK_SIZE):
+        if max_bytes and read + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - read]
+            truncated = True
+        sha.update(chunk)
+        read += len(chunk)
+        if keep_body:
+            chunks.append(chunk)
+        if truncated:
+            break
+    body = b''.join(chunks) if keep_body else None
+    return sha.hexdigest(), read, truncated, body
+
+
+def not_modified(result, prev, resp, logger):
+    """
+    Gestisce una risposta 304: la fonte è invariata e lo stato precedente
+    (hash incluso) viene mantenuto, aggiornando solo i validatori ricevuti.
+    """
+    result['status'] = 'unchanged'
+    result['changed'] = False
+    result['not_modified'] = True
+    logger.info(f"[{result['source_id']}] {result['title']} - Nessun cambiamento (304 Not Modified)")
+
+    new_state = dict(prev)
+    new_state['last_checked'] = TODAY
+    new_state['http_status'] = resp.status_code
+    if resp.headers.get('ETag'):
+        new_state['etag'] = resp.headers['ETag']
+    if resp.headers.get('Last-Modified'):
+        new_state['last_modified'] = resp.headers['Last-Modified']
+
+    return result, new_state
+
+
+def response_validators(resp):
+    """Validatori HTTP di una risposta, nel formato dello stato."""
+    content_length = resp.headers.get('Content-Length', '')
+    if resp.status_code == 206:
+        # Risposta parziale: la dimensione totale è in Content-Range
+        content_length = resp.headers.get('Content-Range', '').rpartition('/')[2].strip('* ')
+    return {
+        'last_modified': resp.headers.get('Last-Modified', ''),
+        'etag': resp.headers.get('ETag', ''),
+        'content_length': content_length,
+        'content_type': resp.headers.get('Content-Type', ''),
+    }
+
+
+def validator_changes(prev, validators):
+    """Differenze tra Last-Modified, ETag e Content-Length e lo stato precedente."""
+    changes = []
+    if prev.get('last_modified') and validators['last_modified']:
+        if validators['last_modified'] != prev['last_modified']:
+            changes.append(f"Last-Modified cambiato: {prev['last_modified']} -> {validators['last_modified']}")
+
+    if prev.get('etag') and validators['etag']:
+        if validators['etag'] != prev['etag']:
+            changes.append(f"ETag cambiato: {prev['etag'][:30]}... -> {validators['etag'][:30]}...")
+
+    if prev.get('content_length') and validators['content_length']:
+        if validators['content_length'] != prev['content_length']:
+            changes.append(f"Content-Length cambiato: {prev['content_length']} -> {validators['content_length']}")
+    return changes
+
+
+def head_conclusive(prev, head_data):
+    """
+    True se i validatori della HEAD bastano a dire che la fonte è invariata:
+    stesso ETag, oppure (per contenuti non HTML) stessi Last-Modified e
+    Content-Length. Serve un hash precedente da mantenere.
+    """
+    if not prev.get('content_hash'):
+        return False
+    if head_data.get('etag') and head_data['etag'] == prev.get('etag'):
+        return True
+    if 'html' in head_data.get('content_type', '').lower():
+        return False
+    return bool(
+        head_data.get('last_modified') and head_data['last_modified'] == prev.get('last_modified')
+        and head_data.get('content_length') and head_data['content_length'] == prev.get('content_length')
+    )
+
+
+def is_large_binary(head_data):
+    """
+    True per contenuti non HTML più grandi di RANGE_MIN_BYTES, secondo la
+    HEAD o, per le fonti senza HEAD, i validatori salvati nello stato.
+    """
+    if not head_data or 'html' in head_data.get('content_type', '').lower():
+        return False
+    try:
+        return int(head_data.get('content_length') or 0) > RANGE_MIN_BYTES
+    except ValueError:
+        return False
+
+
+def retry_wait(client, host, attempt, resp=None):
+    """
+    Attende prima di ritentare una richiesta fallita.
+
+    Returns:
+        False se non va ritentata: tentativi esauriti, status non
+        ritentabile o circuito dell'host aperto
+    """
+    if attempt >= MAX_RETRIES or client.breaker.is_open(host):
+        return False
+    if resp is not None and resp.status_code not in RETRYABLE_STATUS:
+        return False
+    time.sleep(retry_delay(attempt, resp.headers.get('Retry-After') if resp is not None else None))
+    return True
+
+
+def host_unavailable(result, host, logger):
+    """Esito di una fonte saltata perché il circuito del suo host è aperto."""
+    result['status'] = 'host_unavailable'
+    result['error'] = f"Host {host} non raggiungibile (circuito aperto)"
+    logger.warning(f"[{result['source_id']}] {result['title']} - Host {host} non raggiungibile, skip")
+    return result
+
+
+def check_source(source, previous_state, logger, client=None,
+                 max_bytes=MAX_CONTENT_BYTES):
     """
     Controlla una singola fonte per aggiornamenti.
 
@@ -131,6 +963,22 @@ def check_source(source, previous_state, logger):
     2. GET request  → calcola hash SHA-256 del body
     3. Confronto con lo stato precedente
 
+    La strategia di fetch è ricordata nello stato (fetch_strategy):
+    - head_get: HEAD e poi GET; la GET è saltata se i validatori HEAD sono
+                invariati (head_conclusive)
+    - get:      HEAD saltata (405 o nessun validatore), validatori dalla GET
+    - range:    binari grandi, GET con Range: bytes=0-N e hash dei primi
+                RANGE_PROBE_BYTES byte (hash_scope) invece del body completo;
+                con strategia get la dimensione viene dallo stato precedente
+
+    Le richieste passano per `client` (HostClient), che applica il rate
+    limiting per host e riutilizza le connessioni. Se lo stato precedente ha
+    ETag/Last-Modified le richieste sono condizionali e un 304 chiude il
+    controllo senza scaricare il body. Il body della GET è hashato in
+    streaming fino a `max_bytes` byte. I tentativi falliti sono ripetuti con
+    backoff e jitter (retry_wait); se il circuito dell'host è aperto la
+    fonte viene saltata con stato host_unavailable.
+
     Returns:
         dict con risultato del controllo
     """
@@ -159,14 +1007,25 @@ def check_source(source, previous_state, logger):
         logger.info(f"[{source_id}] {title} - Fonte statica, skip")
         return result
 
+    if client is None:
+        client = HostClient()
+
+    host = source_host(url)
+    if client.breaker.is_open(host):
+        return host_unavailable(result, host, logger)
+
     prev = previous_state.get(source_id, {})
     headers = {'User-Agent': USER_AGENT}
+    headers.update(conditional_headers(prev))
+    strategy = prev.get('fetch_strategy', 'head_get')
+    result['fetch_strategy'] = strategy
 
-    # --- FASE 1: HEAD request ---
+    # --- FASE 1: HEAD request (saltata se la fonte non la supporta) ---
     head_data = {}
-    for attempt in range(MAX_RETRIES + 1):
+    head_supported = strategy != 'get'
+    for attempt in range(MAX_RETRIES + 1 if head_supported else 0):
         try:
-            resp = requests.head(
+            resp = client.head(
                 url,
                 headers=headers,
                 timeout=REQUEST_TIMEOUT,
@@ -174,31 +1033,36 @@ def check_source(source, previous_state, logger):
             )
             result['http_status'] = resp.status_code
 
+            if resp.status_code == 304:
+                return not_modified(result, prev, resp, logger)
+
             if resp.status_code == 405:
-                # HEAD non supportato, passo direttamente a GET
+                # HEAD non supportato: passo a GET e non lo riprovo nei prossimi controlli
                 logger.debug(f"[{source_id}] HEAD non supportato (405), provo GET")
+                head_supported = False
                 break
 
             if resp.status_code >= 400:
-                if attempt < MAX_RETRIES:
-                    time.sleep(2 ** (attempt + 1))
+                if retry_wait(client, host, attempt, resp):
                     continue
                 result['status'] = 'http_error'
                 result['error'] = f"HTTP {resp.status_code}"
                 logger.warning(f"[{source_id}] {title} - HTTP {resp.status_code}")
                 return result
 
-            head_data = {
-                'last_modified': resp.headers.get('Last-Modified', ''),
-                'etag': resp.headers.get('ETag', ''),
-                'content_length': resp.headers.get('Content-Length', ''),
-                'content_type': resp.headers.get('Content-Type', ''),
-            }
+            head_data = response_validators(resp)
+            if not any(head_data[k] for k in ('last_modified', 'etag', 'content_length')):
+                # HEAD senza validatori: non aggiunge nulla alla GET
+                logger.debug(f"[{source_id}] HEAD senza validatori, dal prossimo controllo solo GET")
+                head_supported = False
+                head_data = {}
             break
 
+        except CircuitOpenError:
+            return host_unavailable(result, host, logger)
+
         except requests.exceptions.Timeout:
-            if attempt < MAX_RETRIES:
-                time.sleep(2 ** (attempt + 1))
+            if retry_wait(client, host, attempt):
                 continue
             result['status'] = 'timeout'
             result['error'] = f"Timeout dopo {REQUEST_TIMEOUT}s"
@@ -206,8 +1070,7 @@ def check_source(source, previous_state, logger):
             return result
 
         except requests.exceptions.ConnectionError as e:
-            if attempt < MAX_RETRIES:
-                time.sleep(2 ** (attempt + 1))
+            if retry_wait(client, host, attempt):
                 continue
             result['status'] = 'connection_error'
             result['error'] = str(e)[:200]
@@ -221,65 +1084,136 @@ def check_source(source, previous_state, logger):
             return result
 
     # Confronto header con stato precedente
-    changes = []
-    if head_data:
-        if prev.get('last_modified') and head_data['last_modified']:
-            if head_data['last_modified'] != prev['last_modified']:
-                changes.append(f"Last-Modified cambiato: {prev['last_modified']} -> {head_data['last_modified']}")
-
-        if prev.get('etag') and head_data['etag']:
-            if head_data['etag'] != prev['etag']:
-                changes.append(f"ETag cambiato: {prev['etag'][:30]}... -> {head_data['etag'][:30]}...")
-
-        if prev.get('content_length') and head_data['content_length']:
-            if head_data['content_length'] != prev['content_length']:
-                changes.append(f"Content-Length cambiato: {prev['content_length']} -> {head_data['content_length']}")
-
-    # --- FASE 2: GET request per hash contenuto ---
-    content_hash = None
-    for attempt in range(MAX_RETRIES + 1):
+    changes = validator_changes(prev, head_data) if head_data else []
+
+    # --- FASE 2: GET request per hash contenuto (in streaming) ---
+    # Validatori HEAD invariati: il body non serve, si mantiene l'hash precedente
+    skip_get = bool(head_data) and not changes and head_conclusive(prev, head_data)
+    # Senza HEAD dimensione e tipo vengono dalla GET del controllo precedente
+    use_range = (not skip_get and prev.get('range_supported') is not False
+                 and is_large_binary(head_data if head_supported else prev))
+    range_supported = prev.get('range_supported')
+    get_headers = dict(headers)
+    if use_range:
+        get_headers['Range'] = f'bytes=0-{RANGE_PROBE_BYTES - 1}'
+
+    if skip_get:
+        logger.debug(f"[{source_id}] Validatori HEAD invariati, GET non necessaria")
+        content_hash = prev.get('content_hash')
+        content_bytes = prev.get('content_bytes')
+        truncated = prev.get('content_truncated', False)
+        fingerprint = prev.get('content_fingerprint')
+        content_simhash = prev.get('simhash')
+        hash_scope = prev.get('hash_scope', 'body')
+    else:
+        content_hash = None
+        content_bytes = None
+        truncated = False
+        fingerprint = None
+        content_simhash = None
+        hash_scope = 'body'
+    similarity = None
+    for attempt in range(0 if skip_get else MAX_RETRIES + 1):
         try:
-            resp = requests.get(
+            resp = client.get(
                 url,
-                headers=headers,
+                headers=get_headers,
                 timeout=REQUEST_TIMEOUT,
-                allow_redirects=True
+                allow_redirects=True,
+                stream=True
             )
-            result['http_status'] = resp.status_code
-
-            if resp.status_code >= 400:
-                if attempt < MAX_RETRIES:
-                    time.sleep(2 ** (attempt + 1))
+            with resp:
+                result['http_status'] = resp.status_code
+
+                if resp.status_code == 304:
+                    return not_modified(result, prev, resp, logger)
+
+                if resp.status_code == 416 and use_range:
+                    # Range rifiutato: riprovo con una GET normale
+                    logger.debug(f"[{source_id}] Range non accettato (416), GET completa")
+                    use_range = False
+                    range_supported = False
+                    get_headers.pop('Range', None)
                     continue
-                # Se HEAD era ok ma GET fallisce, usa i risultati HEAD
-                if head_data:
-                    break
-                result['status'] = 'http_error'
-                result['error'] = f"HTTP {resp.status_code}"
-                logger.warning(f"[{source_id}] {title} - GET HTTP {resp.status_code}")
-                return result
-
-            # Calcola hash del contenuto
-            content_hash = hashlib.sha256(resp.content).hexdigest()
 
-            if prev.get('content_hash') and content_hash != prev['content_hash']:
-                changes.append(f"Contenuto pagina modificato (hash diverso)")
+                if resp.status_code >= 400:
+                    if retry_wait(client, host, attempt, resp):
+                        continue
+                    # Se HEAD era ok ma GET fallisce, usa i risultati HEAD
+                    if head_data:
+                        break
+                    result['status'] = 'http_error'
+                    result['error'] = f"HTTP {resp.status_code}"
+                    logger.warning(f"[{source_id}] {title} - GET HTTP {resp.status_code}")
+                    return result
+
+                if use_range:
+                    range_supported = resp.status_code == 206
+                    if not range_supported:
+                        logger.debug(f"[{source_id}] Range ignorato dal server, GET completa")
+                get_validators = None
+                if not head_supported and not head_data:
+                    # Senza HEAD i validatori per i prossimi controlli vengono dalla GET
+                    head_data = get_validators = response_validators(resp)
+
+                # Calcola hash del contenuto a blocchi, con limite di byte
+                is_html = 'html' in resp.headers.get('Content-Type', '').lower()
+                if use_range and range_supported:
+                    hash_scope = f'range:{RANGE_PROBE_BYTES}'
+                    limit = RANGE_PROBE_BYTES
+                else:
+                    limit = max_bytes
+                content_hash, content_bytes, truncated, body = hash_response(
+                    resp, limit, keep_body=is_html
+                )
+                client.count_bytes(content_bytes)
+                if hash_scope != 'body':
+                    truncated = True
+                    logger.debug(f"[{source_id}] Probe Range: hash dei primi {content_bytes} byte")
+                elif truncated:
+                    logger.debug(f"[{source_id}] Body oltre {max_bytes} byte, hash parziale")
+                if body is not None:
+                    fingerprint, content_simhash = fingerprint_content(body, resp.encoding)
+                if get_validators and truncated:
+                    # Hash parziale (Range o limite di byte): dimensione totale,
+                    # ETag e Last-Modified della GET coprono il resto del file
+                    changes.extend(validator_changes(prev, get_validators))
+
+                if prev.get('content_fingerprint') and fingerprint:
+                    # Pagine HTML: conta solo il contenuto normalizzato
+                    similarity = simhash_similarity(prev.get('simhash'), content_simhash)
+                    if fingerprint != prev['content_fingerprint']:
+                        detail = f"similarità {similarity:.2f}" if similarity is not None else "testo normalizzato diverso"
+                        changes.append(f"Contenuto pagina modificato ({detail})")
+                    elif changes or content_hash != prev.get('content_hash'):
+                        logger.debug(f"[{source_id}] Variazioni solo in parti dinamiche della pagina, ignorate: {changes}")
+                        changes = []
+                elif prev.get('content_hash') and prev.get('hash_scope', 'body') != hash_scope:
+                    # Hash calcolati su porzioni diverse: nuovo riferimento, nessun confronto
+                    logger.debug(f"[{source_id}] Cambio di strategia ({hash_scope}), hash di riferimento aggiornato")
+                elif prev.get('content_hash') and content_hash != prev['content_hash']:
+                    if truncated:
+                        changes.append(f"Contenuto modificato (hash diverso sui primi {content_bytes} byte)")
+                    else:
+                        changes.append(f"Contenuto pagina modificato (hash diverso)")
 
             break
 
-        except requests.exceptions.RequestException:
-            if attempt < MAX_RETRIES:
-                time.sleep(2 ** (attempt + 1))
+        except requests.exceptions.RequestException as e:
+            if not isinstance(e, CircuitOpenError) and retry_wait(client, host, attempt):
                 continue
             # Se HEAD era ok, accetta i risultati parziali
             if head_data:
                 break
+            if isinstance(e, CircuitOpenError) or client.breaker.is_open(host):
+                return host_unavailable(result, host, logger)
             result['status'] = 'request_error'
             result['error'] = 'GET fallito dopo retry'
             logger.warning(f"[{source_id}] {title} - GET fallito")
             return result
 
     # --- FASE 3: Valutazione risultato ---
+    result['similarity'] = similarity
     if changes:
         result['status'] = 'updated'
         result['changed'] = True
@@ -294,11 +1228,28 @@ def check_source(source, previous_state, logger):
         result['changed'] = False
         logger.info(f"[{source_id}] {title} - Nessun cambiamento")
 
+    # Strategia per il prossimo controllo
+    if not head_supported:
+        next_strategy = 'get'
+    elif hash_scope != 'body':
+        next_strategy = 'range'
+    else:
+        next_strategy = 'head_get'
+
     # Aggiorna stato per prossimo confronto
     new_state = {
         'last_checked': TODAY,
         'http_status': result['http_status'],
         'content_hash': content_hash,
+        'content_bytes': content_bytes,
+        'content_truncated': truncated,
+        'content_fingerprint': fingerprint,
+        'simhash': content_simhash,
+        'similarity': similarity,
+        'hash_scope': hash_scope,
+        'fetch_strategy': next_strategy,
+        'range_supported': range_supported,
+        'change_dates': record_change(prev, changed=bool(changes)),
     }
     if head_data:
         new_state.update(head_data)
@@ -308,47 +1259,279 @@ def check_source(source, previous_state, logger):
 
 # === CONTROLLO DUE DATE (fonti da controllare) ===
 
-def is_check_due(source, state):
+def record_change(prev, changed):
+    """Storico delle date di cambiamento, con la data odierna se changed."""
+    dates = list(prev.get('change_dates', []))
+    if changed and (not dates or dates[-1] != TODAY):
+        dates.append(TODAY)
+    return dates[-CHANGE_HISTORY_SIZE:]
+
+
+def check_interval_days(source, prev, now=None):
     """
-    Determina se una fonte è da controllare in base alla frequenza
-    di aggiornamento e alla data dell'ultimo controllo.
+    Intervallo di controllo (giorni) per una fonte.
+
+    Con almeno due cambiamenti registrati l'intervallo è una frazione
+    (ADAPTIVE_FRACTION) del tempo stimato tra due cambiamenti: la media degli
+    intervalli osservati, o il tempo trascorso dall'ultimo cambiamento se
+    maggiore (una fonte che smette di cambiare viene controllata più di rado).
+    Senza storico si usa la soglia fissa per frequenza dichiarata.
     """
-    source_id = source['source_id']
-    frequency = source.get('update_frequency', 'annual')
-    prev = state.get(source_id, {})
-    last_checked = prev.get('last_checked', '')
+    dates = []
+    for value in prev.get('change_dates', []):
+        try:
+            dates.append(datetime.strptime(value, '%Y-%m-%d'))
+        except ValueError:
+            continue
+
+    if len(dates) < 2:
+        frequency = source.get('update_frequency', 'annual')
+        return FREQUENCY_THRESHOLDS.get(frequency, 30)
 
-    if not last_checked:
-        return True  # Mai controllata
+    dates.sort()
+    gaps = [(b - a).days for a, b in zip(dates, dates[1:])]
+    mean_gap = sum(gaps) / len(gaps)
+    since_last = ((now or datetime.now()) - dates[-1]).days
+    estimate = max(mean_gap, since_last)
 
+    return int(min(ADAPTIVE_MAX_DAYS, max(ADAPTIVE_MIN_DAYS, estimate * ADAPTIVE_FRACTION)))
+
+
+def next_check_due(source, prev, now=None, spread=0.0):
+    """
+    Data/ora del prossimo controllo di una fonte: ultimo controllo più
+    l'intervallo adattivo. Fonti mai controllate sono dovute subito.
+
+    Con spread > 0 la scadenza è anticipata di una frazione dell'intervallo
+    (fino a `spread`), deterministica per source_id: fonti con lo stesso
+    intervallo non scadono tutte nello stesso momento.
+    """
+    now = now or datetime.now()
     try:
-        last_date = datetime.strptime(last_checked, '%Y-%m-%d')
+        last_date = datetime.strptime(prev.get('last_checked', ''), '%Y-%m-%d')
     except ValueError:
-        return True
+        return now  # Mai controllata
+
+    interval = timedelta(days=check_interval_days(source, prev, now))
+    if spread:
+        digest = hashlib.sha256(source['source_id'].encode('utf-8')).digest()
+        interval -= interval * (spread * digest[0] / 256)
+    return last_date + interval
+
 
+def is_check_due(source, state):
+    """
+    Determina se una fonte è da controllare in base all'intervallo adattivo
+    (storico dei cambiamenti o frequenza dichiarata) e alla data
+    dell'ultimo controllo.
+    """
     now = datetime.now()
-    days_since = (now - last_date).days
-
-    # Intervalli di controllo basati sulla frequenza della fonte
-    thresholds = {
-        'continuous': 7,     # settimanale
-        'quarterly': 30,     # mensile
-        'annual': 30,        # mensile
-        'biennial': 60,      # bimestrale
-        'periodic': 30,      # mensile
-        'static': 365,       # annuale (ma le statiche vengono comunque skippate)
-    }
+    return next_check_due(source, state.get(source['source_id'], {}), now) <= now
+
+
+# === ESECUZIONE CONTROLLI ===
+
+def interleave_by_host(sources):
+    """
+    Riordina le fonti alternando gli host (round-robin), così i worker
+    non si accodano tutti sul token bucket dello stesso host.
+    """
+    by_host = {}
+    for source in sources:
+        by_host.setdefault(source_host(source['url']), []).append(source)
+
+    queues = list(by_host.values())
+    ordered = []
+    while queues:
+        for queue in queues:
+            ordered.append(queue.pop(0))
+        queues = [q for q in queues if q]
+    return ordered
+
+
+def run_checks(sources_to_check, state, logger, workers=1, delay=REQUEST_DELAY,
+               max_bytes=MAX_CONTENT_BYTES, client=None,
+               circuit_threshold=CIRCUIT_THRESHOLD):
+    """
+    Esegue i controlli sulle fonti, in serie o con un pool di thread.
 
-    threshold = thresholds.get(frequency, 30)
-    return days_since >= threshold
+    Con workers > 1 al più `workers` fonti vengono controllate in parallelo,
+    per cui il tempo totale è limitato dall'host più lento e non dalla somma
+    di tutti gli host. Il ritardo `delay` è applicato per host tramite
+    token bucket: fonti su host diversi non si attendono a vicenda.
+
+    È un generatore: ogni controllo viene restituito appena concluso, così
+    il chiamante può salvarlo subito. Se `client` è fornito (daemon) le sue
+    sessioni restano aperte al termine.
+
+    Yields:
+        tuple (source, check_result) in ordine di completamento
+    """
+    total = len(sources_to_check)
+    own_client = client is None
+    if own_client:
+        client = HostClient(delay=delay, circuit_threshold=circuit_threshold)
+
+    def worker(index, source):
+        logger.info(f"[{index}/{total}] Controllo {source['source_id']}...")
+        started = time.monotonic()
+        client.begin_check()
+        try:
+            check_result = check_source(source, state, logger, client=client,
+                                        max_bytes=max_bytes)
+        finally:
+            metrics = client.end_check()
+        result = check_result[0] if isinstance(check_result, tuple) else check_result
+        result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        metrics['total_ms'] = result['latency_ms']
+        result['metrics'] = metrics
+        return check_result
+
+    try:
+        if workers <= 1:
+            for i, source in enumerate(sources_to_check, 1):
+                yield source, worker(i, source)
+            return
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(worker, i, source): source
+                for i, source in enumerate(interleave_by_host(sources_to_check), 1)
+            }
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+    finally:
+        open_hosts = client.breaker.open_hosts()
+        if open_hosts:
+            logger.warning(f"Host con circuito aperto: {', '.join(open_hosts)}")
+        if own_client:
+            client.close()
+
+
+def record_check(state, source, check_result, run_id=None):
+    """
+    Salva su StateStore l'esito di un controllo e restituisce il result.
+
+    check_source ritorna (result, new_state) oppure solo result per
+    skip/errori: in quel caso viene aggiornato solo last_checked. Le fonti
+    saltate per host irraggiungibile (host_unavailable) non sono state
+    controllate e lasciano last_checked invariato, così restano scadute.
+    """
+    source_id = source['source_id']
+    if isinstance(check_result, tuple):
+        result, new_state = check_result
+    else:
+        result = check_result
+        new_state = state.get(source_id, {})
+        if result['status'] != 'host_unavailable':
+            new_state['last_checked'] = TODAY
+
+    state.put(source_id, new_state, result, run_id=run_id)
+    return result
 
 
 # === GENERAZIONE REPORT ===
 
-def generate_report(results, logger):
-    """Genera il report strutturato dei controlli."""
+METRIC_PHASES = ('connect_ms', 'ttfb_ms', 'total_ms')
+ERROR_STATUSES = ('http_error', 'timeout', 'connection_error', 'request_error', 'host_unavailable')
+
+
+def percentile(values, pct):
+    """Percentile nearest-rank di una lista di valori (None se vuota)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def aggregate_metrics(results, key):
+    """
+    Aggrega le metriche dei controlli per host o categoria: numero di
+    controlli, byte totali e p50/p95 di ogni fase di latenza.
+    """
+    groups = {}
+    for r in results:
+        metrics = r.get('metrics')
+        if not metrics:
+            continue
+        name = source_host(r['url']) if key == 'host' else r.get(key) or 'n/d'
+        groups.setdefault(name, []).append(metrics)
+
+    aggregated = {}
+    for name, items in sorted(groups.items()):
+        entry = {'checks': len(items), 'bytes': sum(m.get('bytes', 0) for m in items)}
+        for phase in METRIC_PHASES:
+            values = [m[phase] for m in items if m.get(phase) is not None]
+            entry[f'{phase[:-3]}_p50_ms'] = percentile(values, 50)
+            entry[f'{phase[:-3]}_p95_ms'] = percentile(values, 95)
+        aggregated[name] = entry
+    return aggregated
+
+
+def _prom_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def write_prometheus_metrics(results, path=None):
+    """
+    Scrive le metriche dei controlli in formato testo Prometheus (per il
+    textfile collector di node_exporter): latenze per fonte e fase, byte
+    trasferiti, quantili di latenza totale per host. Scrittura atomica.
+    """
+    path = path or METRICS_FILE
+    lines = [
+        '# HELP infomib_update_check_latency_seconds Latenza del controllo per fonte e fase',
+        '# TYPE infomib_update_check_latency_seconds gauge',
+    ]
+    measured = [r for r in results if r.get('metrics')]
+    for r in measured:
+        labels = (f'source_id="{_prom_label(r["source_id"])}",host="{_prom_label(source_host(r["url"]))}",'
+                  f'category="{_prom_label(r.get("category", ""))}"')
+        for phase in METRIC_PHASES:
+            value = r['metrics'].get(phase) or 0
+            lines.append(f'infomib_update_check_latency_seconds{{{labels},phase="{phase[:-3]}"}} {value / 1000:.4f}')
+
+    lines += [
+        '# HELP infomib_update_check_bytes Byte di contenuto trasferiti per fonte',
+        '# TYPE infomib_update_check_bytes gauge',
+    ]
+    for r in measured:
+        lines.append(f'infomib_update_check_bytes{{source_id="{_prom_label(r["source_id"])}"}} '
+                     f'{r["metrics"].get("bytes", 0)}')
+
+    lines += [
+        '# HELP infomib_update_check_host_latency_seconds Latenza totale dei controlli per host',
+        '# TYPE infomib_update_check_host_latency_seconds summary',
+    ]
+    totals = {}
+    for r in measured:
+        host = source_host(r['url'])
+        totals[host] = totals.get(host, 0) + (r['metrics'].get('total_ms') or 0)
+    for host, entry in aggregate_metrics(measured, 'host').items():
+        label = f'host="{_prom_label(host)}"'
+        for quantile, field in (('0.5', 'total_p50_ms'), ('0.95', 'total_p95_ms')):
+            lines.append(f'infomib_update_check_host_latency_seconds{{{label},'
+                         f'quantile="{quantile}"}} {(entry[field] or 0) / 1000:.4f}')
+        lines.append(f'infomib_update_check_host_latency_seconds_sum{{{label}}} '
+                     f'{totals[host] / 1000:.4f}')
+        lines.append(f'infomib_update_check_host_latency_seconds_count{{{label}}} '
+                     f'{entry["checks"]}')
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def generate_report(results, logger, rebuilds=None):
+    """
+    Genera il report strutturato dei controlli. `rebuilds` sono gli step
+    di rielaborazione accodati per le fonti aggiornate (step -> source_id).
+    """
     updated = [r for r in results if r.get('changed')]
-    errors = [r for r in results if r.get('status') in ('http_error', 'timeout', 'connection_error', 'request_error')]
+    errors = [r for r in results if r.get('status') in ERROR_STATUSES]
     first_checks = [r for r in results if r.get('status') == 'first_check']
     unchanged = [r for r in results if r.get('status') == 'unchanged']
     skipped = [r for r in results if r.get('status') == 'skipped_static']
@@ -385,6 +1568,11 @@ def generate_report(results, logger):
             for r in errors
         ],
         'sources_due_for_review': [],
+        'metrics': {
+            'by_host': aggregate_metrics(results, 'host'),
+            'by_category': aggregate_metrics(results, 'category'),
+        },
+        'rebuilds_queued': {step: sorted(ids) for step, ids in (rebuilds or {}).items()},
         'all_results': results
     }
 
@@ -404,6 +1592,9 @@ def generate_report(results, logger):
 
     logger.info(f"Report salvato: {REPORT_FILE}")
 
+    write_prometheus_metrics(results)
+    logger.info(f"Metriche salvate: {METRICS_FILE}")
+
     return report
 
 
@@ -433,6 +1624,13 @@ def print_summary(report):
             for change in u['changes']:
                 print(f"    -> {change}")
 
+    if report.get('rebuilds_queued'):
+        print(f"\n{'─' * 70}")
+        print("RIELABORAZIONI ACCODATE:")
+        print(f"{'─' * 70}")
+        for step, source_ids in report['rebuilds_queued'].items():
+            print(f"  {step:<32} <- {', '.join(source_ids)}")
+
     if report['errors_found']:
         print(f"\n{'─' * 70}")
         print("ERRORI:")
@@ -441,48 +1639,84 @@ def print_summary(report):
             print(f"\n  [{e['source_id']}] {e['title']}")
             print(f"    Stato: {e['status']} - {e['error']}")
 
+    slowest = sorted(
+        ((host, m) for host, m in report.get('metrics', {}).get('by_host', {}).items()
+         if m.get('total_p95_ms') is not None),
+        key=lambda item: item[1]['total_p95_ms'], reverse=True
+    )[:5]
+    if slowest:
+        print(f"\n{'─' * 70}")
+        print("HOST PIÙ LENTI (latenza totale p50 / p95):")
+        print(f"{'─' * 70}")
+        for host, m in slowest:
+            print(f"  {host:<40} {m['total_p50_ms']:>9.0f} / {m['total_p95_ms']:>9.0f} ms"
+                  f"  ({m['checks']} controlli)")
+
     print(f"\n{'─' * 70}")
     print(f"Log completo: {LOG_FILE}")
     print(f"Report JSON:  {REPORT_FILE}")
-    print(f"Stato fonti:  {STATE_FILE}")
+    print(f"Stato fonti:  {STATE_DB}")
+    print(f"Metriche:     {METRICS_FILE}")
     print("=" * 70)
 
 
 # === AGGIORNAMENTO CATALOGO ===
 
-def update_catalog_last_checked(checked_ids):
+def update_catalog_last_checked(catalog, checked_ids):
     """
-    Aggiorna la colonna last_checked nel catalogo CSV
-    per le fonti appena controllate.
+    Aggiorna last_checked nel catalogo indicizzato per le sole fonti appena
+    controllate (UPDATE in place). Il CSV non viene riscritto: lo fa solo
+    --export-catalog.
     """
-    rows = []
-    fieldnames = None
+    return catalog.mark_checked(checked_ids, TODAY)
 
-    with open(CATALOG_PATH, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        fieldnames = reader.fieldnames
-        for row in reader:
-            if row.get('source_id') in checked_ids:
-                row['last_checked'] = TODAY
-            rows.append(row)
 
-    with open(CATALOG_PATH, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(rows)
+# === RIELABORAZIONI A VALLE ===
+
+def queue_rebuilds(catalog, results, logger, sources=None):
+    """
+    Accoda gli step di elaborazione alimentati dalle fonti aggiornate.
+    sources (source_id -> fonte) copre le fonti che non sono nel catalogo
+    (documenti del registro download).
+
+    Returns:
+        il piano accodato (step -> source_id)
+    """
+    sources = sources or {}
+    updated = [catalog.get(r['source_id']) or sources.get(r['source_id'])
+               for r in results if r.get('changed')]
+    plan = enqueue_updates([s for s in updated if s])
+    for step, source_ids in plan.items():
+        logger.info(f"Rielaborazione accodata: {step} <- {', '.join(sorted(source_ids))}")
+    return plan
+
+
+def run_rebuilds(logger):
+    """Esegue gli step di rielaborazione in coda."""
+    queue = RebuildQueue(QUEUE_DB)
+    try:
+        executed = run_pending(queue, log=logger.info)
+    finally:
+        queue.close()
+    failed = [step for step, code in executed if code != 0]
+    logger.info(f"Rielaborazioni eseguite: {len(executed)}, fallite: {len(failed)}")
+    return executed
 
 
 # === INSTALLAZIONE CRON ===
 
 def install_cron():
-    """Installa un job cron mensile per l'esecuzione automatica."""
+    """
+    Installa un job cron settimanale per l'esecuzione automatica: ogni
+    esecuzione controlla solo le fonti il cui intervallo adattivo è scaduto.
+    """
     script_path = os.path.abspath(__file__)
     python_path = sys.executable
     log_path = os.path.join(LOGS_DIR, 'cron_output.log')
 
-    # Job cron: ogni 1° del mese alle 09:00
-    cron_line = f'0 9 1 * * {python_path} {script_path} >> {log_path} 2>&1'
-    cron_comment = '# InfoMIB - Controllo mensile aggiornamenti fonti dati'
+    # Job cron: ogni lunedì alle 09:00
+    cron_line = f'0 9 * * 1 {python_path} {script_path} >> {log_path} 2>&1'
+    cron_comment = '# InfoMIB - Controllo periodico aggiornamenti fonti dati'
 
     try:
         # Leggi crontab attuale
@@ -513,7 +1747,7 @@ def install_cron():
 
         if process.returncode == 0:
             print("Job cron installato con successo.")
-            print(f"  Schedulazione: ogni 1° del mese alle 09:00")
+            print(f"  Schedulazione: ogni lunedì alle 09:00 (solo fonti scadute)")
             print(f"  Comando:       {cron_line}")
             print(f"  Log cron:      {log_path}")
         else:
@@ -529,7 +1763,7 @@ def install_cron():
 
 
 def uninstall_cron():
-    """Rimuove il job cron mensile."""
+    """Rimuove il job cron (anche nella vecchia versione mensile)."""
     try:
         result = subprocess.run(['crontab', '-l'], capture_output=True, text=True)
         if result.returncode != 0:
@@ -541,6 +1775,7 @@ def uninstall_cron():
             line for line in lines
             if 'scheduler_check_updates.py' not in line
             and 'InfoMIB - Controllo mensile' not in line
+            and 'InfoMIB - Controllo periodico' not in line
         ]
         new_crontab = '\n'.join(new_lines)
 
@@ -556,6 +1791,177 @@ def uninstall_cron():
         print("'crontab' non disponibile su questo sistema.")
 
 
+# === MODALITÀ DAEMON ===
+
+def set_run_date():
+    """Aggiorna la data corrente e il file di report (il daemon attraversa più giorni)."""
+    global TODAY, REPORT_FILE
+    TODAY = datetime.now().strftime('%Y-%m-%d')
+    REPORT_FILE = os.path.join(LOGS_DIR, f'update_report_{TODAY}.json')
+
+
+def registry_sources(source_ids=None, category=None, owner=None, geography=None,
+                     granularity=None):
+    """
+    Documenti del registro download come fonti (righe nel formato del
+    catalogo), con gli stessi filtri di SourceCatalog.find. Il registro
+    viene letto solo qui; id e categoria usano i suoi indici.
+    """
+    registry = DownloadRegistry(REGISTRY_PATH)
+    if source_ids:
+        entries = [e for e in (registry.get(i) for i in source_ids) if e]
+        if category:
+            entries = [e for e in entries if e.get('category') == category]
+    else:
+        entries = registry.find(category=category)
+
+    sources = []
+    for entry in entries:
+        source = registry.as_source(entry)
+        if owner and source['owner'] != owner:
+            continue
+        if geography and geography not in source['geography'].split('+'):
+            continue
+        if granularity and source['granularity'] != granularity:
+            continue
+        sources.append(source)
+    return sources
+
+
+def filter_catalog(catalog, args, logger):
+    """
+    Seleziona le fonti con i filtri --source, --category, --owner,
+    --geography e --granularity (query sugli indici del catalogo); con
+    --registry aggiunge i documenti del registro download.
+    """
+    filters = {
+        'source_ids': args.sources,
+        'category': args.category,
+        'owner': args.owner,
+        'geography': args.geography,
+        'granularity': args.granularity,
+    }
+    sources = catalog.find(**filters)
+    if args.registry:
+        extra = registry_sources(**filters)
+        logger.info(f"Registro download: {len(extra)} documenti")
+        sources += extra
+    active = {k: v for k, v in filters.items() if v}
+    if active:
+        logger.info(f"Filtri {active}: {len(sources)} fonti")
+    return sources
+
+
+def explicit_selection(args):
+    """True se la riga di comando seleziona le fonti (filtri, --registry o --force)."""
+    return bool(args.sources or args.category or args.owner or args.geography
+                or args.granularity or args.registry or args.force)
+
+
+def run_daemon(args, logger):
+    """
+    Esegue il checker come processo permanente.
+
+    Mantiene una coda di priorità (heap) con la prossima scadenza di ogni
+    fonte (next_check_due, con anticipo distribuito DAEMON_SPREAD), dorme
+    fino alla prima scadenza e controlla le fonti man mano che scadono,
+    riutilizzando sempre lo stesso HostClient. Il catalogo viene reimportato
+    quando il file CSV cambia; SIGTERM/SIGINT fermano il daemon al termine
+    del lotto in corso. Il report giornaliero viene riscritto dopo ogni lotto.
+    """
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"Segnale {signum} ricevuto, arresto del daemon...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    state = StateStore(STATE_DB)
+    imported = state.import_legacy(load_state())
+    if imported:
+        logger.info(f"Importato stato legacy da {STATE_FILE}: {imported} fonti")
+
+    catalog = SourceCatalog(CATALOG_PATH, CATALOG_DB)
+    client = HostClient(delay=args.delay, circuit_threshold=args.circuit_threshold)
+    force = args.force
+    loaded = False
+    sources = {}
+    queue = []
+    day_results = []
+    day_rebuilds = {}
+    logger.info(f"Daemon avviato ({args.workers} worker)")
+
+    try:
+        while not stop.is_set():
+            # (Ri)costruisci la coda se il catalogo è cambiato
+            if catalog.sync() or not loaded:
+                loaded = True
+                sources = {s['source_id']: s for s in filter_catalog(catalog, args, logger)}
+                now = datetime.now()
+                queue = [
+                    (now if force else next_check_due(s, state.get(sid, {}), now, DAEMON_SPREAD), sid)
+                    for sid, s in sources.items()
+                ]
+                heapq.heapify(queue)
+                force = False
+                logger.info(f"Catalogo caricato: {len(sources)} fonti in coda")
+
+            if not queue:
+                stop.wait(DAEMON_MAX_SLEEP)
+                continue
+
+            now = datetime.now()
+            wait = (queue[0][0] - now).total_seconds()
+            if wait > 0:
+                logger.debug(f"Prossima scadenza: {queue[0][1]} alle {queue[0][0].isoformat()}")
+                stop.wait(min(wait, DAEMON_MAX_SLEEP))
+                continue
+
+            due = []
+            while queue and queue[0][0] <= now:
+                _, source_id = heapq.heappop(queue)
+                if source_id in sources:
+                    due.append(sources[source_id])
+
+            previous_day = TODAY
+            set_run_date()
+            if TODAY != previous_day:
+                day_results = []
+                day_rebuilds = {}
+
+            logger.info(f"Fonti scadute: {len(due)}")
+            checked_ids = set()
+            for source, check_result in run_checks(
+                    due, state, logger,
+                    workers=args.workers, delay=args.delay,
+                    max_bytes=args.max_bytes, client=client):
+                source_id = source['source_id']
+                result = record_check(state, source, check_result)
+                day_results.append(result)
+                if result['status'] == 'host_unavailable':
+                    # Riprova dopo il cooldown del circuito, non alla prossima scadenza
+                    due_at = datetime.now() + timedelta(seconds=client.breaker.cooldown)
+                else:
+                    checked_ids.add(source_id)
+                    due_at = next_check_due(source, state.get(source_id, {}), spread=DAEMON_SPREAD)
+                heapq.heappush(queue, (due_at, source_id))
+
+            update_catalog_last_checked(catalog, checked_ids)
+            batch = [r for r in day_results if r['source_id'] in checked_ids]
+            for step, source_ids in queue_rebuilds(catalog, batch, logger, sources).items():
+                day_rebuilds.setdefault(step, set()).update(source_ids)
+            if args.run_pipeline and day_rebuilds:
+                run_rebuilds(logger)
+            generate_report(day_results, logger, rebuilds=day_rebuilds)
+    finally:
+        client.close()
+        state.close()
+        catalog.close()
+        logger.info("Daemon arrestato.")
+
+
 # === MAIN ===
 
 def main():
@@ -569,9 +1975,15 @@ Esempi:
   python3 scheduler_check_updates.py --source AIOM_001 # Controlla solo una fonte
   python3 scheduler_check_updates.py --source AIOM_001 --source ONS_001
   python3 scheduler_check_updates.py --category screening
-  python3 scheduler_check_updates.py --install-cron    # Installa job cron mensile
+  python3 scheduler_check_updates.py --geography regional --granularity asl
+  python3 scheduler_check_updates.py --registry --category pdta  # Documenti PDTA del registro
+  python3 scheduler_check_updates.py --export-catalog  # Riporta last_checked nel CSV
+  python3 scheduler_check_updates.py --install-cron    # Installa job cron settimanale
   python3 scheduler_check_updates.py --uninstall-cron  # Rimuovi job cron
   python3 scheduler_check_updates.py --dry-run         # Mostra cosa farebbe senza eseguire
+  python3 scheduler_check_updates.py --force --workers 8  # Controlli in parallelo
+  python3 scheduler_check_updates.py --daemon          # Processo permanente con scheduler interno
+  python3 scheduler_check_updates.py --run-pipeline    # Rielabora subito i dataset delle fonti aggiornate
         """
     )
     parser.add_argument(
@@ -586,21 +1998,74 @@ Esempi:
         '--category', type=str,
         help='Controlla solo le fonti di una categoria. Es: --category screening'
     )
+    parser.add_argument(
+        '--owner', type=str,
+        help='Controlla solo le fonti di un ente. Es: --owner AGENAS'
+    )
+    parser.add_argument(
+        '--geography', type=str,
+        help='Controlla solo le fonti di un\'area (anche composte, es. national+regional). '
+             'Es: --geography regional'
+    )
+    parser.add_argument(
+        '--granularity', type=str,
+        help='Controlla solo le fonti con una granularità. Es: --granularity hospital'
+    )
+    parser.add_argument(
+        '--registry', action='store_true',
+        help='Controlla anche i documenti del registro download (download_registry.json), '
+             'con gli stessi filtri'
+    )
+    parser.add_argument(
+        '--export-catalog', action='store_true',
+        help='Riscrivi sources_catalog.csv con i last_checked del catalogo indicizzato ed esci '
+             '(i controlli aggiornano solo logs/sources_catalog.db)'
+    )
     parser.add_argument(
         '--dry-run', action='store_true',
         help='Mostra le fonti che verrebbero controllate senza eseguire i check'
     )
     parser.add_argument(
         '--install-cron', action='store_true',
-        help='Installa il job cron per esecuzione mensile automatica (1° del mese ore 09:00)'
+        help='Installa il job cron per esecuzione automatica (lunedì ore 09:00, solo fonti scadute)'
     )
     parser.add_argument(
         '--uninstall-cron', action='store_true',
-        help='Rimuovi il job cron mensile'
+        help='Rimuovi il job cron'
     )
     parser.add_argument(
         '--delay', type=float, default=REQUEST_DELAY,
-        help=f'Ritardo in secondi tra le richieste (default: {REQUEST_DELAY})'
+        help=f'Ritardo in secondi tra richieste allo stesso host (default: {REQUEST_DELAY})'
+    )
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help=f'Numero massimo di controlli concorrenti (default: 1, seriale; '
+             f'consigliato: {MAX_WORKERS})'
+    )
+    parser.add_argument(
+        '--circuit-threshold', type=int, default=CIRCUIT_THRESHOLD,
+        help=f'Fallimenti consecutivi dopo cui un host viene saltato per il resto del run, '
+             f'0 = disattivato (default: {CIRCUIT_THRESHOLD})'
+    )
+    parser.add_argument(
+        '--run-pipeline', action='store_true',
+        help='Esegui subito le rielaborazioni accodate per le fonti aggiornate '
+             '(altrimenti: python3 scripts/rebuild_pipeline.py run)'
+    )
+    parser.add_argument(
+        '--daemon', action='store_true',
+        help='Esegui come processo permanente: controlla ogni fonte alla sua scadenza'
+    )
+    parser.add_argument(
+        '--no-resume', action='store_true',
+        help='Non riprendere un run interrotto: scarta il checkpoint e pianifica un nuovo run '
+             '(implicito con --source, --category, --owner, --geography, --granularity, '
+             '--registry e --force)'
+    )
+    parser.add_argument(
+        '--max-bytes', type=int, default=MAX_CONTENT_BYTES,
+        help=f'Byte massimi letti per l\'hash del contenuto, 0 = nessun limite '
+             f'(default: {MAX_CONTENT_BYTES})'
     )
 
     args = parser.parse_args()
@@ -619,28 +2084,51 @@ Esempi:
     logger.info("AVVIO CONTROLLO AGGIORNAMENTI FONTI DATI")
     logger.info("=" * 60)
 
+    if args.daemon:
+        run_daemon(args, logger)
+        return
+
     # Carica catalogo e stato
-    catalog = load_catalog()
-    state = load_state()
+    catalog = open_catalog(CATALOG_PATH, CATALOG_DB)
+    if args.export_catalog:
+        logger.info(f"Catalogo esportato: {catalog.export_csv()}")
+        catalog.close()
+        return
+
+    state = StateStore(STATE_DB)
+    imported = state.import_legacy(load_state())
+    if imported:
+        logger.info(f"Importato stato legacy da {STATE_FILE}: {imported} fonti")
 
     logger.info(f"Fonti nel catalogo: {len(catalog)}")
     logger.info(f"Fonti con stato precedente: {len(state)}")
 
-    # Filtra per source_id se specificato
-    if args.sources:
-        catalog = [s for s in catalog if s['source_id'] in args.sources]
-        logger.info(f"Filtro per source_id: {args.sources} -> {len(catalog)} fonti")
-
-    # Filtra per categoria se specificata
-    if args.category:
-        catalog = [s for s in catalog if s.get('category') == args.category]
-        logger.info(f"Filtro per categoria '{args.category}': {len(catalog)} fonti")
-
-    # Determina quali fonti controllare
-    if args.force:
-        sources_to_check = catalog
+    # Ripresa di un run interrotto dal checkpoint, solo senza selezione esplicita
+    run_id = state.unfinished_run()
+    discard_run = run_id is not None and (args.no_resume or explicit_selection(args))
+    if discard_run:
+        reason = '--no-resume' if args.no_resume else 'selezione esplicita delle fonti'
+        logger.info(f"Run #{run_id} interrotto non ripreso ({reason}): il checkpoint viene scartato")
+        run_id = None
+
+    if run_id is not None:
+        pending = state.run_pending(run_id)
+        by_id = {s['source_id']: s for s in catalog.find(source_ids=pending)}
+        missing = [i for i in pending if i not in by_id]
+        if missing:
+            by_id.update({s['source_id']: s for s in registry_sources(source_ids=missing)})
+        sources_to_check = [by_id[i] for i in pending if i in by_id]
+        selected = sources_to_check
+        logger.info(f"Ripresa del run #{run_id} interrotto: {len(sources_to_check)} fonti rimanenti "
+                    f"(--no-resume per scartarlo)")
     else:
-        sources_to_check = [s for s in catalog if is_check_due(s, state)]
+        selected = filter_catalog(catalog, args, logger)
+
+        # Determina quali fonti controllare
+        if args.force:
+            sources_to_check = selected
+        else:
+            sources_to_check = [s for s in selected if is_check_due(s, state)]
 
     logger.info(f"Fonti da controllare: {len(sources_to_check)}")
 
@@ -649,62 +2137,64 @@ Esempi:
         print(f"\n[DRY RUN] Fonti che verrebbero controllate: {len(sources_to_check)}\n")
         for s in sources_to_check:
             freq = s.get('update_frequency', '?')
-            last = state.get(s['source_id'], {}).get('last_checked', 'mai')
+            prev = state.get(s['source_id'], {})
+            last = prev.get('last_checked', 'mai')
+            interval = check_interval_days(s, prev)
             print(f"  [{s['source_id']}] {s['title']}")
-            print(f"    Frequenza: {freq} | Ultimo check: {last}")
+            print(f"    Frequenza: {freq} | Intervallo: {interval} gg | Ultimo check: {last}")
             print(f"    URL: {s['url']}")
-        print(f"\nFonti NON da controllare: {len(catalog) - len(sources_to_check)}")
-        for s in catalog:
+        print(f"\nFonti NON da controllare: {len(selected) - len(sources_to_check)}")
+        for s in selected:
             if s not in sources_to_check:
                 last = state.get(s['source_id'], {}).get('last_checked', 'mai')
                 print(f"  [{s['source_id']}] ultimo check: {last}")
         return
 
-    if not sources_to_check:
-        logger.info("Nessuna fonte da controllare in questo ciclo.")
-        print("Nessuna fonte da controllare. Usa --force per forzare il controllo.")
-        return
-
-    # Esegui i controlli
-    results = []
-    checked_ids = set()
-
-    for i, source in enumerate(sources_to_check, 1):
-        source_id = source['source_id']
-        logger.info(f"[{i}/{len(sources_to_check)}] Controllo {source_id}...")
-
-        check_result = check_source(source, state, logger)
-
-        # check_source ritorna (result, new_state) oppure solo result per skip/errori
-        if isinstance(check_result, tuple):
-            result, new_state = check_result
-            state[source_id] = new_state
-        else:
-            result = check_result
-            # Per fonti skippate/errori, aggiorna solo last_checked
-            if source_id not in state:
-                state[source_id] = {}
-            state[source_id]['last_checked'] = TODAY
-
-        results.append(result)
-        checked_ids.add(source_id)
+    if run_id is None:
+        if discard_run:
+            state.abandon_runs()
 
-        # Rate limiting tra le richieste
-        if i < len(sources_to_check):
-            time.sleep(args.delay)
+        if not sources_to_check:
+            logger.info("Nessuna fonte da controllare in questo ciclo.")
+            print("Nessuna fonte da controllare. Usa --force per forzare il controllo.")
+            return
 
-    # Salva stato aggiornato
-    save_state(state)
-    logger.info(f"Stato salvato: {STATE_FILE}")
+        run_id = state.start_run([s['source_id'] for s in sources_to_check])
 
-    # Aggiorna last_checked nel catalogo CSV
-    update_catalog_last_checked(checked_ids)
-    logger.info(f"Catalogo aggiornato: {CATALOG_PATH}")
+    # Esegui i controlli
+    if args.workers > 1:
+        logger.info(f"Modalità concorrente: {args.workers} worker")
+
+    for source, check_result in run_checks(
+            sources_to_check, state, logger,
+            workers=args.workers, delay=args.delay,
+            max_bytes=args.max_bytes, circuit_threshold=args.circuit_threshold):
+        # Salvataggio incrementale: stato, storico e checkpoint a ogni controllo
+        record_check(state, source, check_result, run_id=run_id)
+
+    # Risultati dell'intero run, inclusi quelli salvati prima di un'interruzione
+    results = state.run_results(run_id)
+    checked_ids = {r['source_id'] for r in results if r['status'] != 'host_unavailable'}
+    state.finish_run(run_id)
+    state.close()
+    logger.info(f"Stato salvato: {STATE_DB}")
+
+    # Aggiorna last_checked nel catalogo indicizzato
+    update_catalog_last_checked(catalog, checked_ids)
+    logger.info(f"Catalogo aggiornato: {CATALOG_DB} (CSV: --export-catalog)")
+
+    # Accoda le rielaborazioni per le fonti aggiornate
+    rebuilds = queue_rebuilds(catalog, results, logger,
+                              {s['source_id']: s for s in sources_to_check})
+    catalog.close()
 
     # Genera e stampa report
-    report = generate_report(results, logger)
+    report = generate_report(results, logger, rebuilds=rebuilds)
     print_summary(report)
 
+    if args.run_pipeline and rebuilds:
+        run_rebuilds(logger)
+
     logger.info("Controllo completato.")
 
 
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Catalogo delle fonti dati con indice su SQLite.
+
+sources_catalog.csv resta il file sorgente versionato; questo modulo ne
+mantiene una copia indicizzata in logs/sources_catalog.db:
+
+- sources:          una riga per fonte (colonne del CSV), chiave source_id,
+                    indici su category, owner, geography e granularity
+- source_geography: le singole aree di "geography" (es. national+regional
+                    → national, regional), indicizzate
+- catalog_meta:     mtime/dimensione del CSV importato e ordine delle colonne
+
+Il CSV viene reimportato solo quando cambia (mtime o dimensione); i filtri
+(--source, --category, --owner, --geography, --granularity) sono query
+sugli indici e l'aggiornamento di last_checked è un UPDATE delle sole righe
+controllate, senza riscrivere il catalogo. export_csv() riporta last_checked
+nel CSV quando serve versionarlo.
+
+Uso:
+    python3 scripts/source_catalog.py sync
+    python3 scripts/source_catalog.py list [--category screening] [--geography regional]
+    python3 scripts/source_catalog.py export [--output sources_catalog.csv]
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+
+# === CONFIGURAZIONE ===
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATALOG_PATH = os.path.join(BASE_DIR, 'sources_catalog.csv')
+CATALOG_DB = os.path.join(BASE_DIR, 'logs', 'sources_catalog.db')
+
+CATALOG_FIELDS = (
+    'source_id', 'title', 'owner', 'category', 'url', 'license',
+    'update_frequency', 'geography', 'granularity', 'file_paths_in_repo',
+    'last_checked', 'checksum',
+)
+INDEXED_FIELDS = ('category', 'owner', 'geography', 'granularity')
+GEOGRAPHY_SEPARATOR = '+'
+
+
+class SourceCatalog:
+    """
+    Catalogo fonti su SQLite, sincronizzato da sources_catalog.csv.
+
+    Le righe sono restituite come dizionari con le colonne del CSV (valori
+    stringa, '' se vuoti), nell'ordine del CSV, come faceva csv.DictReader.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sources (
+            source_id           TEXT PRIMARY KEY,
+            position            INTEGER NOT NULL,
+            title               TEXT NOT NULL DEFAULT '',
+            owner               TEXT NOT NULL DEFAULT '',
+            category            TEXT NOT NULL DEFAULT '',
+            url                 TEXT NOT NULL DEFAULT '',
+            license             TEXT NOT NULL DEFAULT '',
+            update_frequency    TEXT NOT NULL DEFAULT '',
+            geography           TEXT NOT NULL DEFAULT '',
+            granularity         TEXT NOT NULL DEFAULT '',
+            file_paths_in_repo  TEXT NOT NULL DEFAULT '',
+            last_checked        TEXT NOT NULL DEFAULT '',
+            checksum            TEXT NOT NULL DEFAULT '',
+            extra               TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_sources_category ON sources (category);
+        CREATE INDEX IF NOT EXISTS idx_sources_owner ON sources (owner);
+        CREATE INDEX IF NOT EXISTS idx_sources_geography ON sources (geography);
+        CREATE INDEX IF NOT EXISTS idx_sources_granularity ON sources (granularity);
+        CREATE INDEX IF NOT EXISTS idx_sources_position ON sources (position);
+        CREATE TABLE IF NOT EXISTS source_geography (
+            source_id  TEXT NOT NULL,
+            geography  TEXT NOT NULL,
+            PRIMARY KEY (geography, source_id)
+        );
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key    TEXT PRIMARY KEY,
+            value  TEXT NOT NULL
+        );
+    """
+
+    def __init__(self, csv_path=CATALOG_PATH, db_path=CATALOG_DB):
+        self.csv_path = csv_path
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        self._conn.commit()
+
+    # --- Sincronizzazione dal CSV ---
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute(
+            'SELECT value FROM catalog_meta WHERE key = ?', (key,)
+        ).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            'INSERT INTO catalog_meta (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value',
+            (key, value)
+        )
+
+    def _csv_signature(self):
+        st = os.stat(self.csv_path)
+        return f'{st.st_mtime_ns}:{st.st_size}'
+
+    def sync(self, force=False):
+        """
+        Reimporta il CSV se è cambiato dall'ultima importazione.
+
+        Le fonti rimosse dal CSV vengono eliminate; per last_checked si
+        conserva la data più recente tra CSV e database, così i controlli
+        registrati solo nel database non vanno persi.
+
+        Returns:
+            True se il catalogo è stato reimportato
+        """
+        signature = self._csv_signature()
+        with self._lock:
+            if not force and self._meta('csv_signature') == signature:
+                return False
+
+            with open(self.csv_path, 'r', encoding='utf-8') as f:
+                reader = csv.DictReader(f)
+                fieldnames = reader.fieldnames or list(CATALOG_FIELDS)
+                rows = [row for row in reader if row.get('source_id') and row.get('url')]
+
+            with self._conn:
+                checked = dict(self._conn.execute(
+                    'SELECT source_id, last_checked FROM sources'
+                ).fetchall())
+                self._conn.execute('DELETE FROM sources')
+                self._conn.execute('DELETE FROM source_geography')
+                for position, row in enumerate(rows):
+                    values = {f: row.get(f) or '' for f in CATALOG_FIELDS}
+                    values['last_checked'] = max(values['last_checked'],
+                                                 checked.get(values['source_id'], ''))
+                    extra = {k: v for k, v in row.items() if k not in CATALOG_FIELDS and k}
+                    self._conn.execute(
+                        f'INSERT OR REPLACE INTO sources (position, extra, {", ".join(CATALOG_FIELDS)}) '
+                        f'VALUES (?, ?, {", ".join("?" for _ in CATALOG_FIELDS)})',
+                        (position, json.dumps(extra, ensure_ascii=False) if extra else None,
+                         *(values[f] for f in CATALOG_FIELDS))
+                    )
+                    self._conn.executemany(
+                        'INSERT OR IGNORE INTO source_geography (source_id, geography) VALUES (?, ?)',
+                        [(values['source_id'], geo.strip())
+                         for geo in values['geography'].split(GEOGRAPHY_SEPARATOR) if geo.strip()]
+                    )
+                self._set_meta('csv_signature', signature)
+                self._set_meta('fieldnames', json.dumps(fieldnames))
+                self._set_meta('imported_at', datetime.now().isoformat())
+        return True
+
+    # --- Interrogazione ---
+
+    def _row(self, row, columns):
+        values = dict(zip(columns, row))
+        extra = values.pop('extra', None)
+        values.pop('position', None)
+        source = {f: values[f] for f in CATALOG_FIELDS}
+        if extra:
+            source.update(json.loads(extra))
+        return source
+
+    def _select(self, where='', params=()):
+        query = f'SELECT * FROM sources {where} ORDER BY position'
+        with self._lock:
+            cursor = self._conn.execute(query, params)
+            columns = [d[0] for d in cursor.description]
+            rows = cursor.fetchall()
+        return [self._row(row, columns) for row in rows]
+
+    def all(self):
+        """Tutte le fonti, nell'ordine del CSV."""
+        return self._select()
+
+    def get(self, source_id, default=None):
+        rows = self._select('WHERE source_id = ?', (source_id,))
+        return rows[0] if rows else default
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM sources').fetchone()[0]
+
+    def find(self, source_ids=None, category=None, owner=None, geography=None,
+             granularity=None):
+        """
+        Fonti che soddisfano tutti i filtri indicati (None = nessun filtro).
+
+        geography confronta le singole aree: 'regional' seleziona anche le
+        fonti 'national+regional'.
+        """
+        clauses, params = [], []
+        if source_ids:
+            clauses.append(f'source_id IN ({", ".join("?" for _ in source_ids)})')
+            params.extend(source_ids)
+        for field, value in (('category', category), ('owner', owner),
+                             ('granularity', granularity)):
+            if value:
+                clauses.append(f'{field} = ?')
+                params.append(value)
+        if geography:
+            clauses.append('source_id IN (SELECT source_id FROM source_geography '
+                           'WHERE geography = ?)')
+            params.append(geography)
+        where = f'WHERE {" AND ".join(clauses)}' if clauses else ''
+        return self._select(where, params)
+
+    def values(self, field):
+        """Valori distinti di una colonna indicizzata, con il numero di fonti."""
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"Colonna non indicizzata: {field}")
+        table = 'source_geography' if field == 'geography' else 'sources'
+        with self._lock:
+            return self._conn.execute(
+                f'SELECT {field}, COUNT(*) FROM {table} GROUP BY {field} ORDER BY {field}'
+            ).fetchall()
+
+    # --- Aggiornamento ---
+
+    def mark_checked(self, source_ids, date):
+        """Aggiorna last_checked delle sole fonti indicate."""
+        source_ids = list(source_ids)
+        if not source_ids:
+            return 0
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(
+                'UPDATE sources SET last_checked = ? WHERE source_id = ?',
+                [(date, source_id) for source_id in source_ids]
+            )
+        return cursor.rowcount
+
+    def export_csv(self, path=None):
+        """
+        Riscrive il CSV dal database (last_checked incluso), atomicamente.
+        La firma del CSV viene aggiornata: l'export non provoca un reimport.
+        """
+        path = path or self.csv_path
+        with self._lock:
+            fieldnames = json.loads(self._meta('fieldnames', 'null') or 'null') or list(CATALOG_FIELDS)
+        rows = self.all()
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore',
+                                    lineterminator='\n')
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp_path, path)
+
+        if os.path.abspath(path) == os.path.abspath(self.csv_path):
+            with self._lock, self._conn:
+                self._set_meta('csv_signature', self._csv_signature())
+        return path
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_catalog(csv_path=CATALOG_PATH, db_path=CATALOG_DB):
+    """Apre il catalogo indicizzato, reimportando il CSV se è cambiato."""
+    catalog = SourceCatalog(csv_path, db_path)
+    catalog.sync()
+    return catalog
+
+
+# === MAIN ===
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalogo indicizzato delle fonti InfoMIB')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_sync = sub.add_parser('sync', help='Reimporta sources_catalog.csv nel database')
+    p_sync.add_argument('--force', action='store_true', help='Reimporta anche se il CSV non è cambiato')
+
+    p_list = sub.add_parser('list', help='Elenca le fonti, con filtri sugli indici')
+    p_list.add_argument('--source', action='append', dest='sources')
+    for field in INDEXED_FIELDS:
+        p_list.add_argument(f'--{field}', type=str)
+    p_list.add_argument('--values', choices=INDEXED_FIELDS,
+                        help='Mostra i valori distinti di una colonna')
+
+    p_export = sub.add_parser('export', help='Riscrive il CSV con last_checked dal database')
+    p_export.add_argument('--output', type=str, default=None)
+
+    args = parser.parse_args()
+
+    catalog = SourceCatalog()
+    try:
+        if args.command == 'sync':
+            imported = catalog.sync(force=args.force)
+            print(f"{'Catalogo reimportato' if imported else 'Catalogo già aggiornato'}: "
+                  f"{len(catalog)} fonti")
+        elif args.command == 'list':
+            catalog.sync()
+            if args.values:
+                for value, count in catalog.values(args.values):
+                    print(f"  {value or '(vuoto)':<40} {count}")
+                return 0
+            sources = catalog.find(args.sources, args.category, args.owner,
+                                   args.geography, args.granularity)
+            for s in sources:
+                print(f"  [{s['source_id']}] {s['title']} ({s['category']}, {s['geography']})")
+            print(f"\nFonti: {len(sources)}")
+        elif args.command == 'export':
+            catalog.sync()
+            print(f"Catalogo esportato: {catalog.export_csv(args.output)}")
+    finally:
+        catalog.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+"""Fixture comuni: import degli script e server HTTP su loopback."""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts')
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+
+
+class LoopbackServer:
+    """
+    Server HTTP locale con risposte configurabili per percorso.
+
+    `routes` mappa un percorso a una funzione handler(request) che
+    restituisce (status, headers, body); un Content-Length negli header
+    sostituisce quello calcolato (per simulare trasferimenti interrotti).
+    Ogni richiesta ricevuta viene
+    registrata in `requests` come (metodo, percorso, header).
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self):
+                server.requests.append((self.command, self.path, dict(self.headers)))
+                route = server.routes.get(self.path)
+                status, headers, body = route(self) if route else (404, {}, b'')
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if 'Content-Length' not in headers:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            do_GET = do_HEAD = _respond
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def url(self, path):
+        return self.base_url + path
+
+    def hits(self, path, method=None):
+        return [r for r in self.requests if r[1] == path and (method is None or r[0] == method)]
+
+
+@pytest.fixture
+def loopback():
+    server = LoopbackServer()
+    server.thread.start()
+    yield server
+    server.httpd.shutdown()
+    server.httpd.server_close()
@@ -0,0 +1,104 @@
+"""Content-addressed store and its use by the download engine."""
+
+import hashlib
+import json
+import os
+
+import pytest
+
+from blob_store import BlobStore, dedup
+from download_engine import DownloadEngine
+
+BODY = b"%PDF-1.4 shared document" * 500
+SHA = hashlib.sha256(BODY).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    blob_store = BlobStore(str(tmp_path / "store"))
+    yield blob_store
+    blob_store.close()
+
+
+def test_same_content_from_two_collections_is_stored_once(store, tmp_path):
+    paths = [tmp_path / "gimbe" / "a.pdf", tmp_path / "pdta" / "b.pdf"]
+    for path in paths:
+        path.parent.mkdir()
+        path.write_bytes(BODY)
+
+    total, saved = dedup(store, str(tmp_path), workers=2)
+
+    assert (total, saved) == (2, len(BODY))
+    assert all(os.path.samefile(path, store.blob_path(SHA)) for path in paths)
+    assert store.stats()["blobs"] == 1
+    # A second pass finds everything already linked
+    assert dedup(store, str(tmp_path), workers=2) == (2, 0)
+
+
+def test_known_url_is_linked_without_a_request(loopback, store, tmp_path):
+    loopback.routes["/doc.pdf"] = lambda request: (200, {}, BODY)
+    engine = DownloadEngine(store=store, log=lambda message: None)
+
+    first = engine.fetch({"url": loopback.url("/doc.pdf"), "dest": tmp_path / "a" / "doc.pdf"})
+    second = engine.fetch({"url": loopback.url("/doc.pdf"), "dest": tmp_path / "b" / "doc.pdf"})
+
+    assert first["sha256"] == SHA and not first["from_store"]
+    assert second["from_store"]
+    assert len(loopback.requests) == 1
+    assert os.path.samefile(tmp_path / "a" / "doc.pdf", tmp_path / "b" / "doc.pdf")
+
+
+def test_gc_removes_only_unreferenced_blobs(store, tmp_path):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(BODY)
+    store.store(path, SHA, url="https://example.org/doc.pdf")
+    os.remove(path)
+    # Still in the URL index: kept, so the next download links it again
+    assert store.gc(manifests=()) == []
+
+    # The URL now points to new content: the old blob is unreferenced
+    new_body = b"%PDF-1.4 new version"
+    new_path = tmp_path / "new.pdf"
+    new_path.write_bytes(new_body)
+    new_sha = hashlib.sha256(new_body).hexdigest()
+    store.store(new_path, new_sha, url="https://example.org/doc.pdf")
+
+    assert store.gc(manifests=()) == [SHA]
+    assert store.has(new_sha)
+
+
+def test_gc_keeps_blobs_linked_by_copy(store, tmp_path, monkeypatch):
+    def no_hardlinks(src, dst):
+        raise OSError("hardlinks not supported")
+
+    monkeypatch.setattr(os, "link", no_hardlinks)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(BODY)
+    store.store(path, SHA)
+    assert os.stat(store.blob_path(SHA)).st_nlink == 1
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"files": [{"path": "doc.pdf", "sha256": SHA}]}))
+
+    assert store.gc(manifests=[str(manifest)]) == []
+    assert path.read_bytes() == BODY
+    assert store.has(SHA)
+
+
+def test_link_replaces_read_only_target(store, tmp_path):
+    first = tmp_path / "first.pdf"
+    first.write_bytes(BODY)
+    store.store(first, SHA)
+    dest = tmp_path / "dest.pdf"
+    store.link(SHA, dest)
+
+    new_body = b"%PDF-1.4 replacement"
+    new_sha = hashlib.sha256(new_body).hexdigest()
+    other = tmp_path / "other.pdf"
+    other.write_bytes(new_body)
+    store.store(other, new_sha)
+    store.link(new_sha, dest)
+
+    assert dest.read_bytes() == new_body
+    # The previous blob, shared by the replaced file, is untouched
+    with open(store.blob_path(SHA), "rb") as f:
+        assert f.read() == BODY
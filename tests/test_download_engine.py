@@ -0,0 +1,195 @@
+"""Parallel downloads, Range resume and conditional refresh of download_engine.py."""
+
+import hashlib
+import json
+import re
+
+import pytest
+
+import download_engine
+from download_engine import DownloadEngine
+
+BODY = bytes(range(256)) * 1024
+
+
+def ranged(body, etag='"v1"'):
+    """Route serving body with Range support; Range is honoured only if If-Range matches etag."""
+    def route(request):
+        headers = {"Content-Type": "application/pdf", "ETag": etag}
+        match = re.match(r"bytes=(\d+)-$", request.headers.get("Range", ""))
+        if match and request.headers.get("If-Range", etag) == etag:
+            start = int(match.group(1))
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            return 206, headers, body[start:]
+        return 200, headers, body
+    return route
+
+
+@pytest.fixture(autouse=True)
+def no_retry_sleep(monkeypatch):
+    monkeypatch.setattr(download_engine.time, "sleep", lambda seconds: None)
+
+
+def engine(**kwargs):
+    return DownloadEngine(log=lambda message: None, **kwargs)
+
+
+def write_part(dest, data, etag=None):
+    """Partial download of dest, with the validators of the response it came from."""
+    part = dest.with_name(dest.name + download_engine.PART_SUFFIX)
+    part.write_bytes(data)
+    if etag:
+        meta = part.with_name(part.name + download_engine.PART_META_SUFFIX)
+        meta.write_text(json.dumps({"etag": etag, "last_modified": None}))
+    return part
+
+
+def test_resume_from_part_file(loopback, tmp_path):
+    loopback.routes["/doc.pdf"] = ranged(BODY)
+    dest = tmp_path / "doc.pdf"
+    part = write_part(dest, BODY[:1000], etag='"v1"')
+
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+
+    assert result["status"] == "ok" and result["resumed"]
+    assert loopback.requests[0][2].get("Range") == "bytes=1000-"
+    assert loopback.requests[0][2].get("If-Range") == '"v1"'
+    assert dest.read_bytes() == BODY
+    assert result["sha256"] == hashlib.sha256(BODY).hexdigest()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["doc.pdf"]
+
+
+def test_part_file_of_an_older_version_is_not_spliced(loopback, tmp_path):
+    old, new = b"A" * len(BODY), b"B" * len(BODY)
+    loopback.routes["/doc.pdf"] = ranged(new, etag='"v2"')
+    dest = tmp_path / "doc.pdf"
+    write_part(dest, old[:len(old) // 2], etag='"v1"')
+
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+
+    assert result["status"] == "ok" and not result["resumed"]
+    assert dest.read_bytes() == new
+    assert result["sha256"] == hashlib.sha256(new).hexdigest()
+
+
+def test_content_changed_between_interruption_and_resume(loopback, tmp_path):
+    old, new = b"A" * len(BODY), b"B" * len(BODY)
+    calls = []
+
+    def changes_after_first_attempt(request):
+        calls.append(request.headers.get("If-Range"))
+        if len(calls) == 1:
+            # Version v1, connection closed after half of it
+            return 200, {"ETag": '"v1"', "Content-Length": str(len(old))}, old[:len(old) // 2]
+        return ranged(new, etag='"v2"')(request)
+
+    loopback.routes["/doc.pdf"] = changes_after_first_attempt
+    dest = tmp_path / "doc.pdf"
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+
+    assert calls == [None, '"v1"']
+    assert result["status"] == "ok" and not result["resumed"]
+    assert dest.read_bytes() == new
+
+
+def test_part_file_without_validators_is_restarted(loopback, tmp_path):
+    loopback.routes["/doc.pdf"] = ranged(BODY)
+    dest = tmp_path / "doc.pdf"
+    write_part(dest, b"unknown version")
+
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+
+    assert loopback.requests[0][2].get("Range") is None
+    assert result["status"] == "ok" and not result["resumed"]
+    assert dest.read_bytes() == BODY
+
+
+def test_refresh_discards_part_file(loopback, tmp_path):
+    loopback.routes["/doc.pdf"] = ranged(BODY)
+    dest = tmp_path / "doc.pdf"
+    write_part(dest, BODY[:1000], etag='"v1"')
+
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest, "refresh": True})
+
+    assert loopback.requests[0][2].get("Range") is None
+    assert result["status"] == "ok" and not result["resumed"]
+
+
+def test_interrupted_transfer_resumes_on_retry(loopback, tmp_path):
+    complete = ranged(BODY)
+    calls = []
+
+    def drop_first_connection(request):
+        calls.append(request.headers.get("Range"))
+        if len(calls) == 1:
+            # Announces the full size, closes after half of it
+            return 200, {"ETag": '"v1"', "Content-Length": str(len(BODY))}, BODY[:len(BODY) // 2]
+        return complete(request)
+
+    loopback.routes["/doc.pdf"] = drop_first_connection
+    dest = tmp_path / "doc.pdf"
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+
+    assert result["status"] == "ok" and result["resumed"]
+    assert calls == [None, f"bytes={len(BODY) // 2}-"]
+    assert dest.read_bytes() == BODY
+
+
+def test_full_download_when_range_is_ignored(loopback, tmp_path):
+    loopback.routes["/doc.pdf"] = lambda request: (200, {}, BODY)
+    dest = tmp_path / "doc.pdf"
+    write_part(dest, b"stale bytes", etag='"v0"')
+
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+
+    assert result["status"] == "ok" and not result["resumed"]
+    assert dest.read_bytes() == BODY
+
+
+def test_parallel_run_downloads_every_job(loopback, tmp_path):
+    jobs = []
+    for i in range(6):
+        loopback.routes[f"/doc{i}.pdf"] = ranged(BODY[i:])
+        jobs.append({"url": loopback.url(f"/doc{i}.pdf"), "dest": tmp_path / f"doc{i}.pdf"})
+
+    results = list(engine(workers=3, per_host=2).run(jobs))
+
+    assert sorted(str(job["dest"]) for job, _ in results) == sorted(str(j["dest"]) for j in jobs)
+    assert all(result["status"] == "ok" for _, result in results)
+    assert all(job["dest"].read_bytes() == BODY[i:] for i, job in enumerate(jobs))
+
+
+def test_conditional_request_answered_304_keeps_file(loopback, tmp_path):
+    etag = '"v1"'
+
+    def route(request):
+        if request.headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag}, BODY
+
+    loopback.routes["/doc.pdf"] = route
+    dest = tmp_path / "doc.pdf"
+    first = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest})
+    assert first["etag"] == etag
+    mtime = dest.stat().st_mtime_ns
+
+    job = {"url": loopback.url("/doc.pdf"), "dest": dest, "refresh": True,
+           "headers": download_engine.conditional_headers(first)}
+    result = engine().fetch(job)
+
+    assert result["status"] == "not_modified"
+    assert result["http_status"] == 304 and result["size"] == len(BODY)
+    assert loopback.requests[-1][2].get("If-None-Match") == etag
+    assert dest.stat().st_mtime_ns == mtime
+
+
+def test_conditional_request_downloads_changed_file(loopback, tmp_path):
+    dest = tmp_path / "doc.pdf"
+    dest.write_bytes(b"old version")
+    loopback.routes["/doc.pdf"] = lambda request: (200, {"ETag": '"v2"'}, BODY)
+
+    result = engine().fetch({"url": loopback.url("/doc.pdf"), "dest": dest, "refresh": True,
+                             "headers": download_engine.conditional_headers({"etag": '"v1"'})})
+
+    assert result["status"] == "ok" and result["etag"] == '"v2"'
+    assert dest.read_bytes() == BODY
@@ -0,0 +1,87 @@
+"""Conditional refresh and manifest of download_pdta.py."""
+
+import json
+
+import pytest
+
+import download_pdta
+
+BODY = b"%PDF-1.4 pdta" * 200
+ETAG = '"v1"'
+
+
+@pytest.fixture
+def pdta_dir(tmp_path, monkeypatch):
+    base = tmp_path / "pdta"
+    monkeypatch.setattr(download_pdta, "BASE_DIR", base)
+    monkeypatch.setattr(download_pdta, "MANIFEST_PATH", base / "download_manifest.json")
+    return base
+
+
+def pdf_route(request):
+    if request.headers.get("If-None-Match") == ETAG:
+        return 304, {"ETag": ETAG}, b""
+    return 200, {"ETag": ETAG, "Content-Type": "application/pdf"}, BODY
+
+
+def job(base, url, name="doc.pdf"):
+    return {"url": url, "dest": base / "regionale" / "lombardia" / name,
+            "label": name, "item": {"id": "REG_LOM_001"}, "group": "lombardia"}
+
+
+def run(jobs, **kwargs):
+    return download_pdta.download_jobs(jobs, workers=2, use_store=False, **kwargs)
+
+
+def test_refresh_sends_manifest_validators_and_keeps_file_on_304(loopback, pdta_dir):
+    loopback.routes["/doc.pdf"] = pdf_route
+    assert run([job(pdta_dir, loopback.url("/doc.pdf"))]) == (1, 1, 0)
+    dest = pdta_dir / "regionale" / "lombardia" / "doc.pdf"
+    mtime = dest.stat().st_mtime_ns
+
+    # Without --refresh an existing file is not requested again
+    run([job(pdta_dir, loopback.url("/doc.pdf"))])
+    assert len(loopback.hits("/doc.pdf")) == 1
+
+    assert run([job(pdta_dir, loopback.url("/doc.pdf"))], refresh=True) == (1, 1, 0)
+    conditional = loopback.hits("/doc.pdf")[-1]
+    assert conditional[2].get("If-None-Match") == ETAG
+    assert dest.read_bytes() == BODY
+    assert dest.stat().st_mtime_ns == mtime
+
+    manifest = json.loads((pdta_dir / "download_manifest.json").read_text())
+    [entry] = manifest["files"]
+    assert entry["etag"] == ETAG
+    assert entry["size_bytes"] == len(BODY)
+
+
+def test_refresh_downloads_changed_document(loopback, pdta_dir):
+    loopback.routes["/doc.pdf"] = pdf_route
+    run([job(pdta_dir, loopback.url("/doc.pdf"))])
+
+    new_body = b"%PDF-1.4 updated" * 200
+    loopback.routes["/doc.pdf"] = lambda request: (200, {"ETag": '"v2"'}, new_body)
+    run([job(pdta_dir, loopback.url("/doc.pdf"))], refresh=True)
+
+    dest = pdta_dir / "regionale" / "lombardia" / "doc.pdf"
+    assert dest.read_bytes() == new_body
+    manifest = json.loads((pdta_dir / "download_manifest.json").read_text())
+    assert manifest["files"][0]["etag"] == '"v2"'
+
+
+def test_manifest_written_in_batches(loopback, pdta_dir, monkeypatch):
+    saves = []
+    save_manifest = download_pdta.save_manifest
+    monkeypatch.setattr(download_pdta, "save_manifest",
+                        lambda entries: saves.append(len(entries)) or save_manifest(entries))
+    monkeypatch.setattr(download_pdta, "MANIFEST_SAVE_EVERY", 4)
+    monkeypatch.setattr(download_pdta, "MANIFEST_SAVE_INTERVAL", 3600)
+    jobs = []
+    for i in range(10):
+        loopback.routes[f"/doc{i}.pdf"] = pdf_route
+        jobs.append(job(pdta_dir, loopback.url(f"/doc{i}.pdf"), f"doc{i}.pdf"))
+
+    assert run(jobs) == (10, 10, 0)
+    assert saves == [4, 8, 10]
+    manifest = json.loads((pdta_dir / "download_manifest.json").read_text())
+    assert len(manifest["files"]) == 10
@@ -0,0 +1,46 @@
+"""Bandwidth budget and run summary of download_engine.DownloadSession."""
+
+import json
+import time
+
+import pytest
+
+from download_engine import DownloadEngine, DownloadSession, parse_rate
+
+BODY = b"x" * (512 * 1024)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("500K", 500 * 1024), ("2M", 2 * 1024 ** 2), ("1.5MB/s", int(1.5 * 1024 ** 2)), ("1000", 1000),
+])
+def test_parse_rate(text, expected):
+    assert parse_rate(text) == expected
+
+
+@pytest.mark.parametrize("text", ["fast", "0", "-1M"])
+def test_parse_rate_rejects_invalid_values(text):
+    with pytest.raises(ValueError):
+        parse_rate(text)
+
+
+def test_budget_caps_parallel_downloads_and_summary_counts_them(loopback, tmp_path):
+    for i in range(2):
+        loopback.routes[f"/doc{i}.pdf"] = lambda request: (200, {}, BODY)
+    session = DownloadSession(max_rate=512 * 1024)
+    engine = DownloadEngine(workers=2, session=session, log=lambda message: None)
+    jobs = [{"url": loopback.url(f"/doc{i}.pdf"), "dest": tmp_path / f"doc{i}.pdf"} for i in range(2)]
+
+    started = time.monotonic()
+    results = [result for _, result in engine.run(jobs)]
+    elapsed = time.monotonic() - started
+
+    assert all(result["status"] == "ok" for result in results)
+    # 1 MB at 512 KB/s with a 512 KB burst: at least about one second
+    assert elapsed >= 0.8
+
+    path = session.write_summary(str(tmp_path / "summary.json"))
+    summary = json.loads(open(path, encoding="utf-8").read())
+    assert summary["max_rate"] == 512 * 1024
+    assert summary["total"]["files"] == 2 and summary["total"]["ok"] == 2
+    assert summary["total"]["bytes"] == 2 * len(BODY)
+    assert list(summary["hosts"]) == ["127.0.0.1"]
@@ -0,0 +1,45 @@
+"""Parsing in streaming dei file XML Orphadata."""
+
+import os
+
+import parse_orphadata
+
+SAMPLE = os.path.join(os.path.dirname(__file__), 'data', 'orphadata_sample.xml')
+
+
+def test_disorder_records():
+    first, second = parse_orphadata.iter_orphadata_disorders(SAMPLE)
+
+    assert first['orpha_code'] == '166024'
+    assert first['lang'] == 'it'
+    assert first['name'].startswith('Displasia multipla')
+    assert first['expert_link'].endswith('Expert=166024')
+    assert first['disorder_type'] == 'Malattia'
+    assert first['disorder_group'] == 'Disordine'
+    assert first['prevalence_class'] == '<1 / 1 000 000'
+    assert first['prevalence_geo'] == 'Mondiale'
+    assert first['age_of_onset'] == 'Infancy, Childhood'
+
+    assert second['orpha_code'] == '58'
+    assert second['disorder_group'] is None
+    assert second['prevalence_class'] is None
+    assert second['age_of_onset'] is None
+
+
+def test_long_prevalence_table():
+    rows = []
+    records = parse_orphadata.parse_orphadata_epidemiology(SAMPLE, rows.append)
+
+    assert len(records) == 2
+    assert [set(row) for row in rows] == [set(parse_orphadata.PREVALENCE_FIELDS)] * 2
+    assert [(r['orpha_code'], r['prevalence_geo'], r['value']) for r in rows] == [
+        ('166024', 'Mondiale', '2.0'),
+        ('166024', 'Europa', '0.0'),
+    ]
+    assert rows[0]['validation_status'] == 'Validato'
+    assert rows[1]['prevalence_qualification'] is None
+
+
+def test_default_input_is_in_the_catalog_directory():
+    relative = os.path.relpath(parse_orphadata.DEFAULT_INPUT, parse_orphadata.BASE_DIR)
+    assert relative.replace(os.sep, '/').startswith('datasets/raw/orphadata/')
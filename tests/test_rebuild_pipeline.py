@@ -0,0 +1,20 @@
+"""Esecuzione degli step accodati da rebuild_pipeline.py."""
+
+import rebuild_pipeline
+
+
+class FakeQueue:
+    def __init__(self, items):
+        self.items = items
+
+    def pending(self):
+        return self.items
+
+
+def test_download_steps_run_with_refresh_arguments():
+    logged = []
+    queue = FakeQueue([(1, 'download_gimbe_pdfs', ['GIMBE_SSN']),
+                       (2, 'download_pdta', ['NAZ_AGENAS_003'])])
+    rebuild_pipeline.run_pending(queue, dry_run=True, log=logged.append)
+    assert logged[0].split('  (fonti')[0].endswith('download_gimbe_pdfs.py --force')
+    assert logged[1].split('  (fonti')[0].endswith('download_pdta.py --refresh')
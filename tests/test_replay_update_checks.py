@@ -0,0 +1,38 @@
+"""Server di replay di replay_update_checks.py."""
+
+import socket
+import struct
+import time
+
+import replay_update_checks as replay
+
+
+def test_injected_failures_stay_quiet(capfd):
+    sources, cassette = replay.synthetic_catalog(6, n_hosts=2)
+    server = replay.ReplayServer(cassette, latency_ms=0, failure_rate=1.0, seed=0).start()
+    try:
+        results, _ = replay.run_replay(sources, server, workers=2, delay=0)
+    finally:
+        server.stop()
+
+    assert len(results) == len(sources)
+    assert all(r.get('error') for r in results)
+    assert 'Traceback' not in capfd.readouterr().err
+
+
+def test_client_reset_stays_quiet(capfd):
+    sources, cassette = replay.synthetic_catalog(1, n_hosts=1)
+    server = replay.ReplayServer(cassette, latency_ms=100).start()
+    try:
+        host, port = server.addresses['host000.example.it'].split(':')
+        for _ in range(3):
+            client = socket.create_connection((host, int(port)))
+            # SO_LINGER a zero: la chiusura invia un RST mentre il server attende
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            client.sendall(b'GET /pagina/0 HTTP/1.1\r\nHost: replay\r\n\r\n')
+            client.close()
+        time.sleep(0.3)
+    finally:
+        server.stop()
+
+    assert 'Traceback' not in capfd.readouterr().err
@@ -0,0 +1,112 @@
+"""Circuit breaker per host di scheduler_check_updates.py."""
+
+import logging
+
+import pytest
+import requests
+
+import scheduler_check_updates as scheduler
+
+LOGGER = logging.getLogger('test_scheduler')
+
+
+def ok(request):
+    return 200, {'Content-Type': 'text/plain'}, b'contenuto'
+
+
+def server_error(request):
+    return 500, {}, b''
+
+
+def source(source_id, url):
+    return {'source_id': source_id, 'title': source_id, 'url': url, 'update_frequency': 'annual'}
+
+
+@pytest.fixture(autouse=True)
+def no_retry_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, 'retry_delay', lambda attempt, retry_after=None: 0)
+
+
+@pytest.fixture
+def state(tmp_path):
+    store = scheduler.StateStore(str(tmp_path / 'state.db'))
+    yield store
+    store.close()
+
+
+def test_5xx_on_one_url_does_not_open_circuit(loopback, state):
+    loopback.routes['/broken'] = server_error
+    for i in range(1, 4):
+        loopback.routes[f'/ok{i}'] = ok
+    sources = [source('S0', loopback.url('/broken'))]
+    sources += [source(f'S{i}', loopback.url(f'/ok{i}')) for i in range(1, 4)]
+
+    results = {}
+    for src, check_result in scheduler.run_checks(sources, state, LOGGER, delay=0):
+        results[src['source_id']] = scheduler.record_check(state, src, check_result)
+
+    assert results['S0']['status'] == 'http_error'
+    assert len(loopback.hits('/broken', 'HEAD')) == scheduler.MAX_RETRIES + 1
+    assert all(results[f'S{i}']['status'] == 'first_check' for i in range(1, 4))
+
+
+def test_connection_errors_open_circuit_and_skip_host(state):
+    # Porta chiusa su loopback: connessione rifiutata
+    url = 'http://127.0.0.1:9/'
+    sources = [source(f'S{i}', url + str(i)) for i in range(3)]
+    client = scheduler.HostClient(delay=0, circuit_threshold=3)
+    results = [scheduler.record_check(state, src, r)
+               for src, r in scheduler.run_checks(sources, state, LOGGER, client=client)]
+    client.close()
+
+    assert results[0]['status'] == 'connection_error'
+    assert [r['status'] for r in results[1:]] == ['host_unavailable'] * 2
+
+
+def test_host_unavailable_does_not_stamp_last_checked(state):
+    state.put('S1', {'last_checked': '2000-01-01'}, {'source_id': 'S1', 'status': 'unchanged'})
+    result = {'source_id': 'S1', 'status': 'host_unavailable'}
+    scheduler.record_check(state, source('S1', 'http://127.0.0.1:9/'), result)
+    assert state.get('S1')['last_checked'] == '2000-01-01'
+
+
+def test_probe_slot_released_on_unexpected_error(monkeypatch):
+    client = scheduler.HostClient(delay=0, circuit_threshold=1)
+    breaker = client.breaker
+    host = '127.0.0.1'
+    breaker.failure(host)
+    breaker._open_until[host] = 0  # cooldown scaduto: la prossima richiesta è la prova
+
+    def redirect_loop(self, method, url, **kwargs):
+        raise requests.exceptions.TooManyRedirects('loop')
+
+    monkeypatch.setattr(requests.Session, 'request', redirect_loop)
+    with pytest.raises(requests.exceptions.TooManyRedirects):
+        client.get('http://127.0.0.1:9/')
+    assert host not in breaker._probing
+    assert breaker.allow(host) == (True, True)
+    client.close()
+
+
+def test_request_without_probe_does_not_release_probe_slot(monkeypatch):
+    client = scheduler.HostClient(delay=0, circuit_threshold=1)
+    breaker = client.breaker
+    host = '127.0.0.1'
+    probes = []
+
+    def slow_request(self, method, url, **kwargs):
+        # Mentre questa richiesta è in corso il circuito si apre, il cooldown
+        # scade e un altro thread ottiene la richiesta di prova
+        breaker.failure(host)
+        breaker._open_until[host] = 0
+        probes.append(breaker.allow(host))
+        raise requests.exceptions.TooManyRedirects('loop')
+
+    monkeypatch.setattr(requests.Session, 'request', slow_request)
+    with pytest.raises(requests.exceptions.TooManyRedirects):
+        client.get('http://127.0.0.1:9/')
+
+    assert probes == [(True, True)]
+    assert host in breaker._probing
+    assert breaker.allow(host) == (False, False)
+    client.close()
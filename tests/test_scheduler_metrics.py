@@ -0,0 +1,19 @@
+"""Metriche di latenza in formato testo Prometheus."""
+
+import scheduler_check_updates as scheduler
+
+
+def measured(source_id, total_ms):
+    return {'source_id': source_id, 'url': 'https://www.example.org/' + source_id,
+            'category': 'test',
+            'metrics': {'connect_ms': 10.0, 'ttfb_ms': 50.0, 'total_ms': total_ms, 'bytes': 100}}
+
+
+def test_host_summary_has_sum_and_count(tmp_path):
+    path = scheduler.write_prometheus_metrics(
+        [measured('S1', 200.0), measured('S2', 300.0)], str(tmp_path / 'metrics.prom'))
+    lines = open(path, encoding='utf-8').read().splitlines()
+
+    assert 'infomib_update_check_host_latency_seconds_sum{host="www.example.org"} 0.5000' in lines
+    assert 'infomib_update_check_host_latency_seconds_count{host="www.example.org"} 2' in lines
+    assert not [line for line in lines if 'phase="dns"' in line]
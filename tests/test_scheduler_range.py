@@ -0,0 +1,85 @@
+"""Probe con Range dei binari grandi in check_source()."""
+
+import logging
+import re
+
+import scheduler_check_updates as scheduler
+
+LOGGER = logging.getLogger('test_scheduler')
+BODY = bytes(range(256)) * (scheduler.RANGE_MIN_BYTES // 256 * 2)
+
+
+def binary_without_head(body, etag=None):
+    """Binario senza HEAD (405) che accetta Range, con ETag opzionale."""
+    def route(request):
+        if request.command == 'HEAD':
+            return 405, {}, b''
+        headers = {'Content-Type': 'application/pdf'}
+        if etag:
+            headers['ETag'] = etag
+        match = re.match(r'bytes=(\d+)-(\d+)', request.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            headers['Content-Range'] = f'bytes {start}-{end}/{len(body)}'
+            return 206, headers, body[start:end + 1]
+        return 200, headers, body
+    return route
+
+
+def range_state(loopback, client):
+    """Due controlli: il primo scarica il body, il secondo passa al probe Range."""
+    source = {'source_id': 'BIN_001', 'title': 'Report', 'url': loopback.url('/report.pdf')}
+    _, first = scheduler.check_source(source, {}, LOGGER, client=client)
+    result, second = scheduler.check_source(source, {'BIN_001': first}, LOGGER, client=client)
+    assert result['status'] == 'unchanged'
+    assert second['hash_scope'] == f'range:{scheduler.RANGE_PROBE_BYTES}'
+    return source, second
+
+
+def test_range_probe_uses_stored_size_when_head_is_skipped(loopback):
+    loopback.routes['/report.pdf'] = binary_without_head(BODY)
+    source = {'source_id': 'BIN_001', 'title': 'Report', 'url': loopback.url('/report.pdf')}
+    client = scheduler.HostClient(delay=0)
+
+    result, first = scheduler.check_source(source, {}, LOGGER, client=client)
+    assert result['status'] == 'first_check'
+    assert first['fetch_strategy'] == 'get'
+    assert first['content_length'] == str(len(BODY))
+
+    result, second = scheduler.check_source(source, {'BIN_001': first}, LOGGER, client=client)
+    client.close()
+
+    last_get = loopback.hits('/report.pdf', 'GET')[-1]
+    assert last_get[2].get('Range') == f'bytes=0-{scheduler.RANGE_PROBE_BYTES - 1}'
+    assert not loopback.hits('/report.pdf', 'HEAD')[1:]
+    assert second['hash_scope'] == f'range:{scheduler.RANGE_PROBE_BYTES}'
+    assert second['range_supported'] is True
+    assert second['content_length'] == str(len(BODY))
+
+
+def test_range_probe_detects_file_grown_past_the_probe(loopback):
+    loopback.routes['/report.pdf'] = binary_without_head(BODY)
+    client = scheduler.HostClient(delay=0)
+    source, state = range_state(loopback, client)
+
+    # Stessi primi RANGE_PROBE_BYTES, file più lungo
+    loopback.routes['/report.pdf'] = binary_without_head(BODY + b'appendice' * 1000)
+    result, new_state = scheduler.check_source(source, {'BIN_001': state}, LOGGER, client=client)
+    client.close()
+
+    assert result['status'] == 'updated'
+    assert any('Content-Length' in change for change in result['change_details'])
+    assert new_state['content_length'] == str(len(BODY) + 9000)
+
+
+def test_range_probe_detects_changed_etag(loopback):
+    loopback.routes['/report.pdf'] = binary_without_head(BODY, etag='"v1"')
+    client = scheduler.HostClient(delay=0)
+    source, state = range_state(loopback, client)
+
+    loopback.routes['/report.pdf'] = binary_without_head(BODY, etag='"v2"')
+    result, _ = scheduler.check_source(source, {'BIN_001': state}, LOGGER, client=client)
+    client.close()
+
+    assert result['status'] == 'updated'
+    assert any('ETag' in change for change in result['change_details'])
@@ -0,0 +1,111 @@
+"""Ripresa dei run interrotti in scheduler_check_updates.main()."""
+
+import csv
+import sys
+
+import pytest
+
+import scheduler_check_updates as scheduler
+
+CATALOG_FIELDS = ['source_id', 'title', 'owner', 'category', 'url', 'license',
+                  'update_frequency', 'geography', 'granularity', 'file_paths_in_repo',
+                  'last_checked', 'checksum']
+
+
+def result_for(source):
+    return {
+        'source_id': source['source_id'], 'title': source['title'], 'url': source['url'],
+        'owner': '', 'category': source.get('category', ''), 'update_frequency': 'annual',
+        'check_timestamp': '2026-01-01T00:00:00', 'status': 'unchanged', 'changed': False,
+        'change_details': [], 'http_status': 200, 'error': None,
+    }
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """Percorsi di stato, catalogo e log in una directory temporanea."""
+    catalog_csv = tmp_path / 'sources_catalog.csv'
+    with open(catalog_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=CATALOG_FIELDS)
+        writer.writeheader()
+        for sid in ('S1', 'S2', 'S3'):
+            writer.writerow({'source_id': sid, 'title': sid, 'category': 'test',
+                             'url': f'http://127.0.0.1:9/{sid}', 'update_frequency': 'annual'})
+    logs = tmp_path / 'logs'
+    paths = {
+        'LOGS_DIR': logs, 'STATE_DB': logs / 'update_state.db',
+        'STATE_FILE': logs / 'update_state.json', 'LOG_FILE': logs / 'update_check.log',
+        'REPORT_FILE': logs / 'update_report.json', 'METRICS_FILE': logs / 'update_metrics.prom',
+        'CATALOG_PATH': catalog_csv, 'CATALOG_DB': logs / 'sources_catalog.db',
+        'QUEUE_DB': logs / 'rebuild_queue.db',
+    }
+    for name, value in paths.items():
+        monkeypatch.setattr(scheduler, name, str(value))
+
+    checked = []
+
+    def fake_run_checks(sources, state, logger, **kwargs):
+        for source in sources:
+            checked.append(source['source_id'])
+            yield source, result_for(source)
+
+    monkeypatch.setattr(scheduler, 'run_checks', fake_run_checks)
+    logs.mkdir()
+
+    # Run interrotto: S1 completata, S2 in attesa
+    state = scheduler.StateStore(str(paths['STATE_DB']))
+    run_id = state.start_run(['S1', 'S2'])
+    state.put('S1', {'last_checked': scheduler.TODAY}, result_for({'source_id': 'S1', 'title': 'S1',
+                                                                  'url': ''}), run_id=run_id)
+    state.close()
+    return paths, checked
+
+
+def run_main(monkeypatch, *argv):
+    monkeypatch.setattr(sys, 'argv', ['scheduler_check_updates.py', *argv])
+    scheduler.main()
+
+
+def unfinished_run(paths):
+    state = scheduler.StateStore(str(paths['STATE_DB']))
+    try:
+        return state.unfinished_run()
+    finally:
+        state.close()
+
+
+def test_run_without_selection_resumes_interrupted_run(env, monkeypatch):
+    paths, checked = env
+    run_main(monkeypatch)
+    assert checked == ['S2']
+    assert unfinished_run(paths) is None
+
+
+def test_explicit_source_discards_interrupted_run(env, monkeypatch):
+    paths, checked = env
+    run_main(monkeypatch, '--source', 'S3')
+    assert checked == ['S3']
+    assert unfinished_run(paths) is None
+
+
+def test_no_resume_discards_interrupted_run(env, monkeypatch):
+    paths, checked = env
+    run_main(monkeypatch, '--no-resume')
+    assert 'S2' in checked and 'S3' in checked
+    assert unfinished_run(paths) is None
+
+
+def read_catalog_csv(paths):
+    with open(paths['CATALOG_PATH'], newline='', encoding='utf-8') as f:
+        return {row['source_id']: row for row in csv.DictReader(f)}
+
+
+def test_last_checked_reaches_csv_only_with_export_catalog(env, monkeypatch):
+    paths, checked = env
+    run_main(monkeypatch, '--source', 'S3')
+    assert read_catalog_csv(paths)['S3']['last_checked'] == ''
+
+    run_main(monkeypatch, '--export-catalog')
+    rows = read_catalog_csv(paths)
+    assert rows['S3']['last_checked'] == scheduler.TODAY
+    assert rows['S1']['last_checked'] == ''